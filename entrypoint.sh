@@ -1,5 +1,14 @@
 #!/bin/sh
 
 python manage.py migrate
-python manage.py loaddata data/polls-v4.json data/votes-v4.json data/users.json
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+python manage.py createcachetable
+python manage.py importpolls data/polls-v4.json data/votes-v4.json data/users.json
+python manage.py snapshotresults
+
+# APP_SERVER=runserver starts the development server instead of gunicorn,
+# configured by gunicorn.conf.py
+if [ "${APP_SERVER:-gunicorn}" = "runserver" ]; then
+    exec python manage.py runserver 0.0.0.0:8000
+fi
+python manage.py collectstatic --noinput
+exec gunicorn
@@ -0,0 +1,78 @@
+"""Gunicorn configuration for serving KU Polls in production.
+
+Gunicorn reads this file from the working directory, so the app server
+is started with just ``gunicorn``. Settings come from the environment
+or the .env file, like the Django settings:
+
+- SERVER_INTERFACE: "wsgi" to serve mysite.wsgi with threaded sync
+  workers, or "asgi" to serve mysite.asgi with uvicorn workers, which
+  suits the live results streams and POLLS_ASYNC_VIEWS. Under asgi
+  database connections are only reused with DATABASE_POOL.
+- SERVER_BIND: address to listen on, 0.0.0.0:8000 by default.
+- SERVER_WORKERS: number of worker processes, by default twice the
+  number of CPUs plus one.
+- SERVER_THREADS: threads per wsgi worker.
+- SERVER_MAX_REQUESTS and SERVER_MAX_REQUESTS_JITTER: a worker is
+  replaced after about this many requests; 0 never replaces workers.
+- SERVER_TIMEOUT and SERVER_GRACEFUL_TIMEOUT: seconds before a silent
+  worker is killed, and seconds workers get to finish their requests
+  on a reload or shutdown.
+
+The app is loaded once in the master process and the workers are
+forked from it, sharing its memory. Send SIGHUP to the master to reload
+the configuration and replace the workers gracefully.
+
+The workers do not share the locmem cache, so the server refuses to
+start more than one worker with it; use CACHE_BACKEND=file or database.
+"""
+import multiprocessing
+
+from decouple import config
+
+SERVER_INTERFACES = {
+    'wsgi': ('mysite.wsgi:application', 'gthread'),
+    'asgi': ('mysite.asgi:application', 'uvicorn_worker.UvicornWorker'),
+}
+
+wsgi_app, worker_class = SERVER_INTERFACES[
+    config('SERVER_INTERFACE', default='wsgi')]
+bind = config('SERVER_BIND', default='0.0.0.0:8000')
+workers = config('SERVER_WORKERS', cast=int,
+                 default=multiprocessing.cpu_count() * 2 + 1)
+threads = config('SERVER_THREADS', cast=int, default=4)
+max_requests = config('SERVER_MAX_REQUESTS', cast=int, default=1000)
+max_requests_jitter = config('SERVER_MAX_REQUESTS_JITTER', cast=int,
+                             default=100)
+timeout = config('SERVER_TIMEOUT', cast=int, default=30)
+graceful_timeout = config('SERVER_GRACEFUL_TIMEOUT', cast=int, default=30)
+preload_app = True
+accesslog = '-'
+
+
+def on_starting(server):
+    """Refuse to start several workers that do not share the cache.
+
+    The cached pages and values are invalidated by bumping versions in
+    the cache, which a worker with its own locmem cache never sees.
+    """
+    from django.conf import settings
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('.LocMemCache'):
+        server.log.error(
+            "%d workers cannot share the locmem cache; set CACHE_BACKEND "
+            "to file or database, or SERVER_WORKERS to 1",
+            server.cfg.workers)
+        raise SystemExit(1)
+
+
+def pre_fork(server, worker):
+    """Close the master's database connections before forking a worker.
+
+    A connection or connection pool opened while loading the app would
+    otherwise be shared by every worker.
+    """
+    from django.db import connections
+    connections.close_all()
+    for connection in connections.all():
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
@@ -42,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'polls.middleware.RequestMetricsMiddleware',
+    'polls.middleware.ReplicaRoutingMiddleware',
+    'polls.middleware.PollSchedulerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,10 +85,105 @@ DATABASES = {
         "USER": config("DATABASE_USER", default="pollsapp"),
         "PASSWORD": config("DATABASE_PASSWORD", default="password"),
         "HOST": config("DATABASE_HOST", default="localhost"),
-        "PORT": config("DATABASE_PORT", default="5432")
+        "PORT": config("DATABASE_PORT", default="5432"),
+        # Check a reused connection before each request and replace it
+        # if the database closed it
+        "CONN_HEALTH_CHECKS": config("DATABASE_CONN_HEALTH_CHECKS",
+                                     cast=bool, default=True),
     }
 }
 
+# Connections are reused either by keeping each thread's connection
+# open for DATABASE_CONN_MAX_AGE seconds (0 closes it after every
+# request), or by a psycopg connection pool per process when
+# DATABASE_POOL is on. Django cannot do both, so the pool ignores
+# DATABASE_CONN_MAX_AGE. Under ASGI every worker thread of an async
+# request would keep a connection of its own, so without the pool
+# connections are closed after every request there.
+SERVER_INTERFACE = config("SERVER_INTERFACE", default="wsgi")
+DATABASE_POOL = config("DATABASE_POOL", cast=bool, default=False)
+if DATABASE_POOL:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config("DATABASE_POOL_MIN_SIZE", cast=int,
+                               default=2),
+            "max_size": config("DATABASE_POOL_MAX_SIZE", cast=int,
+                               default=10),
+            # seconds a request waits for a free connection
+            "timeout": config("DATABASE_POOL_TIMEOUT", cast=float,
+                              default=10.0),
+        },
+    }
+elif SERVER_INTERFACE == "asgi":
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = config("DATABASE_CONN_MAX_AGE",
+                                                  cast=int, default=60)
+
+# Read replicas of the default database as a comma-separated list of
+# host or host:port, with the same name and credentials. The polls
+# pages read from them, see polls.routers.
+for number, replica in enumerate(config("DATABASE_REPLICAS", cast=Csv(),
+                                        default=""), start=1):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+POLLS_READ_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+# Seconds a visitor reads from the default database after a write
+POLLS_REPLICA_STICKY_SECONDS = config("POLLS_REPLICA_STICKY_SECONDS",
+                                      cast=int, default=10)
+DATABASE_ROUTERS = ["polls.routers.ReplicaRouter"]
+
+# Cache shared by the processes of a node: "locmem" keeps it in each
+# process, "file" in CACHE_LOCATION, a directory shared by the
+# processes, and "database" in the CACHE_LOCATION table of the database,
+# created by the createcachetable command.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+            "database": "django.core.cache.backends.db.DatabaseCache",
+        }[CACHE_BACKEND],
+        "LOCATION": config('CACHE_LOCATION', default={
+            "locmem": "polls",
+            "file": str(BASE_DIR / "cache"),
+            "database": "polls_cache",
+        }[CACHE_BACKEND]),
+        "OPTIONS": {
+            "MAX_ENTRIES": config('CACHE_MAX_ENTRIES', cast=int,
+                                  default=10000),
+        },
+    }
+}
+
+# Where sessions are kept: "db" in the django_session table, "cached_db"
+# in the default cache with the table as a write-through copy, "cache"
+# in the default cache only, and "signed_cookies" in a signed cookie
+# without any database or cache access. With several processes, the
+# cache backed modes need a cache they share, such as CACHE_BACKEND=file,
+# or a logout in one process is missed by the others. Expired sessions
+# of "db" and "cached_db" are removed by the purgesessions command.
+SESSION_BACKEND = config('SESSION_BACKEND', default='db')
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSION_BACKEND]
+SESSION_COOKIE_AGE = config('SESSION_COOKIE_AGE', cast=int,
+                            default=60 * 60 * 24 * 14)
+
+# Flash messages, such as the result of a vote, travel in a cookie
+# instead of the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -129,6 +227,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Serve the collected static files from the app server when DEBUG is off
+SERVE_STATIC = config('SERVE_STATIC', cast=bool, default=False)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -140,10 +241,15 @@ LOGGING = {
     "disable_existing_loggers": False,
     "handlers": {
         "file": {
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.RotatingFileHandler",
             "filename": "polls.log",
+            "maxBytes": config('POLLS_LOG_MAX_BYTES', cast=int,
+                               default=10 * 1024 * 1024),
+            "backupCount": config('POLLS_LOG_BACKUP_COUNT', cast=int,
+                                  default=5),
+            "delay": True,
             "level": "DEBUG",
-            "formatter": "details",
+            "formatter": "json",
         },
         "console": {
             "class": "logging.StreamHandler",
@@ -159,13 +265,62 @@ LOGGING = {
         },
     },
     "formatters": {
-        "details": {
-            "format": "{levelname} {asctime} {module} {message}",
-            "style": "{",
-        },
         "simple": {
             "format": "{levelname} {message}",
             "style": "{",
         },
+        "json": {
+            "()": "polls.log.JsonFormatter",
+        },
     },
 }
+
+# The handlers of the polls logger write from a background thread; the
+# logging calls only put records on a queue of at most this many
+# records. 0 writes the records synchronously instead.
+POLLS_LOG_QUEUE_SIZE = config('POLLS_LOG_QUEUE_SIZE', cast=int,
+                              default=10000)
+# What a logging call does when the queue is full: "drop" the record or
+# "block" for up to POLLS_LOG_BLOCK_TIMEOUT seconds
+POLLS_LOG_OVERFLOW = config('POLLS_LOG_OVERFLOW', default='drop')
+POLLS_LOG_BLOCK_TIMEOUT = config('POLLS_LOG_BLOCK_TIMEOUT', cast=float,
+                                 default=1.0)
+
+# Polls
+# Number of questions on each page of the polls index
+POLLS_INDEX_PAGE_SIZE = config('POLLS_INDEX_PAGE_SIZE', cast=int, default=20)
+# Seconds a rendered index page fragment is kept in the cache
+POLLS_INDEX_CACHE_TIMEOUT = config('POLLS_INDEX_CACHE_TIMEOUT', cast=int,
+                                   default=60)
+# Seconds cached question metadata and tallies are kept
+POLLS_CACHE_TIMEOUT = config('POLLS_CACHE_TIMEOUT', cast=int, default=3600)
+# Number of cached values each process also keeps in memory
+POLLS_CACHE_LOCAL_SIZE = config('POLLS_CACHE_LOCAL_SIZE', cast=int,
+                                default=1000)
+# Seconds browsers may keep the results page of a closed poll
+POLLS_SNAPSHOT_MAX_AGE = config('POLLS_SNAPSHOT_MAX_AGE', cast=int,
+                                default=86400)
+# Requests slower than this many milliseconds are logged as slow requests
+POLLS_SLOW_REQUEST_MS = config('POLLS_SLOW_REQUEST_MS', cast=float,
+                               default=500)
+# Maximum number of ballots in one request to the batch vote API
+POLLS_API_MAX_BALLOTS = config('POLLS_API_MAX_BALLOTS', cast=int, default=100)
+# Serve the async versions of the polls views (for ASGI deployments)
+POLLS_ASYNC_VIEWS = config('POLLS_ASYNC_VIEWS', cast=bool, default=False)
+# Buffer votes in each process and write them to the database in batches
+POLLS_VOTE_BUFFER = config('POLLS_VOTE_BUFFER', cast=bool, default=False)
+# Directory of the append logs that keep buffered votes across crashes
+POLLS_VOTE_BUFFER_DIR = config('POLLS_VOTE_BUFFER_DIR',
+                               default=str(BASE_DIR / 'vote-buffer'))
+# Seconds between two flushes of the vote buffer
+POLLS_VOTE_BUFFER_INTERVAL = config('POLLS_VOTE_BUFFER_INTERVAL', cast=float,
+                                    default=2.0)
+# Number of buffered votes that triggers an early flush
+POLLS_VOTE_BUFFER_BATCH_SIZE = config('POLLS_VOTE_BUFFER_BATCH_SIZE',
+                                      cast=int, default=500)
+# Flip the states of questions in a thread of each server process, rather
+# than in a separate manage.py pollscheduler worker
+POLLS_SCHEDULER = config('POLLS_SCHEDULER', cast=bool, default=False)
+# Longest time in seconds between two updates of the question states
+POLLS_SCHEDULER_INTERVAL = config('POLLS_SCHEDULER_INTERVAL', cast=float,
+                                  default=60.0)
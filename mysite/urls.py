@@ -14,9 +14,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic.base import RedirectView
+from django.views.static import serve
 
 from mysite import views
 
@@ -27,3 +29,10 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('polls/', include('polls.urls')),
 ]
+
+if settings.SERVE_STATIC and not settings.DEBUG:
+    # the files gathered by collectstatic; runserver serves them itself
+    # when DEBUG is on
+    urlpatterns.append(re_path(rf'^{settings.STATIC_URL}(?P<path>.*)$',
+                               serve,
+                               {'document_root': settings.STATIC_ROOT}))
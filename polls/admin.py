@@ -2,5 +2,12 @@
 from django.contrib import admin
 from .models import Question, Choice
 
+
+@admin.register(Choice)
+class ChoiceAdmin(admin.ModelAdmin):
+    """Admin of choices; the vote counter is kept by the votes."""
+
+    readonly_fields = ('vote_count',)
+
+
 admin.site.register(Question)
-admin.site.register(Choice)
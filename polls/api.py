@@ -0,0 +1,303 @@
+"""JSON API of KU Polls.
+
+The read endpoints serve the published questions, a question with its
+choices and a question's results as JSON. They read the same queries
+and cached values as the pages, as values() rows and dicts rather than
+model instances, and answer conditional requests with 304 like the
+pages. The ``fields`` query parameter, a comma-separated list, limits
+the fields of each question.
+
+The API uses the session of the logged-in user and, for requests that
+change data, the same CSRF protection as the pages: clients send the
+CSRF token in the X-CSRFToken header.
+"""
+import datetime
+import json
+import logging
+import time
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import generic
+from django.views.decorators.http import require_POST
+
+from .buffer import get_vote_buffer
+from .cache import (get_index_version, get_question_meta, get_tallies,
+                    get_version)
+from .conditional import ConditionalPageMixin
+from .models import ResultSnapshot, VoteBucket
+from .pagination import KeysetPage
+from .views import published_questions
+from .voting import cast_ballots
+
+logger = logging.getLogger("polls")
+
+
+def _error(message, status=400):
+    """Return a JSON error response."""
+    return JsonResponse({'error': message}, status=status)
+
+
+def _parse_ballots(body):
+    """Return the ballots of a vote request body.
+
+    :param body: the JSON request body, an object whose "ballots" are a
+                 list of objects with an integer question_id and
+                 choice_id
+    :return: a list of (question_id, choice_id) tuples
+    :raise ValueError: if the body is not of that form
+    """
+    ballots = json.loads(body)['ballots']
+    if not isinstance(ballots, list):
+        raise ValueError("ballots must be a list")
+    parsed = []
+    for ballot in ballots:
+        question_id, choice_id = ballot['question_id'], ballot['choice_id']
+        if not (type(question_id) is int and type(choice_id) is int):
+            raise ValueError("ids must be integers")
+        parsed.append((question_id, choice_id))
+    return parsed
+
+
+@require_POST
+def vote_batch(request):
+    """Record the ballots of the logged-in user for many questions.
+
+    The request body is {"ballots": [{"question_id": 1, "choice_id": 2},
+    ...]} with at most POLLS_API_MAX_BALLOTS ballots. The response lists
+    the outcome of every ballot in order, see voting.cast_ballots; the
+    valid ballots are recorded even if others are rejected.
+
+    :param request: request from the visitor
+    :return: a JSON response with the results of the ballots
+    """
+    if not request.user.is_authenticated:
+        return _error("Log in to vote.", status=401)
+    try:
+        ballots = _parse_ballots(request.body)
+    except (ValueError, KeyError, TypeError):
+        return _error('The body must be {"ballots": [{"question_id": int, '
+                      '"choice_id": int}, ...]}.')
+    if len(ballots) > settings.POLLS_API_MAX_BALLOTS:
+        return _error(f"At most {settings.POLLS_API_MAX_BALLOTS} ballots "
+                      f"can be sent at once.")
+    results = cast_ballots(request.user, ballots, get_vote_buffer())
+    logger.info("%s sent %d ballots, %d rejected", request.user.username,
+                len(results),
+                sum(result['status'] == 'rejected' for result in results))
+    return JsonResponse({'results': results})
+
+
+class ApiView(ConditionalPageMixin, generic.View):
+    """Base of the read endpoints of the API.
+
+    Subclasses list their fields in field_names and build the response
+    data in get_data(), after get_etag_parts() was checked against the
+    client's copy. The data is the same for every visitor.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    field_names = ()
+
+    def get(self, request, *args, **kwargs):
+        """Return the data as JSON unless the client's copy is current."""
+        requested = request.GET.get('fields')
+        self.fields = (list(self.field_names) if not requested
+                       else [field for field in requested.split(',')
+                             if field])
+        unknown = set(self.fields) - set(self.field_names)
+        if unknown:
+            return _error(f"Unknown fields: {', '.join(sorted(unknown))}. "
+                          f"Use {', '.join(self.field_names)}.")
+        response = self.load(**kwargs)
+        if response is not None:
+            return response
+        response = self.not_modified()
+        if response is not None:
+            return response
+        return self.add_validators(JsonResponse(self.get_data()))
+
+    def load(self, **kwargs):
+        """Load what the ETag is made of.
+
+        :return: an error response, or None
+        """
+        return None
+
+    def get_data(self):
+        """Return the data of the response."""
+        raise NotImplementedError
+
+    def get_visitor_parts(self):
+        """Return nothing; the data does not depend on the visitor."""
+        return []
+
+    def pick(self, values):
+        """Return the requested fields of a dict of values."""
+        return {field: values[field] for field in self.fields}
+
+
+class QuestionListApi(ApiView):
+    """The published questions, newest first, a page at a time.
+
+    Pages follow the ``cursor`` query parameter like the index page,
+    and the response gives the cursor of the next page in next_cursor.
+    """
+
+    field_names = ('id', 'question_text', 'pub_date', 'end_date', 'is_open')
+
+    def get_etag_parts(self):
+        """Return the index version and the current cache period."""
+        timeout = max(settings.POLLS_INDEX_CACHE_TIMEOUT, 1)
+        return [get_index_version(), int(time.time()) // timeout,
+                self.request.GET.get('cursor'), self.fields]
+
+    def get_data(self):
+        """Return a page of questions and the next cursor."""
+        rows = published_questions().values(
+            *{'id', 'pub_date', *self.fields})
+        page = KeysetPage(rows, self.request.GET.get('cursor'),
+                          per_page=settings.POLLS_INDEX_PAGE_SIZE)
+        return {'results': [self.pick(row) for row in page],
+                'next_cursor': page.next_cursor}
+
+
+class QuestionApi(ApiView):
+    """A published question with its choices."""
+
+    field_names = ('id', 'question_text', 'pub_date', 'end_date', 'is_open',
+                   'choices')
+
+    def load(self, pk):
+        """Load the cached metadata of the question.
+
+        :return: a 404 response if the question is not published
+        """
+        self.meta = get_question_meta(pk)
+        if self.meta is None or self.meta['pub_date'] > timezone.now():
+            return _error(f"Poll ID {pk} does not exist.", status=404)
+        end_date = self.meta['end_date']
+        self.is_open = end_date is None or end_date > timezone.now()
+        return None
+
+    def get_etag_parts(self):
+        """Return the version of the question's metadata."""
+        return [get_version(f"question:{self.meta['id']}"), self.is_open,
+                self.fields]
+
+    def get_data(self):
+        """Return the question and its choices."""
+        return self.pick({
+            **self.meta, 'is_open': self.is_open,
+            'choices': [{'id': pk, 'choice_text': text}
+                        for pk, text in self.meta['choices']]})
+
+
+class ResultsApi(QuestionApi):
+    """The vote counts of a published question.
+
+    The counts of a closed question come from its results snapshot if
+    it has one, and the counts of other questions include the votes in
+    the write-behind buffer, like the results page.
+    """
+
+    field_names = ('id', 'question_text', 'total_votes', 'choices')
+
+    def get_etag_parts(self):
+        """Return the versions of the question and its tallies."""
+        question_id = self.meta['id']
+        parts = [get_version(f'question:{question_id}'),
+                 get_version(f'tallies:{question_id}'), self.is_open,
+                 self.fields]
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            parts.append(sorted(
+                buffer.pending_for_question(question_id).items(), key=str))
+        return parts
+
+    def get_tallies(self):
+        """Return the vote counts of the question by choice id."""
+        question_id = self.meta['id']
+        if not self.is_open:
+            snapshot = (ResultSnapshot.objects.filter(question_id=question_id)
+                        .values_list('choices', flat=True).first())
+            if snapshot is not None:
+                return {pk: votes for pk, _, votes in snapshot}
+        tallies = dict(get_tallies(question_id))
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            for pk, delta in buffer.tally_deltas(question_id).items():
+                tallies[pk] = tallies.get(pk, 0) + delta
+        return tallies
+
+    def get_data(self):
+        """Return the question's choices with their votes and shares."""
+        tallies = self.get_tallies()
+        total = sum(tallies.get(pk, 0) for pk, _ in self.meta['choices'])
+        choices = []
+        for pk, text in self.meta['choices']:
+            votes = tallies.get(pk, 0)
+            choices.append({
+                'id': pk, 'choice_text': text, 'votes': votes,
+                'percentage': round(votes * 100.0 / total, 2) if total
+                else 0.0})
+        return self.pick({**self.meta, 'total_votes': total,
+                          'choices': choices})
+
+
+class HistoryApi(QuestionApi):
+    """The votes a question's choices gained and lost over time.
+
+    The history is read from the question's VoteBucket rows only, by
+    ``interval`` minute or hour, from the optional ``since`` ISO 8601
+    date and time on. Votes older than the buckets appear as added when
+    they were created, see VoteBucket.
+    """
+
+    field_names = ('start', 'choice_id', 'added', 'removed')
+    intervals = ('minute', 'hour')
+
+    def load(self, pk):
+        """Load the question and the interval and start of the history.
+
+        :return: an error response if the question is not published or
+                 the parameters are invalid
+        """
+        response = super().load(pk)
+        if response is not None:
+            return response
+        self.interval = self.request.GET.get('interval', 'minute')
+        if self.interval not in self.intervals:
+            return _error(f"Use an interval of {' or '.join(self.intervals)}.")
+        since = self.request.GET.get('since')
+        try:
+            self.since = (datetime.datetime.fromisoformat(since)
+                          if since else None)
+        except ValueError:
+            return _error("since must be an ISO 8601 date and time.")
+        if self.since is not None and timezone.is_naive(self.since):
+            self.since = timezone.make_aware(self.since)
+        return None
+
+    def get_etag_parts(self):
+        """Return the version of the tallies, which votes change."""
+        return [get_version(f"tallies:{self.meta['id']}"), self.interval,
+                self.since, self.fields]
+
+    def get_data(self):
+        """Return the buckets of the history, oldest first."""
+        buckets = VoteBucket.objects.filter(question_id=self.meta['id'])
+        if self.since is not None:
+            buckets = buckets.filter(bucket__gte=self.since)
+        if self.interval == 'hour':
+            rows = (buckets.annotate(start=TruncHour('bucket'))
+                    .values('start', 'choice_id')
+                    .annotate(added=Sum('added'), removed=Sum('removed')))
+        else:
+            rows = buckets.values('choice_id', 'added', 'removed',
+                                  start=F('bucket'))
+        return {'question_id': self.meta['id'], 'interval': self.interval,
+                'buckets': [self.pick(row) for row in
+                            rows.order_by('start', 'choice_id')]}
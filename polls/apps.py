@@ -1,5 +1,6 @@
 """App config for KU Polls."""
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PollsConfig(AppConfig):
@@ -7,3 +8,12 @@ class PollsConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        """Connect the signal receivers and queue the polls logger."""
+        from . import scheduler, signals  # noqa: F401
+        from .log import install_queue
+        if settings.POLLS_LOG_QUEUE_SIZE:
+            install_queue('polls', queue_size=settings.POLLS_LOG_QUEUE_SIZE,
+                          overflow=settings.POLLS_LOG_OVERFLOW,
+                          timeout=settings.POLLS_LOG_BLOCK_TIMEOUT)
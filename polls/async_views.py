@@ -0,0 +1,229 @@
+"""Asynchronous versions of the views of the polls application.
+
+The views have the same names and behavior as those in polls.views and
+are served instead of them when POLLS_ASYNC_VIEWS is enabled, which
+only pays off when the project runs under ASGI. Queries use Django's
+async ORM; writes that need a transaction run in a worker thread
+because Django has no asynchronous transactions.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseRedirect
+from django.urls import reverse
+
+from . import views
+from .buffer import get_vote_buffer
+from .cache import aget_question_meta, aget_tallies, apply_tallies
+from .models import Choice, Question, ResultSnapshot, Vote
+from .voting import cast_vote, withdraw_vote
+
+logger = views.logger
+
+
+class IndexView(views.IndexView):
+    """Display poll questions sorted by date from newest to oldest."""
+
+    async def get(self, request, *args, **kwargs):
+        """Render the index unless the visitor's copy is up to date.
+
+        The context reads the index version from the cache, which may
+        be a database, so it is built in a worker thread. The page is
+        still evaluated lazily, when the template renders it outside a
+        cached fragment.
+        """
+        response = await sync_to_async(self.not_modified)()
+        if response is not None:
+            return response
+        self.object_list = self.get_queryset()
+        context = await sync_to_async(self.get_context_data)()
+        return self.add_validators(self.render_to_response(context))
+
+
+class DetailView(views.DetailView):
+    """Display the detail of a question."""
+
+    async def get(self, request, *args, **kwargs):
+        """Get the question object.
+
+        Redirect the visitor to the index page with an error message
+        if the Question with entered ID does not exist or
+        unavailable for voting.
+        """
+        try:
+            self.object = await self.get_queryset().aget(pk=kwargs["pk"])
+        except Question.DoesNotExist as ex:
+            logger.exception("Non-existent question %s %s", kwargs['pk'], ex)
+            messages.error(request, f"Poll ID {kwargs['pk']} does not exist.")
+            return HttpResponseRedirect(reverse("polls:index"))
+        if not self.object.can_vote():
+            messages.error(request, "Voting is unavailable for Poll ID" +
+                                    f"{kwargs['pk']}.")
+            return HttpResponseRedirect(reverse("polls:index"))
+        response = await sync_to_async(self.not_modified)()
+        if response is not None:
+            return response
+        meta = await aget_question_meta(self.object.pk)
+        self.object.choices = [
+            Choice(pk=pk, question=self.object, choice_text=text)
+            for pk, text in meta['choices']]
+        vote = await self.aget_selected_vote()
+        context = self.get_context_data(object=self.object, vote=vote)
+        return self.add_validators(self.render_to_response(context))
+
+    async def aget_selected_vote(self):
+        """Return the visitor's vote in the question, or None."""
+        user = await self.request.auser()
+        if not user.is_authenticated:
+            return None
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            found, choice_id = buffer.lookup(user.pk, self.object.pk)
+            if found and choice_id is None:
+                return None
+            if found:
+                return Vote(user=user, question=self.object,
+                            choice_id=choice_id)
+        return await Vote.objects.filter(user=user,
+                                         question=self.object).afirst()
+
+
+class ResultsView(views.ResultsView):
+    """Display the result of a question."""
+
+    async def get(self, request, *args, **kwargs):
+        """Get the question object.
+
+        Redirect the visitor to the index page with an error message
+        if the Question with entered ID does not exist,
+        is not published or the results are unavailable.
+        """
+        try:
+            self.object = await self.get_queryset().aget(pk=kwargs["pk"])
+        except Question.DoesNotExist as ex:
+            logger.exception("Non-existent question %s %s", kwargs['pk'], ex)
+            messages.error(request, f"Poll ID {kwargs['pk']} does not exist.")
+            return HttpResponseRedirect(reverse("polls:index"))
+        if not self.object.is_published():
+            messages.error(request,
+                           f"Results for Poll ID {kwargs['pk']}" +
+                           "are unavailable")
+            return HttpResponseRedirect(reverse("polls:index"))
+        if self.object.is_closed():
+            self.cache_max_age = settings.POLLS_SNAPSHOT_MAX_AGE
+        response = await sync_to_async(self.not_modified)()
+        if response is not None:
+            return response
+        if self.object.is_closed():
+            snapshot = await self.aget_snapshot()
+            snapshot.apply(self.object)
+            context = self.get_context_data(object=self.object,
+                                            snapshot=snapshot)
+        else:
+            await self.aload_tallies()
+            context = self.get_context_data(object=self.object)
+        return self.add_validators(self.render_to_response(context))
+
+    async def aload_tallies(self):
+        """Set the cached tallies on the question, with buffered votes."""
+        apply_tallies(self.object,
+                      await aget_question_meta(self.object.pk),
+                      await aget_tallies(self.object.pk))
+        await sync_to_async(self.merge_buffered_votes)()
+
+    async def aget_snapshot(self):
+        """Return the snapshot of the closed question, taking it if needed."""
+        try:
+            return self.object.snapshot
+        except ResultSnapshot.DoesNotExist:
+            pass
+        await self.aload_tallies()
+        return await sync_to_async(self.save_snapshot)()
+
+
+async def _aget_question(question_id):
+    """Return the question with the given id or raise Http404."""
+    try:
+        return await Question.objects.aget(pk=question_id)
+    except Question.DoesNotExist:
+        raise Http404("No Question matches the given query.")
+
+
+@login_required
+async def vote(request, question_id):
+    """Handle voting in a question.
+
+    :param request: request from the visitor
+    :param question_id: id of the question
+    :return: redirect to the result page or
+             the detail page with error message if no choice was selected
+    """
+    question = await _aget_question(question_id)
+    user = await request.auser()
+    if not question.can_vote():
+        messages.error(request,
+                       f"Voting is unavailable for Poll ID {question_id}.")
+        return HttpResponseRedirect(reverse("polls:index"))
+    try:
+        logger.info("%s voted for choice %s in question %s",
+                    user.username, request.POST['choice'], question_id)
+        selected_choice = await question.choice_set.aget(
+            pk=request.POST['choice'])
+    except (KeyError, Choice.DoesNotExist):
+        logger.exception("%s did not select a choice", user.username)
+        messages.error(request, "You didn't select a choice.")
+        return HttpResponseRedirect(reverse('polls:detail',
+                                            args=(question_id,)))
+
+    buffer = get_vote_buffer()
+    if buffer is not None:
+        previous_choice_id = await sync_to_async(buffer.current_choice_id)(
+            user.pk, question.pk)
+        await sync_to_async(buffer.record)(user.pk, question.pk,
+                                           selected_choice.pk)
+    else:
+        previous_choice_id = await sync_to_async(cast_vote)(user,
+                                                            selected_choice)
+    if previous_choice_id is None:
+        messages.success(request,
+                         f"You voted for '{selected_choice.choice_text}'.")
+    else:
+        messages.success(request, "Your vote was changed to " +
+                                  f"'{selected_choice.choice_text}'.")
+
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
+
+
+@login_required
+async def remove_vote(request, question_id):
+    """Remove user's previous vote.
+
+    :param request: request from the visitor
+    :param question_id: id of the question
+    :return: redirect to the result page
+    """
+    question = await _aget_question(question_id)
+    user = await request.auser()
+    if not question.can_vote():
+        messages.error(request,
+                       f"Voting is unavailable for Poll ID {question_id}.")
+        return HttpResponseRedirect(reverse("polls:index"))
+    buffer = get_vote_buffer()
+    if buffer is not None:
+        removed_choice_id = await sync_to_async(buffer.current_choice_id)(
+            user.pk, question.pk)
+        if removed_choice_id is not None:
+            await sync_to_async(buffer.record)(user.pk, question.pk, None)
+    else:
+        removed_choice_id = await sync_to_async(withdraw_vote)(user, question)
+    if removed_choice_id is not None:
+        logger.info("%s remove vote for question %s",
+                    user.username, question_id)
+        messages.success(request, "Your vote has been removed.")
+    else:
+        logger.warning("%s failed to remove vote for question %s",
+                       user.username, question_id)
+        messages.error(request, "You have not voted for this question.")
+
+    return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
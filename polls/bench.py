@@ -0,0 +1,314 @@
+"""Helpers for benchmarking the polls views in-process.
+
+Requests are sent through Django's test clients: Client drives the
+WSGI handler and AsyncClient the ASGI handler, so the numbers measure
+the cost of the handlers, middleware, views and queries without any
+network or server overhead. Benchmarks run in a throwaway test
+database so the real data is never touched.
+"""
+import asyncio
+import datetime
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import StringIO
+from types import ModuleType
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+
+from mysite import views as site_views
+from . import async_views
+from . import views as sync_views
+from .models import Choice, Question, Vote
+from .urls import view_patterns
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """Create a test database for the duration of the block.
+
+    :param keepdb: keep the database after the block and reuse it
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0,
+                                            keepdb=keepdb)
+
+
+def urlconf(views):
+    """Return a URLconf serving the polls app from a views module.
+
+    :param views: polls.views or polls.async_views
+    """
+    module = ModuleType(f'{views.__name__}_urls')
+    module.urlpatterns = [
+        path('polls/', include((view_patterns(views), 'polls'))),
+        path('accounts/', include('django.contrib.auth.urls')),
+        path('signup/', site_views.signup, name='signup'),
+    ]
+    return module
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (nearest rank)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(samples, elapsed):
+    """Summarize request samples as a dictionary.
+
+    :param samples: a (latency in seconds, status code) tuple per request
+    :param elapsed: the wall time of the whole run
+    :return: the request and error counts, requests per second and the
+             p50, p95 and p99 latencies in milliseconds
+    """
+    latencies = [latency for latency, _ in samples]
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for _, status in samples if status >= 400),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _latencies(samples):
+    """Summarize latencies in seconds as milliseconds."""
+    return {
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3)
+        if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+    }
+
+
+def time_connections(alias='default', iterations=100):
+    """Compare a query on a new connection with one on a reused one.
+
+    The connection is closed before each query of the first run, as at
+    the end of a request when connections are not reused, and kept
+    open through the second run. With a connection pool, closing
+    returns the connection to the pool, so the first run measures
+    taking a connection from the pool.
+
+    :param alias: the database to connect to
+    :param iterations: the number of queries of each run
+    :return: the latencies of both runs and the overhead of getting a
+             connection at the median
+    """
+    connection = connections[alias]
+
+    def query():
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        return time.perf_counter() - start
+
+    new = []
+    for _ in range(iterations):
+        connection.close()
+        new.append(query())
+    reused = [query() for _ in range(iterations)]
+    connection.close()
+    result = {'new_connection': _latencies(new),
+              'reused_connection': _latencies(reused)}
+    result['connect_overhead_ms'] = round(
+        result['new_connection']['p50_ms']
+        - result['reused_connection']['p50_ms'], 3)
+    return result
+
+
+def _send(client, request):
+    """Send one (method, path, data) request.
+
+    :return: the latency in seconds and the status code of the response
+    """
+    method, url, data = request
+    start = time.perf_counter()
+    response = getattr(client, method)(url, data)
+    return time.perf_counter() - start, response.status_code
+
+
+def _user_for(users, worker):
+    """Return the user a worker logs in as, or None for anonymous."""
+    return users[worker % len(users)] if users else None
+
+
+def run_wsgi(requests, users=(), concurrency=1, views=None):
+    """Send requests through the WSGI handler.
+
+    :param requests: a list of (method, path, data) tuples
+    :param users: the users the clients log in as, one per client in
+                  turn; anonymous clients if empty
+    :param concurrency: the number of client threads
+    :param views: the views module to serve, polls.views by default
+    :return: the summary from summarize()
+    """
+    def worker(n):
+        client = Client()
+        user = _user_for(users, n)
+        if user is not None:
+            client.force_login(user)
+        try:
+            return [_send(client, request)
+                    for request in requests[n::concurrency]]
+        finally:
+            connections.close_all()
+
+    with override_settings(ROOT_URLCONF=urlconf(views or sync_views)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return summarize([t for chunk in results for t in chunk], elapsed)
+
+
+def count_queries(requests, users=(), views=None):
+    """Return the mean number of SQL queries per request.
+
+    The requests are sent one at a time through the WSGI handler by a
+    client logged in as the first of users.
+
+    :param requests: a list of (method, path, data) tuples
+    :param users: the users the client may log in as
+    :param views: the views module to serve, polls.views by default
+    """
+    if not requests:
+        return 0.0
+    client = Client()
+    user = _user_for(users, 0)
+    if user is not None:
+        client.force_login(user)
+    queries = 0
+    with override_settings(ROOT_URLCONF=urlconf(views or sync_views)):
+        for request in requests:
+            with CaptureQueriesContext(connection) as captured:
+                _send(client, request)
+            queries += len(captured)
+    return round(queries / len(requests), 2)
+
+
+def compare_session_engines(requests, users, engines):
+    """Return the mean SQL queries per request with each session engine.
+
+    :param requests: a list of (method, path, data) tuples
+    :param users: the users the client may log in as
+    :param engines: a dict of names to SESSION_ENGINE values
+    :return: a dict of the same names to the mean number of queries
+    """
+    results = {}
+    for name, engine in engines.items():
+        with override_settings(SESSION_ENGINE=engine):
+            results[name] = count_queries(requests, users)
+    return results
+
+
+async def _arun(requests, users, concurrency):
+    """Send requests from concurrency async clients."""
+    async def worker(n):
+        client = AsyncClient()
+        user = _user_for(users, n)
+        if user is not None:
+            await client.aforce_login(user)
+        samples = []
+        for method, url, data in requests[n::concurrency]:
+            start = time.perf_counter()
+            response = await getattr(client, method)(url, data)
+            samples.append((time.perf_counter() - start,
+                            response.status_code))
+        return samples
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def run_asgi(requests, users=(), concurrency=1, views=None):
+    """Send requests through the ASGI handler.
+
+    :param requests: a list of (method, path, data) tuples
+    :param users: the users the clients log in as, one per client in
+                  turn; anonymous clients if empty
+    :param concurrency: the number of concurrent clients
+    :param views: the views module to serve, polls.async_views by default
+    :return: the summary from summarize()
+    """
+    with override_settings(ROOT_URLCONF=urlconf(views or async_views)):
+        results, elapsed = asyncio.run(_arun(requests, users, concurrency))
+    return summarize([t for chunk in results for t in chunk], elapsed)
+
+
+def generate_dataset(questions=100, choices=4, users=50, votes_per_user=10,
+                     seed=0):
+    """Fill the database with a synthetic poll dataset.
+
+    The rows have the shape of data/polls-v4.json and data/votes-v4.json:
+    about a tenth of the questions are not published yet, a third of
+    the others have ended, a third end in the future and the rest never
+    end. Every user votes in votes_per_user published questions.
+
+    :param questions: number of questions
+    :param choices: number of choices of each question
+    :param users: number of voting users
+    :param votes_per_user: number of questions each user votes in
+    :param seed: seed of the random generator, for repeatable datasets
+    :return: the created users
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    day = datetime.timedelta(days=1)
+    question_rows = []
+    for n in range(questions):
+        if rng.random() < 0.1:
+            pub_date = now + rng.uniform(1, 30) * day
+        else:
+            pub_date = now - rng.uniform(1, 365) * day
+        end_date = rng.choice([None, pub_date + rng.uniform(1, 30) * day,
+                               now + rng.uniform(1, 30) * day])
+        question = Question(question_text=f"Question {n}?",
+                            pub_date=pub_date, end_date=end_date)
+        question.state = question.current_state(now)
+        question_rows.append(question)
+    question_rows = Question.objects.bulk_create(question_rows,
+                                                 batch_size=1000)
+    choice_rows = Choice.objects.bulk_create(
+        [Choice(question=question, choice_text=f"Choice {n}")
+         for question in question_rows for n in range(choices)],
+        batch_size=1000)
+    choices_by_question = {}
+    for choice in choice_rows:
+        choices_by_question.setdefault(choice.question_id, []).append(choice)
+    user_rows = User.objects.bulk_create(
+        [User(username=f"bench{n}", password=make_password(None))
+         for n in range(users)], batch_size=1000)
+    published = [q for q in question_rows
+                 if q.pub_date <= now and q.pk in choices_by_question]
+    votes = []
+    for user in user_rows:
+        for question in rng.sample(published,
+                                   min(votes_per_user, len(published))):
+            votes.append(Vote(user=user, question=question,
+                              choice=rng.choice(
+                                  choices_by_question[question.pk])))
+    Vote.objects.bulk_create(votes, batch_size=1000)
+    call_command('rebuildvotecounts', stdout=StringIO())
+    return user_rows
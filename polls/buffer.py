@@ -0,0 +1,359 @@
+"""Write-behind buffer for votes.
+
+When POLLS_VOTE_BUFFER is enabled, the vote views record each vote in
+a VoteBuffer instead of writing it to the database. Every recorded
+change is appended to a log file before it is accepted, and a
+background thread applies the buffered changes in batches with
+polls.voting.apply_vote_batch. Repeated votes by a user in the same
+question are merged, so only the last one is written.
+
+Each process writes its own log, named after its process id. A log
+left behind by a process that is no longer running is replayed when
+the buffer of another process starts. A process forked from one with a
+buffer, such as an app server worker, starts its own buffer.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import ResultSnapshot, Vote
+from .voting import apply_vote_batch
+
+logger = logging.getLogger("polls")
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _process_running(pid):
+    """Return True if a process with the given id is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class VoteBuffer:
+    """An in-process queue of vote changes backed by an append-only log."""
+
+    def __init__(self, directory, interval=2.0, batch_size=500):
+        """Create a buffer logging to a file in directory.
+
+        :param directory: the directory holding the append logs
+        :param interval: seconds between two background flushes
+        :param batch_size: number of pending changes that triggers an
+                           early flush
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.log_path = self.directory / f"{os.getpid()}.log"
+        self.pending = {}
+        # the changes being flushed, still read until they are committed
+        self.in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._log = None
+        self.recover()
+
+    def recover(self):
+        """Load changes from logs that were not flushed yet.
+
+        This process's own logs and the logs of processes that are no
+        longer running are read back into the buffer, so they are
+        written by the next flush. Rotated logs are older than the
+        current log of the same process and are read first.
+        """
+        logs = []
+        for path in self.directory.glob('*.log*'):
+            pid = path.name.split('.')[0]
+            if not pid.isdigit():
+                continue
+            if int(pid) == os.getpid() or not _process_running(int(pid)):
+                logs.append((int(pid), path.suffix == '.log', path))
+        for _, _, path in sorted(logs):
+            self._replay(path)
+
+    def _replay(self, path):
+        """Read the changes in the log at path into the buffer.
+
+        Another process's log is first claimed by renaming it, so that
+        only one of the processes recovering at the same time reads it.
+        Its changes are copied into this process's log before it is
+        removed.
+        """
+        if not path.name.startswith(f"{os.getpid()}."):
+            claimed = self.directory / f"{os.getpid()}.claimed.{path.name}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # another process claimed it first
+                return
+            path = claimed
+        changes = {}
+        with open(path) as log:
+            for line in log:
+                try:
+                    user_id, question_id, choice_id = json.loads(line)
+                except ValueError:
+                    # a partly written last line from a crash
+                    continue
+                changes[(user_id, question_id)] = choice_id
+        self.pending.update(changes)
+        if path != self.log_path:
+            log = self._open_log()
+            for (user_id, question_id), choice_id in changes.items():
+                log.write(json.dumps([user_id, question_id, choice_id]))
+                log.write('\n')
+            log.flush()
+            os.fsync(log.fileno())
+            path.unlink()
+
+    def _open_log(self):
+        """Return the append log of this process, opening it if needed."""
+        if self._log is None or self._log.closed:
+            self._log = open(self.log_path, 'a')
+        return self._log
+
+    def record(self, user_id, question_id, choice_id):
+        """Buffer a vote change.
+
+        :param user_id: id of the voting user
+        :param question_id: id of the question
+        :param choice_id: id of the selected choice, or None to remove
+                          the user's vote
+        """
+        line = json.dumps([user_id, question_id, choice_id]) + '\n'
+        with self._lock:
+            log = self._open_log()
+            log.write(line)
+            log.flush()
+            os.fsync(log.fileno())
+            self.pending[(user_id, question_id)] = choice_id
+            size = len(self.pending)
+        self._start()
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def lookup(self, user_id, question_id):
+        """Return the buffered change of a user's vote in a question.
+
+        :return: a (found, choice_id) tuple; found is False if the
+                 buffer holds no change for the vote
+        """
+        with self._lock:
+            key = (user_id, question_id)
+            for changes in (self.pending, self.in_flight):
+                if key in changes:
+                    return True, changes[key]
+            return False, None
+
+    def pending_for_question(self, question_id):
+        """Return the buffered changes in a question by user id."""
+        with self._lock:
+            return {user_id: choice_id
+                    for (user_id, pending_question_id), choice_id
+                    in {**self.in_flight, **self.pending}.items()
+                    if pending_question_id == question_id}
+
+    def current_choice_id(self, user_id, question_id):
+        """Return the choice of a user's vote, including buffered changes.
+
+        :return: the id of the selected choice, or None if the user has
+                 no vote in the question
+        """
+        found, choice_id = self.lookup(user_id, question_id)
+        if found:
+            return choice_id
+        return (Vote.objects.filter(user_id=user_id, question_id=question_id)
+                .values_list('choice_id', flat=True).first())
+
+    def tally_deltas(self, question_id):
+        """Return how the buffered changes alter a question's tallies.
+
+        :return: a dict of choice id to the change of its vote count
+        """
+        changes = self.pending_for_question(question_id)
+        if not changes:
+            return {}
+        stored = dict(Vote.objects.filter(question_id=question_id,
+                                          user_id__in=changes)
+                      .values_list('user_id', 'choice_id'))
+        deltas = {}
+        for user_id, choice_id in changes.items():
+            previous_choice_id = stored.get(user_id)
+            if previous_choice_id == choice_id:
+                continue
+            if previous_choice_id is not None:
+                deltas[previous_choice_id] = deltas.get(
+                    previous_choice_id, 0) - 1
+            if choice_id is not None:
+                deltas[choice_id] = deltas.get(choice_id, 0) + 1
+        return deltas
+
+    def merge_tallies(self, question):
+        """Add the buffered changes to the tallies of a results page.
+
+        :param question: a question annotated with total_votes whose
+                         choices, in question.choices, carry vote_count
+                         and percentage
+        """
+        deltas = self.tally_deltas(question.pk)
+        if not deltas:
+            return
+        for choice in question.choices:
+            choice.vote_count += deltas.get(choice.pk, 0)
+        question.total_votes = sum(c.vote_count for c in question.choices)
+        for choice in question.choices:
+            choice.percentage = (choice.vote_count * 100.0
+                                 / question.total_votes
+                                 if question.total_votes else 0.0)
+
+    def flush(self):
+        """Write all buffered changes to the database.
+
+        The log is rotated before the changes are written and removed
+        only after the transaction has committed. Until then the changes
+        are kept in in_flight, where lookups still find them. If the
+        write fails, the changes stay in the rotated log and are written
+        again by the next flush.
+
+        :return: the number of votes that were written or removed
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                batch = self.in_flight = self.pending
+                self.pending = {}
+                if self._log is not None:
+                    self._log.close()
+                self._rotate_log()
+            try:
+                with transaction.atomic():
+                    written = apply_vote_batch(batch)
+                    # votes cast before a question closed may be written
+                    # after its results were frozen; they are retaken
+                    ResultSnapshot.objects.filter(question_id__in={
+                        question_id for _, question_id in batch}).delete()
+            except Exception:
+                logger.exception("failed to flush %d buffered votes",
+                                 len(batch))
+                with self._lock:
+                    batch.update(self.pending)
+                    self.pending = batch
+                    self.in_flight = {}
+                raise
+            transaction.on_commit(lambda: self._committed(batch))
+            self._flushing_path.unlink(missing_ok=True)
+            logger.debug("flushed %d buffered votes", written)
+            return written
+
+    def _committed(self, batch):
+        """Stop reading a flushed batch once the database holds it."""
+        with self._lock:
+            if self.in_flight is batch:
+                self.in_flight = {}
+
+    @property
+    def _flushing_path(self):
+        """Return the path the log is moved to while it is flushed."""
+        return self.log_path.with_name(self.log_path.name + '.flushing')
+
+    def _rotate_log(self):
+        """Move the current log aside before its changes are flushed.
+
+        A rotated log left by a failed flush is kept and the current
+        log is appended to it, so no change is lost before it has been
+        written.
+        """
+        if not self.log_path.exists():
+            return
+        if self._flushing_path.exists():
+            with open(self._flushing_path, 'a') as flushing:
+                flushing.write(self.log_path.read_text())
+                flushing.flush()
+                os.fsync(flushing.fileno())
+            self.log_path.unlink()
+        else:
+            os.replace(self.log_path, self._flushing_path)
+
+    def _start(self):
+        """Start the background flusher if it is not running."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='polls-vote-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Flush the buffer periodically until the buffer is closed."""
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                # close() writes the remaining changes itself
+                break
+            try:
+                self.flush()
+            except Exception:
+                # already logged; the changes are retried on the next flush
+                pass
+            finally:
+                close_old_connections()
+
+    def close(self):
+        """Stop the background flusher and write the remaining changes."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._log is not None:
+            self._log.close()
+
+
+def get_vote_buffer():
+    """Return the vote buffer of this process.
+
+    :return: the VoteBuffer, or None if POLLS_VOTE_BUFFER is disabled
+    """
+    global _buffer
+    if not settings.POLLS_VOTE_BUFFER:
+        return None
+    directory = Path(settings.POLLS_VOTE_BUFFER_DIR)
+    if _buffer is None or _buffer.directory != directory:
+        with _buffer_lock:
+            if _buffer is None or _buffer.directory != directory:
+                _buffer = VoteBuffer(
+                    directory,
+                    interval=settings.POLLS_VOTE_BUFFER_INTERVAL,
+                    batch_size=settings.POLLS_VOTE_BUFFER_BATCH_SIZE)
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def _forget_buffer():
+    """Drop the buffer inherited from the parent in a forked process."""
+    global _buffer
+    if _buffer is not None:
+        atexit.unregister(_buffer.close)
+        _buffer = None
+
+
+os.register_at_fork(after_in_child=_forget_buffer)
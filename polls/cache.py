@@ -0,0 +1,295 @@
+"""Cache helpers for KU Polls.
+
+Cached values live under versioned keys: a value's key includes the
+current version of what it was computed from, and changes invalidate
+the values by bumping the version, so that no stale value is ever read
+by any process sharing the cache. The version keys and values are kept
+in the default cache, configured with CACHE_BACKEND, and recently used
+values also in a small least-recently-used cache in each process.
+
+When a value is missing, a single caller computes it while other
+callers, in any process sharing the cache, wait for the result instead
+of computing it again. Values are computed from the default database,
+never from a read replica that may lag behind it.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Choice, Question
+from .routers import use_primary
+
+INDEX_VERSION_KEY = 'polls:index:version'
+
+# Seconds a caller may hold the lock for computing a value, and the
+# seconds between two checks of callers waiting for the value
+LOCK_TIMEOUT = 5
+LOCK_POLL_SECONDS = 0.05
+
+MISSING = object()
+
+
+class LRUCache:
+    """A thread-safe in-process cache of the most recently used values."""
+
+    def __init__(self, maxsize):
+        """Create an empty cache holding up to maxsize values."""
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value of key and mark it as recently used."""
+        with self._lock:
+            try:
+                self._values.move_to_end(key)
+            except KeyError:
+                return default
+            return self._values[key]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used values."""
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """Remove every value."""
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        """Return the number of values."""
+        return len(self._values)
+
+
+local_cache = LRUCache(settings.POLLS_CACHE_LOCAL_SIZE)
+
+
+def _version_key(name):
+    """Return the cache key of a version."""
+    return f'polls:{name}:version'
+
+
+def get_version(name):
+    """Return the current version of the values called name."""
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+async def aget_version(name):
+    """Return the current version of the values called name."""
+    key = _version_key(name)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(key, version, timeout=None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def bump_versions(*names):
+    """Invalidate the values with the given names."""
+    version = time.time_ns()
+    cache.set_many({_version_key(name): version for name in names},
+                   timeout=None)
+
+
+def get_index_version():
+    """Return the current version of the cached index page fragments."""
+    return get_version('index')
+
+
+def invalidate_index():
+    """Discard every cached index page fragment by bumping its version."""
+    bump_versions('index')
+
+
+def get_or_set(key, compute, timeout=None):
+    """Return the cached value of key, computing it once if missing.
+
+    :param key: a versioned cache key
+    :param compute: a function that returns the value
+    :param timeout: seconds the value is kept in the shared cache
+    """
+    value = local_cache.get(key, MISSING)
+    if value is MISSING:
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            value = _compute_once(key, compute, timeout)
+        local_cache.set(key, value)
+    return value
+
+
+def _compute_once(key, compute, timeout):
+    """Compute a missing value unless another caller is computing it."""
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_SECONDS)
+            value = cache.get(key, MISSING)
+            if value is not MISSING:
+                return value
+        # the caller holding the lock is too slow; compute it anyway
+    try:
+        with use_primary():
+            value = compute()
+        cache.set(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+async def aget_or_set(key, compute, timeout=None):
+    """Return the cached value of key, computing it once if missing.
+
+    :param key: a versioned cache key
+    :param compute: an async function that returns the value
+    :param timeout: seconds the value is kept in the shared cache
+    """
+    value = local_cache.get(key, MISSING)
+    if value is MISSING:
+        value = await cache.aget(key, MISSING)
+        if value is MISSING:
+            value = await _acompute_once(key, compute, timeout)
+        local_cache.set(key, value)
+    return value
+
+
+async def _acompute_once(key, compute, timeout):
+    """Compute a missing value unless another caller is computing it."""
+    lock_key = f'{key}:lock'
+    locked = await cache.aadd(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+            value = await cache.aget(key, MISSING)
+            if value is not MISSING:
+                return value
+    try:
+        with use_primary():
+            value = await compute()
+        await cache.aset(key, value, timeout)
+    finally:
+        if locked:
+            await cache.adelete(lock_key)
+    return value
+
+
+def invalidate_question(question_id):
+    """Discard the cached metadata and tallies of a question."""
+    bump_versions(f'question:{question_id}', f'tallies:{question_id}')
+
+
+def invalidate_tallies(*question_ids):
+    """Discard the cached tallies of questions."""
+    bump_versions(*(f'tallies:{question_id}' for question_id in question_ids))
+
+
+def _meta_key(question_id, version):
+    """Return the cache key of a question's metadata."""
+    return f'polls:question:{question_id}:{version}'
+
+
+def _tallies_key(question_id, version):
+    """Return the cache key of a question's tallies."""
+    return f'polls:tallies:{question_id}:{version}'
+
+
+def _meta(row, choices):
+    """Return the metadata of a question from its row and choices."""
+    if row is None:
+        return None
+    return {**row, 'choices': choices}
+
+
+def get_question_meta(question_id):
+    """Return the cached metadata of a question.
+
+    :return: a dict of the question's id, question_text, pub_date,
+             end_date and a list of (id, choice_text) of its choices
+             ordered by id, or None if the question does not exist
+    """
+    def compute():
+        row = (Question.objects.filter(pk=question_id)
+               .values('id', 'question_text', 'pub_date', 'end_date')
+               .first())
+        choices = list(Choice.objects.filter(question_id=question_id)
+                       .order_by('pk').values_list('id', 'choice_text'))
+        return _meta(row, choices)
+
+    key = _meta_key(question_id, get_version(f'question:{question_id}'))
+    return get_or_set(key, compute, settings.POLLS_CACHE_TIMEOUT)
+
+
+async def aget_question_meta(question_id):
+    """Return the cached metadata of a question, see get_question_meta."""
+    async def compute():
+        row = await (Question.objects.filter(pk=question_id)
+                     .values('id', 'question_text', 'pub_date', 'end_date')
+                     .afirst())
+        choices = [choice async for choice in
+                   Choice.objects.filter(question_id=question_id)
+                   .order_by('pk').values_list('id', 'choice_text')]
+        return _meta(row, choices)
+
+    version = await aget_version(f'question:{question_id}')
+    return await aget_or_set(_meta_key(question_id, version), compute,
+                             settings.POLLS_CACHE_TIMEOUT)
+
+
+def get_tallies(question_id):
+    """Return the cached vote counts of a question's choices by choice id."""
+    def compute():
+        return dict(Choice.objects.filter(question_id=question_id)
+                    .values_list('id', 'vote_count'))
+
+    key = _tallies_key(question_id, get_version(f'tallies:{question_id}'))
+    return get_or_set(key, compute, settings.POLLS_CACHE_TIMEOUT)
+
+
+async def aget_tallies(question_id):
+    """Return the cached vote counts of a question, see get_tallies."""
+    async def compute():
+        return {pk: votes async for pk, votes in
+                Choice.objects.filter(question_id=question_id)
+                .values_list('id', 'vote_count')}
+
+    version = await aget_version(f'tallies:{question_id}')
+    return await aget_or_set(_tallies_key(question_id, version), compute,
+                             settings.POLLS_CACHE_TIMEOUT)
+
+
+def apply_tallies(question, meta, tallies):
+    """Set the tallied choices of a question from cached values.
+
+    question.choices is set to the question's choices, each carrying
+    its vote_count and its share of the total votes as percentage, and
+    question.total_votes to the total, as the results page expects.
+
+    :param question: the question
+    :param meta: the question's metadata from get_question_meta()
+    :param tallies: the question's tallies from get_tallies()
+    """
+    question.choices = [
+        Choice(pk=pk, question=question, choice_text=text,
+               vote_count=tallies.get(pk, 0))
+        for pk, text in meta['choices']]
+    question.total_votes = sum(c.vote_count for c in question.choices)
+    for choice in question.choices:
+        choice.percentage = (choice.vote_count * 100.0 / question.total_votes
+                             if question.total_votes else 0.0)
@@ -0,0 +1,89 @@
+"""Conditional GET support for the pages of KU Polls.
+
+Pages carry an ETag built from cheap version stamps, such as
+Question.version, so that a browser revalidating a page it already has
+is answered with 304 Not Modified before the page's main queries run
+and before its template is rendered.
+"""
+import hashlib
+from django.contrib import messages
+from django.middleware.csrf import get_token
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+
+class ConditionalPageMixin:
+    """Answer conditional requests for a page with 304 Not Modified.
+
+    Views call not_modified() once the version stamps of the page are
+    known and pass the rendered page through add_validators(). Besides
+    the parts from get_etag_parts(), the ETag covers the parts from
+    get_visitor_parts(), by default the visitor and their CSRF cookie,
+    since every page shows the logged-in user and embeds a CSRF token.
+    A page with pending messages gets no
+    validators, so a 304 never hides a message and a message is never
+    shown again from a cached page.
+    """
+
+    # Seconds the browser may use the page without revalidating it
+    cache_max_age = 0
+    validators = None
+
+    def get_etag_parts(self):
+        """Return the values that change whenever the page changes."""
+        raise NotImplementedError
+
+    def get_last_modified(self):
+        """Return when the page last changed, or None if unknown."""
+        return None
+
+    def get_visitor_parts(self):
+        """Return the values that make the page differ between visitors.
+
+        These are the logged-in user and the CSRF secret that the page's
+        tokens are made from; get_token() creates the secret for a
+        visitor without a CSRF cookie.
+        """
+        get_token(self.request)
+        return [self.request.user.pk, self.request.META['CSRF_COOKIE']]
+
+    def not_modified(self):
+        """Return a 304 response if the visitor's copy is up to date.
+
+        :return: an HttpResponseNotModified, or None if the page must
+                 be rendered
+        """
+        request = self.request
+        self.validators = None
+        if len(messages.get_messages(request)):
+            return None
+        parts = [*self.get_visitor_parts(), *self.get_etag_parts()]
+        digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False)
+        etag = f'"{digest.hexdigest()}"'
+        last_modified = self.get_last_modified()
+        self.validators = (etag, last_modified)
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=(int(last_modified.timestamp())
+                           if last_modified else None))
+        if response is not None:
+            return self.add_validators(response)
+        return None
+
+    def add_validators(self, response):
+        """Add the ETag, Last-Modified and cache headers to a response."""
+        if self.validators is not None and response.status_code in (200,
+                                                                    304):
+            etag, last_modified = self.validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(
+                    last_modified.timestamp())
+            if self.cache_max_age:
+                patch_cache_control(response, private=True,
+                                    max_age=self.cache_max_age)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        return response
@@ -0,0 +1,148 @@
+"""Streaming export of the polls, their tallies and votes.
+
+Questions, choices with their vote counts and, optionally, votes are
+exported as records of one of the RECORD_FIELDS kinds. Each kind is
+read with a single query whose rows are fetched in chunks by
+QuerySet.iterator(), and the records are encoded into chunks of text as
+they are read, so an export of any size runs in constant memory and
+its first bytes are sent right away.
+"""
+import csv
+import io
+import json
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+
+from .models import Choice, Question, Vote
+
+# The fields of each kind of record, in order
+RECORD_FIELDS = {
+    'question': ('question_id', 'question_text', 'pub_date', 'end_date'),
+    'choice': ('question_id', 'choice_id', 'choice_text', 'votes'),
+    'vote': ('question_id', 'choice_id', 'vote_id', 'user_id'),
+}
+# The columns of the CSV export: the kind of record and the union of the
+# fields of all kinds
+CSV_COLUMNS = ('record', 'question_id', 'question_text', 'pub_date',
+               'end_date', 'choice_id', 'choice_text', 'votes', 'vote_id',
+               'user_id')
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Rows fetched from the database at a time
+CHUNK_SIZE = 2000
+# Approximate number of characters in each chunk of output
+BUFFER_SIZE = 64 * 1024
+
+
+def export_records(votes=False, chunk_size=CHUNK_SIZE):
+    """Yield the questions, choices and optionally votes as records.
+
+    :param votes: also yield a record per vote
+    :param chunk_size: number of rows fetched from the database at once
+    :return: an iterator of (kind, values) tuples, where values follow
+             RECORD_FIELDS[kind]
+    """
+    querysets = [
+        ('question', Question.objects.order_by('pk').values_list(
+            'pk', 'question_text', 'pub_date', 'end_date')),
+        ('choice', Choice.objects.order_by('question_id', 'pk').values_list(
+            'question_id', 'pk', 'choice_text', 'vote_count')),
+    ]
+    if votes:
+        querysets.append(('vote', Vote.objects.order_by('pk').values_list(
+            'question_id', 'choice_id', 'pk', 'user_id')))
+    for kind, queryset in querysets:
+        for values in queryset.iterator(chunk_size=chunk_size):
+            yield kind, values
+
+
+def _buffered(lines):
+    """Join lines of text into chunks of about BUFFER_SIZE characters.
+
+    The first line is yielded on its own, so that it is sent before the
+    first chunk of rows is read.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None:
+        yield first
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _format(value):
+    """Return a value as it is written to the export."""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(records):
+    """Yield a header line and a CSV line per record."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        writer.writerow(row)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(CSV_COLUMNS)
+    for kind, values in records:
+        row = dict(zip(RECORD_FIELDS[kind], values), record=kind)
+        yield line([_format(row.get(column)) for column in CSV_COLUMNS])
+
+
+def _ndjson_lines(records):
+    """Yield a JSON object per record, one per line."""
+    for kind, values in records:
+        record = {'record': kind}
+        record.update((field, _format(value)) for field, value
+                      in zip(RECORD_FIELDS[kind], values))
+        yield json.dumps(record) + '\n'
+
+
+def stream_export(output_format, votes=False, chunk_size=CHUNK_SIZE):
+    """Yield the export as chunks of text.
+
+    :param output_format: "csv" or "ndjson"
+    :param votes: also export every vote
+    :param chunk_size: number of rows fetched from the database at once
+    """
+    lines = {'csv': _csv_lines, 'ndjson': _ndjson_lines}[output_format]
+    return _buffered(lines(export_records(votes, chunk_size)))
+
+
+@staff_member_required
+def export(request):
+    """Stream the polls as a CSV or NDJSON download.
+
+    The format is chosen by the ``format`` query parameter, csv by
+    default, and votes are included if ``votes`` is 1.
+
+    :param request: request from a staff user
+    :return: a streaming response of the export
+    """
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in FORMATS:
+        return HttpResponseBadRequest(
+            f"Unknown format, use one of {', '.join(FORMATS)}.")
+    votes = request.GET.get('votes') == '1'
+    response = StreamingHttpResponse(stream_export(output_format, votes),
+                                     content_type=FORMATS[output_format])
+    response['Content-Disposition'] = (
+        f'attachment; filename="polls.{output_format}"')
+    return response
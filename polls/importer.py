@@ -0,0 +1,213 @@
+"""Bulk import of poll fixtures.
+
+Fixture files, either a JSON array as written by dumpdata or one
+fixture object per line (NDJSON), are parsed incrementally, so a file
+never has to fit in memory. The objects are deserialized with Django's
+fixture deserializer and inserted in batches, with PostgreSQL COPY when
+the database is PostgreSQL and bulk_create otherwise. Rows that already
+exist, by primary key or by a unique constraint, are skipped, so
+importing the same files again changes nothing.
+
+The whole import runs in one transaction, in which foreign keys are
+only checked at the commit, so the files may be given in any order.
+"""
+import json
+from django.apps import apps
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .cache import bump_versions, invalidate_index
+from .models import Choice, Question, Vote
+from .scheduler import update_states
+
+# Characters between two objects of a JSON array or NDJSON file
+_SEPARATORS = ' \t\r\n,[]'
+READ_SIZE = 64 * 1024
+BATCH_SIZE = 5000
+
+
+def iter_objects(stream):
+    """Yield the objects of a JSON array or NDJSON stream one at a time.
+
+    :param stream: a text file containing a JSON array of objects or
+                   one JSON object per line
+    :raise ValueError: if the stream holds invalid JSON
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos < len(buffer):
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield obj
+                continue
+        if eof:
+            return
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+class PollImporter:
+    """Insert fixture objects in batches, skipping existing rows.
+
+    Votes of older fixtures without a question get the question of
+    their choice, looked up among the imported choices or, failing
+    that, in the database.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, use_copy=None):
+        """Create an importer.
+
+        :param batch_size: number of objects inserted at once
+        :param use_copy: insert with PostgreSQL COPY; by default when
+                         the database is PostgreSQL
+        """
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.pending = {}
+        self.m2m = []
+        self.counts = {}
+        self.choice_questions = {}
+        self.question_ids = set()
+        self._copy_tables = set()
+
+    def run(self, paths):
+        """Import fixture files in one transaction.
+
+        :param paths: paths of the fixture files
+        :return: the number of objects read per model label
+        """
+        with transaction.atomic():
+            for path in paths:
+                with open(path, encoding='utf-8') as stream:
+                    self.add_all(iter_objects(stream))
+            self.flush()
+            self.reset_sequences()
+            # the states in the files may be stale or missing
+            update_states()
+        self.invalidate_cache()
+        return self.counts
+
+    def add_all(self, objects):
+        """Add fixture objects, inserting every full batch."""
+        for deserialized in serializers.deserialize('python', objects):
+            obj = deserialized.object
+            model = type(obj)
+            if model is Question and obj.pk is not None:
+                # a question without a pk has no choices in the files
+                self.question_ids.add(obj.pk)
+            elif model is Choice:
+                self.choice_questions[obj.pk] = obj.question_id
+                self.question_ids.add(obj.question_id)
+            m2m_data = {name: values for name, values
+                        in (deserialized.m2m_data or {}).items() if values}
+            if m2m_data:
+                self.m2m.append((obj, m2m_data))
+            batch = self.pending.setdefault(model, [])
+            batch.append(obj)
+            label = model._meta.label
+            self.counts[label] = self.counts.get(label, 0) + 1
+            if len(batch) >= self.batch_size:
+                self.insert(model, batch)
+                self.pending[model] = []
+
+    def flush(self):
+        """Insert the remaining objects and many-to-many relations."""
+        for model, batch in self.pending.items():
+            if batch:
+                self.insert(model, batch)
+        self.pending = {}
+        for obj, m2m_data in self.m2m:
+            for name, values in m2m_data.items():
+                getattr(obj, name).add(*values)
+        self.m2m = []
+
+    def insert(self, model, objects):
+        """Insert a batch of objects of one model, skipping existing rows."""
+        if model is Vote:
+            self.resolve_vote_questions(objects)
+        if self.use_copy:
+            self.copy(model, objects)
+        else:
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def resolve_vote_questions(self, votes):
+        """Fill in the question of votes from their choices."""
+        missing = {vote.choice_id for vote in votes
+                   if vote.question_id is None
+                   and vote.choice_id not in self.choice_questions}
+        if missing:
+            self.choice_questions.update(
+                Choice.objects.filter(pk__in=missing)
+                .values_list('pk', 'question_id'))
+        for vote in votes:
+            if vote.question_id is None:
+                vote.question_id = self.choice_questions.get(vote.choice_id)
+        self.question_ids.update(vote.question_id for vote in votes
+                                 if vote.question_id is not None)
+
+    def copy(self, model, objects):
+        """Insert objects with COPY into a temporary table.
+
+        The rows are copied into a temporary table, dropped at the
+        commit, and moved to the model's table with one INSERT ... ON
+        CONFLICT DO NOTHING. The values are prepared like bulk_create
+        does, so automatic dates are filled in.
+        """
+        meta = model._meta
+        fields = meta.concrete_fields
+        table = connection.ops.quote_name(meta.db_table)
+        temp = connection.ops.quote_name(f'import_{meta.db_table}')
+        columns = ', '.join(connection.ops.quote_name(field.column)
+                            for field in fields)
+        with connection.cursor() as cursor:
+            if meta.db_table not in self._copy_tables:
+                cursor.execute(f'CREATE TEMPORARY TABLE {temp} '
+                               f'(LIKE {table}) ON COMMIT DROP')
+                self._copy_tables.add(meta.db_table)
+            with cursor.cursor.copy(
+                    f'COPY {temp} ({columns}) FROM STDIN') as copy:
+                for obj in objects:
+                    copy.write_row([
+                        field.get_db_prep_save(
+                            field.pre_save(obj, add=True), connection)
+                        for field in fields])
+            cursor.execute(f'INSERT INTO {table} ({columns}) '
+                           f'SELECT {columns} FROM {temp} '
+                           f'ON CONFLICT DO NOTHING')
+            cursor.execute(f'TRUNCATE {temp}')
+
+    def reset_sequences(self):
+        """Move the primary key sequences past the imported keys."""
+        models = [apps.get_model(label) for label in self.counts]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def invalidate_cache(self):
+        """Discard the cached pages and metadata of the imported questions.
+
+        The rows are inserted without saving models, so the signals that
+        usually invalidate the cache are not sent. Their tallies are
+        invalidated by rebuildvotecounts once their counters are
+        recounted, see the importpolls command.
+        """
+        invalidate_index()
+        if self.question_ids:
+            bump_versions(*(f'question:{question_id}'
+                            for question_id in self.question_ids))
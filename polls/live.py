@@ -0,0 +1,169 @@
+"""Live results of KU Polls streamed as Server-Sent Events.
+
+Clients watching a results page subscribe to a question in the
+in-process ResultsHub through results_stream. Whenever votes of the
+question change, the polls.signals.votes_changed signal publishes the
+question to the hub once the transaction commits, and every stream
+of the question sends the new tallies. Only changes made by the same
+process are seen, so with several worker processes a stream is
+updated by votes that its own process handles.
+
+Streams are only served under ASGI. A WSGI server would hold a worker
+thread for the whole stream and buffer it before sending anything, so
+there the results page does not open a stream, and results_stream
+sends the current tallies once and lets the client reconnect.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .cache import aget_question_meta, aget_tallies
+
+# Seconds between two keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+# Seconds after which a stream is closed; browsers reconnect by themselves
+MAX_STREAM_SECONDS = 600
+# Milliseconds browsers wait before reconnecting to a closed stream
+RETRY_MILLISECONDS = 5000
+
+
+class ResultsHub:
+    """Publish changes of questions to the streams subscribed to them.
+
+    Each subscription is an asyncio.Queue owned by the event loop of its
+    stream. Publishing is thread-safe and never blocks: a subscriber
+    that has not consumed the previous change yet is not notified
+    again, since it reads the latest tallies anyway.
+    """
+
+    def __init__(self):
+        """Create a hub without subscribers."""
+        self._subscribers = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def subscribe(self, question_id):
+        """Subscribe the running event loop to changes of a question.
+
+        :return: a queue that receives an item after every change
+        """
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers[question_id][queue] = (
+                asyncio.get_running_loop())
+        return queue
+
+    def unsubscribe(self, question_id, queue):
+        """Remove a subscription made by subscribe()."""
+        with self._lock:
+            subscribers = self._subscribers.get(question_id, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(question_id, None)
+
+    def subscriber_count(self, question_id):
+        """Return the number of streams subscribed to a question."""
+        with self._lock:
+            return len(self._subscribers.get(question_id, {}))
+
+    def publish(self, *question_ids):
+        """Notify the subscribers of the given questions of a change."""
+        for question_id in question_ids:
+            with self._lock:
+                subscribers = list(
+                    self._subscribers.get(question_id, {}).items())
+            for queue, loop in subscribers:
+                try:
+                    loop.call_soon_threadsafe(_notify, queue)
+                except RuntimeError:
+                    # the stream's event loop has been closed
+                    self.unsubscribe(question_id, queue)
+
+
+def _notify(queue):
+    """Put a change notification on queue unless one is waiting."""
+    if queue.empty():
+        queue.put_nowait(True)
+
+
+hub = ResultsHub()
+
+
+async def get_tallies(question_id):
+    """Return the tallies of a question as a JSON-serializable dict.
+
+    The tallies are read from the cache, so all the streams of a
+    question share a single query after each change.
+    """
+    tallies = await aget_tallies(question_id)
+    total = sum(tallies.values())
+    return {
+        'question': question_id,
+        'total': total,
+        'choices': [
+            {'id': pk,
+             'votes': votes,
+             'percentage': (round(votes * 100.0 / total, 1)
+                            if total else 0.0)}
+            for pk, votes in sorted(tallies.items())],
+    }
+
+
+def streams_live(request):
+    """Return True if the request is served under ASGI, which streams."""
+    return isinstance(request, ASGIRequest)
+
+
+def format_event(data):
+    """Return data encoded as a Server-Sent Events message."""
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def event_stream(question_id):
+    """Yield the tallies of a question now and after every change."""
+    queue = hub.subscribe(question_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        yield (f"retry: {RETRY_MILLISECONDS}\n"
+               + format_event(await get_tallies(question_id)))
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(await get_tallies(question_id))
+    finally:
+        hub.unsubscribe(question_id, queue)
+
+
+async def results_stream(request, pk):
+    """Stream the tallies of a published question as Server-Sent Events.
+
+    Under WSGI only the current tallies are sent, see the module
+    docstring.
+
+    :param request: request from the visitor
+    :param pk: primary key of the question
+    :return: a streaming text/event-stream response
+    """
+    question = await aget_question_meta(pk)
+    if question is None:
+        raise Http404("No Question matches the given query.")
+    if question['pub_date'] > timezone.now():
+        raise Http404("Results are unavailable.")
+    if streams_live(request):
+        response = StreamingHttpResponse(event_stream(pk),
+                                         content_type='text/event-stream')
+    else:
+        response = HttpResponse(
+            f"retry: {RETRY_MILLISECONDS}\n"
+            + format_event(await get_tallies(pk)),
+            content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
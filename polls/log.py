@@ -0,0 +1,195 @@
+"""Non-blocking logging for KU Polls.
+
+The handlers configured in LOGGING for the polls logger write to files
+and streams, which would block the request that logs a record. When
+the polls app is ready, install_queue() moves those handlers behind a
+bounded queue: the request thread only puts the record on the queue
+and a QueueListener thread formats and writes it. A process forked
+after install_queue(), such as an app server worker, starts its own
+listener thread.
+
+When the queue is full, the "drop" overflow policy discards the record
+and reports the number of dropped records once the queue has room
+again, and the "block" policy waits up to a timeout for room.
+"""
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+OVERFLOW_POLICIES = ('drop', 'block')
+
+# Attributes every LogRecord has; any other attribute came from extra
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {
+    'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line.
+
+    The object holds the time, level, logger, module and message of the
+    record, the formatted exception if there is one, and every value
+    passed to the logging call in extra.
+    """
+
+    def format(self, record):
+        """Return the record as a JSON string."""
+        data = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in data:
+                data[key] = value
+        return json.dumps(data, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Put records on a bounded queue with an overflow policy."""
+
+    def __init__(self, queue_, overflow='drop', timeout=1.0):
+        """Create a handler for a bounded queue.
+
+        :param queue_: the queue read by a QueueListener
+        :param overflow: "drop" to discard records when the queue is
+                         full, or "block" to wait for room
+        :param timeout: seconds the "block" policy waits before the
+                        record is dropped after all
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        super().__init__(queue_)
+        self.overflow = overflow
+        self.timeout = timeout
+        self.listener = None
+        self.dropped = 0
+        self._unreported = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        """Return a copy of the record that is safe to format later.
+
+        Unlike QueueHandler.prepare, the record is not formatted here,
+        so the formatters of the listener's handlers see its attributes.
+        Only the message arguments and the exception are resolved now,
+        since they may change or go away after the logging call.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """Put a record on the queue following the overflow policy."""
+        if self._unreported:
+            self._report_dropped(record)
+        self._put(record)
+
+    def _put(self, record):
+        """Put a record on the queue, counting it if it is dropped.
+
+        :return: True if the record was queued
+        """
+        try:
+            if self.overflow == 'block':
+                self.queue.put(record, timeout=self.timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                self._unreported += 1
+            return False
+        return True
+
+    def _report_dropped(self, record):
+        """Queue a warning about the records dropped since the last one."""
+        with self._dropped_lock:
+            count, self._unreported = self._unreported, 0
+        warning = logging.makeLogRecord({
+            'name': record.name,
+            'levelno': logging.WARNING,
+            'levelname': logging.getLevelName(logging.WARNING),
+            'msg': "%d log records were dropped because the queue was full",
+            'args': (count,),
+        })
+        if not self._put(self.prepare(warning)):
+            # the warning itself is not counted as a dropped record
+            with self._dropped_lock:
+                self.dropped -= 1
+                self._unreported += count - 1
+
+    def restart(self):
+        """Start a new queue and listener in a forked process.
+
+        The listener thread of the parent does not exist in the child,
+        so records put on the inherited queue would never be written.
+        """
+        if self.listener is None:
+            return
+        self._dropped_lock = threading.Lock()
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = QueueListener(
+            self.queue, *self.listener.handlers,
+            respect_handler_level=self.listener.respect_handler_level)
+        self.listener.start()
+
+    def close(self):
+        """Stop the listener, writing the records left on the queue."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+def install_queue(logger_name, queue_size=10000, overflow='drop',
+                  timeout=1.0):
+    """Move the handlers of a logger behind a bounded queue.
+
+    The logger's handlers are attached to a QueueListener started in a
+    background thread, and replaced on the logger by a single
+    BoundedQueueHandler. Calling it again for the same logger does
+    nothing.
+
+    :param logger_name: name of the logger
+    :param queue_size: maximum number of records waiting on the queue
+    :param overflow: "drop" or "block", see BoundedQueueHandler
+    :param timeout: seconds the "block" policy waits for room
+    :return: the installed handler, or None if the logger had no
+             handlers to move or already used a queue
+    """
+    logger = logging.getLogger(logger_name)
+    handlers = list(logger.handlers)
+    if not handlers or any(isinstance(handler, BoundedQueueHandler)
+                           for handler in handlers):
+        return None
+    queue_handler = BoundedQueueHandler(queue.Queue(queue_size),
+                                        overflow=overflow, timeout=timeout)
+    queue_handler.listener = QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True)
+    queue_handler.listener.start()
+    os.register_at_fork(after_in_child=queue_handler.restart)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    return queue_handler
@@ -0,0 +1,57 @@
+"""Management command that compares the WSGI and ASGI polls views."""
+import json
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from polls import bench
+from polls.models import Question
+
+DEFAULT_FIXTURES = ['data/users.json', 'data/polls-v4.json',
+                    'data/votes-v4.json']
+
+
+class Command(BaseCommand):
+    """Measure requests per second of the sync and async views."""
+
+    help = ("Load fixtures into a test database and compare requests per "
+            "second of the polls views under WSGI and ASGI.")
+
+    def add_arguments(self, parser):
+        """Add the benchmark options."""
+        parser.add_argument('fixtures', nargs='*', default=DEFAULT_FIXTURES,
+                            help="fixtures to load into the test database")
+        parser.add_argument('--requests', type=int, default=200,
+                            help="requests sent to each route")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="number of concurrent clients")
+
+    def handle(self, *args, **options):
+        """Run the benchmark and print the results as JSON."""
+        with bench.test_database():
+            call_command('importpolls', *options['fixtures'],
+                         stdout=self.stdout)
+            user = User.objects.filter(is_staff=False).first()
+            question = next(q for q in Question.objects.order_by('pk')
+                            if q.can_vote() and q.choice_set.exists())
+            choice = question.choice_set.first()
+            routes = {
+                'index': ('get', reverse('polls:index'), {}),
+                'detail': ('get', reverse('polls:detail',
+                                          args=(question.pk,)), {}),
+                'results': ('get', reverse('polls:results',
+                                           args=(question.pk,)), {}),
+                'vote': ('post', reverse('polls:vote', args=(question.pk,)),
+                         {'choice': choice.pk}),
+            }
+            report = {}
+            for name, request in routes.items():
+                requests = [request] * options['requests']
+                report[name] = {
+                    'wsgi': bench.run_wsgi(requests, [user],
+                                           options['concurrency']),
+                    'asgi': bench.run_asgi(requests, [user],
+                                           options['concurrency']),
+                }
+        self.stdout.write(json.dumps(report, indent=2))
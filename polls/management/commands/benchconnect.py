@@ -0,0 +1,34 @@
+"""Management command that measures the cost of database connections."""
+import json
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from polls import bench
+
+
+class Command(BaseCommand):
+    """Compare queries on new and reused database connections."""
+
+    help = ("Time a trivial query on a new connection and on a reused "
+            "one, showing the overhead that DATABASE_CONN_MAX_AGE or "
+            "DATABASE_POOL remove from each request, as JSON.")
+
+    def add_arguments(self, parser):
+        """Add the benchmark options."""
+        parser.add_argument('--database', default='default',
+                            help="alias of the database to connect to")
+        parser.add_argument('--iterations', type=int, default=100,
+                            help="queries timed for each kind")
+
+    def handle(self, *args, **options):
+        """Run the benchmark and print the results as JSON."""
+        connection = connections[options['database']]
+        report = {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'pool': bool(connection.settings_dict['OPTIONS'].get('pool')),
+            'iterations': options['iterations'],
+        }
+        report.update(bench.time_connections(options['database'],
+                                             options['iterations']))
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,108 @@
+"""Management command that load-tests the polls URLs."""
+import json
+import random
+import subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import bench
+from polls.models import Question
+
+ROUTES = ['index', 'detail', 'results', 'vote', 'remove_vote']
+
+
+def git_commit():
+    """Return the commit of the working tree, or None outside git."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Benchmark the polls routes on a synthetic dataset."""
+
+    help = ("Generate a synthetic dataset in a test database, drive the "
+            "polls routes and report latency percentiles, queries per "
+            "request and requests per second as JSON.")
+
+    def add_arguments(self, parser):
+        """Add the dataset and load options."""
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--choices', type=int, default=4,
+                            help="choices per question")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--votes-per-user', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200,
+                            help="requests sent to each route")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="number of concurrent clients")
+        parser.add_argument('--routes', nargs='+', choices=ROUTES,
+                            default=ROUTES)
+        parser.add_argument('--asgi', action='store_true',
+                            help="serve the async views through ASGI")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output',
+                            help="write the report to this file as well")
+
+    def handle(self, *args, **options):
+        """Build the dataset, run every route and print the report."""
+        rng = random.Random(options['seed'])
+        with bench.test_database():
+            users = bench.generate_dataset(
+                questions=options['questions'], choices=options['choices'],
+                users=options['users'],
+                votes_per_user=options['votes_per_user'],
+                seed=options['seed'])
+            requests = self.build_requests(rng, options['requests'])
+            run = bench.run_asgi if options['asgi'] else bench.run_wsgi
+            report = {
+                'commit': git_commit(),
+                'date': timezone.now().isoformat(),
+                'handler': 'asgi' if options['asgi'] else 'wsgi',
+                'options': {key: options[key] for key in (
+                    'questions', 'choices', 'users', 'votes_per_user',
+                    'requests', 'concurrency', 'seed')},
+                'routes': {},
+            }
+            for route in options['routes']:
+                result = run(requests[route], users, options['concurrency'])
+                result['queries_per_request'] = bench.count_queries(
+                    requests[route][:20], users)
+                report['routes'][route] = result
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        self.stdout.write(output)
+
+    def build_requests(self, rng, count):
+        """Return count random requests for each route.
+
+        :return: a dict of route name to (method, path, data) tuples
+        """
+        now = timezone.now()
+        questions = list(Question.objects.filter(pub_date__lte=now)
+                         .prefetch_related('choice_set'))
+        published = [q for q in questions if q.choice_set.all()]
+        open_questions = [q for q in published if q.can_vote()]
+        if not open_questions:
+            raise ValueError("the dataset has no question open for voting")
+        voted = [rng.choice(open_questions) for _ in range(count)]
+        return {
+            'index': [('get', reverse('polls:index'), {})] * count,
+            'detail': [('get', reverse('polls:detail', args=(q.pk,)), {})
+                       for q in rng.choices(open_questions, k=count)],
+            'results': [('get', reverse('polls:results', args=(q.pk,)), {})
+                        for q in rng.choices(published, k=count)],
+            'vote': [('post', reverse('polls:vote', args=(q.pk,)),
+                      {'choice': rng.choice(q.choice_set.all()).pk})
+                     for q in voted],
+            'remove_vote': [('post', reverse('polls:remove_vote',
+                                             args=(q.pk,)), {})
+                            for q in voted],
+        }
@@ -0,0 +1,52 @@
+"""Management command that compares the session backends."""
+import json
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from polls import bench
+from polls.models import Question
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+class Command(BaseCommand):
+    """Count the SQL queries of vote requests under each session backend."""
+
+    help = ("Generate a synthetic dataset in a test database and report "
+            "the SQL queries per vote and results request with each "
+            "session backend as JSON.")
+
+    def add_arguments(self, parser):
+        """Add the benchmark options."""
+        parser.add_argument('--requests', type=int, default=50,
+                            help="requests sent for each backend")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Run the benchmark and print the results as JSON."""
+        with bench.test_database():
+            users = bench.generate_dataset(questions=20, users=5,
+                                           seed=options['seed'])
+            question = next(q for q in Question.objects.order_by('pk')
+                            if q.can_vote() and q.choice_set.exists())
+            choices = list(question.choice_set.values_list('pk', flat=True))
+            vote_url = reverse('polls:vote', args=(question.pk,))
+            results_url = reverse('polls:results', args=(question.pk,))
+            routes = {
+                'vote': [('post', vote_url,
+                          {'choice': choices[n % len(choices)]})
+                         for n in range(options['requests'])],
+                'results': [('get', results_url, {})] * options['requests'],
+            }
+            report = {}
+            for route, requests in routes.items():
+                cache.clear()
+                report[route] = bench.compare_session_engines(
+                    requests, users, SESSION_ENGINES)
+        self.stdout.write(json.dumps({'queries_per_request': report},
+                                     indent=2))
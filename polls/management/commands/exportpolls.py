@@ -0,0 +1,37 @@
+"""Management command that exports the polls as CSV or NDJSON."""
+from django.core.management.base import BaseCommand
+
+from polls.export import CHUNK_SIZE, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    """Write every question, choice and tally, and optionally votes."""
+
+    help = ("Export the questions, choices with their vote counts and "
+            "optionally the votes as CSV or NDJSON.")
+
+    def add_arguments(self, parser):
+        """Add the export options."""
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='csv', help="output format")
+        parser.add_argument('--votes', action='store_true',
+                            help="also export every vote")
+        parser.add_argument('--output', default='-',
+                            help="file to write, - for standard output")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help="rows fetched from the database at once")
+
+    def handle(self, *args, **options):
+        """Stream the export to the output."""
+        chunks = stream_export(options['format'], votes=options['votes'],
+                               chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            output = self.stdout
+            for chunk in chunks:
+                output.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported the polls to {options['output']}."))
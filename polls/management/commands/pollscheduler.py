@@ -0,0 +1,41 @@
+"""Management command that flips the states of questions on schedule."""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from polls.scheduler import PollScheduler, update_states
+
+
+class Command(BaseCommand):
+    """Open and close questions when their dates pass.
+
+    The worker sleeps until the next pub_date or end_date of a question
+    and then updates the stored states, see polls.scheduler. Run one
+    worker next to the app servers, or run it with --once from cron
+    when states may lag behind the dates by the cron period.
+    """
+
+    help = "Open and close questions when their pub_date or end_date passes."
+
+    def add_arguments(self, parser):
+        """Add the --once and --interval options."""
+        parser.add_argument('--once', action='store_true',
+                            help="update the states once and exit")
+        parser.add_argument('--interval', type=float,
+                            default=settings.POLLS_SCHEDULER_INTERVAL,
+                            help="longest time in seconds between two "
+                                 "updates")
+
+    def handle(self, *args, **options):
+        """Update the states once, or until the worker is interrupted."""
+        if options['once']:
+            changed = update_states()
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated the state of "
+                f"{sum(map(len, changed.values()))} questions."))
+            return
+        self.stdout.write("Scheduling the question states; "
+                          "press CTRL-C to stop.")
+        try:
+            PollScheduler(options['interval']).run()
+        except KeyboardInterrupt:
+            pass
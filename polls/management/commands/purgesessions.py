@@ -0,0 +1,44 @@
+"""Management command that deletes expired sessions in batches."""
+import time
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """Delete the expired rows of the django_session table.
+
+    Unlike clearsessions, which deletes every expired session in one
+    statement, the rows are deleted in short batches, so that the
+    table is never locked for long while users log in and vote.
+    """
+
+    help = "Delete expired sessions from the database in batches."
+
+    def add_arguments(self, parser):
+        """Add the batch options."""
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="sessions deleted per statement")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="seconds to wait between two batches")
+
+    def handle(self, *args, **options):
+        """Delete the expired sessions until none is left."""
+        if settings.SESSION_ENGINE.endswith(('.signed_cookies', '.cache')):
+            self.stdout.write("Sessions are not stored in the database.")
+            return
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('pk', flat=True)
+                        [:options['batch_size']])
+            if not keys:
+                break
+            count, _ = Session.objects.filter(pk__in=keys).delete()
+            deleted += count
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired sessions."))
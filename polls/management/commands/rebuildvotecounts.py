@@ -0,0 +1,46 @@
+"""Management command that rebuilds the vote counters of choices."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from polls.models import Choice, Question, ResultSnapshot, Vote
+from polls.signals import votes_changed
+
+
+class Command(BaseCommand):
+    """Recount Choice.vote_count from the stored votes.
+
+    Results snapshots are removed and votes_changed is sent for the
+    questions, which bumps their versions and invalidates their cached
+    tallies, since pages of the questions may show the old counts.
+    """
+
+    help = "Rebuild the vote counter of every choice from the Vote table."
+
+    def add_arguments(self, parser):
+        """Add the ids of the questions to rebuild."""
+        parser.add_argument('question_ids', nargs='*', type=int,
+                            help="rebuild only the choices of these "
+                                 "questions")
+
+    def handle(self, *args, **options):
+        """Update every choice's counter in a single statement."""
+        votes = (Vote.objects.filter(choice=OuterRef('pk'))
+                 .order_by().values('choice')
+                 .annotate(total=Count('pk')).values('total'))
+        choices = Choice.objects.all()
+        snapshots = ResultSnapshot.objects.all()
+        questions = Question.objects.all()
+        if options['question_ids']:
+            choices = choices.filter(question__in=options['question_ids'])
+            snapshots = snapshots.filter(
+                question__in=options['question_ids'])
+            questions = questions.filter(pk__in=options['question_ids'])
+        with transaction.atomic():
+            updated = choices.update(vote_count=Coalesce(Subquery(votes), 0))
+            snapshots.delete()
+            votes_changed.send(sender=Vote, question_ids=list(
+                questions.values_list('pk', flat=True)))
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt vote counts for {updated} choices."))
@@ -0,0 +1,166 @@
+"""Per-request performance metrics of KU Polls.
+
+RequestMetricsMiddleware measures every request and adds it to the
+per-route histograms of the process-wide registry, which also counts
+the database connections the process opens. Staff users can read the
+histograms and the connection statistics, including the saturation of
+the connection pools, as JSON from the metrics view.
+
+Queries are timed by a wrapper installed on every connection, which
+adds each query to the timer of the request in current_timer. The
+timer follows the request into the worker threads of async views,
+where the queries run on the connections of those threads.
+"""
+import bisect
+import threading
+from contextvars import ContextVar
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.http import JsonResponse
+
+# Upper bounds in milliseconds of the wall time histogram buckets
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RouteStats:
+    """Aggregated measurements of the requests to one route."""
+
+    def __init__(self):
+        """Create empty statistics."""
+        self.count = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.sql_ms = 0.0
+        self.queries = 0
+        self.template_ms = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, sample):
+        """Add the measurements of one request."""
+        self.count += 1
+        self.wall_ms += sample['wall_ms']
+        self.max_wall_ms = max(self.max_wall_ms, sample['wall_ms'])
+        self.sql_ms += sample['sql_ms']
+        self.queries += sample['queries']
+        self.template_ms += sample['template_ms']
+        self.histogram[bisect.bisect_left(BUCKETS_MS,
+                                          sample['wall_ms'])] += 1
+
+    def as_dict(self):
+        """Return the statistics as a JSON-serializable dict."""
+        count = self.count or 1
+        buckets = [f"le_{bound}" for bound in BUCKETS_MS] + ['inf']
+        return {
+            'count': self.count,
+            'mean_wall_ms': round(self.wall_ms / count, 2),
+            'max_wall_ms': round(self.max_wall_ms, 2),
+            'mean_sql_ms': round(self.sql_ms / count, 2),
+            'mean_queries': round(self.queries / count, 2),
+            'mean_template_ms': round(self.template_ms / count, 2),
+            'histogram_ms': dict(zip(buckets, self.histogram)),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe collection of RouteStats by route name."""
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._routes = {}
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, sample):
+        """Add the measurements of a request to its route."""
+        with self._lock:
+            self._routes.setdefault(route, RouteStats()).add(sample)
+
+    def count_connection(self, alias):
+        """Count a new connection to the database alias."""
+        with self._lock:
+            self._connections[alias] = self._connections.get(alias, 0) + 1
+
+    def connections_opened(self, alias):
+        """Return the number of connections opened to a database alias."""
+        with self._lock:
+            return self._connections.get(alias, 0)
+
+    def snapshot(self):
+        """Return the statistics of every route as a dict."""
+        with self._lock:
+            return {route: stats.as_dict()
+                    for route, stats in sorted(self._routes.items())}
+
+    def reset(self):
+        """Forget all measurements."""
+        with self._lock:
+            self._routes.clear()
+            self._connections.clear()
+
+
+registry = MetricsRegistry()
+
+# the QueryTimer of the request being handled, if any
+current_timer = ContextVar('polls_query_timer', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper that adds a query to the current timer."""
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_timing(connection):
+    """Time the queries of a connection, once per connection."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+def pool_stats(pool):
+    """Return the usage of a psycopg connection pool as a dict.
+
+    saturation is the share of the pool's maximum size that is in use,
+    and mean_wait_ms the mean time requests that found no free
+    connection waited for one.
+    """
+    stats = pool.get_stats()
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    queued = stats.get('requests_queued', 0)
+    return {
+        'size': stats.get('pool_size', 0),
+        'max_size': stats.get('pool_max', 0),
+        'in_use': in_use,
+        'saturation': (round(in_use / stats['pool_max'], 3)
+                       if stats.get('pool_max') else 0.0),
+        'requests_waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'requests_queued': queued,
+        'requests_errors': stats.get('requests_errors', 0),
+        'mean_wait_ms': (round(stats.get('requests_wait_ms', 0) / queued, 2)
+                         if queued else 0.0),
+    }
+
+
+def database_stats():
+    """Return the connection settings and usage of every database."""
+    databases = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        databases[connection.alias] = {
+            'vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+            'connections_opened': registry.connections_opened(
+                connection.alias),
+            'pool': pool_stats(pool) if pool is not None else None,
+        }
+    return databases
+
+
+@staff_member_required
+def metrics(request):
+    """Return the per-route request and database statistics as JSON."""
+    return JsonResponse({'routes': registry.snapshot(),
+                         'databases': database_stats()})
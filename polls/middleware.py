@@ -0,0 +1,197 @@
+"""Middleware of KU Polls."""
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import current_timer, install_query_timing, registry
+from .routers import STICKY_COOKIE, read_from_replicas, stick_to_primary
+from .scheduler import get_scheduler
+
+logger = logging.getLogger("polls.performance")
+
+
+class QueryTimer:
+    """Database execute wrapper that counts and times SQL queries."""
+
+    def __init__(self):
+        """Start with no queries."""
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Run the query and add its time to the total."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class HybridMiddleware:
+    """Base of the middleware that runs in sync and async handlers.
+
+    Under ASGI with async views the middleware is called as a coroutine
+    function, so Django does not adapt the request to a worker thread.
+    Subclasses handle the request in handle() and ahandle().
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Wrap the next handler, which is async in an async handler."""
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Handle the request, returning a coroutine if async."""
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        """Handle the request in a sync handler."""
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        """Handle the request in an async handler."""
+        return await self.get_response(request)
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """Measure the cost of every request.
+
+    Records the wall time, the number and total time of SQL queries,
+    including those run in worker threads of async views, the template
+    render time and the resolved URL name of each request in
+    polls.metrics.registry. Requests slower than
+    POLLS_SLOW_REQUEST_MS milliseconds are logged to the
+    polls.performance logger.
+    """
+
+    def handle(self, request):
+        """Handle the request and record its measurements."""
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with self.timing(timer):
+            response = self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    async def ahandle(self, request):
+        """Handle the request and record its measurements."""
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with self.timing(timer):
+            response = await self.get_response(request)
+        return self.record(request, response, timer, start)
+
+    @contextmanager
+    def timing(self, timer):
+        """Time the queries of the request, in any thread, by timer.
+
+        Connections are timed from when they are opened; the ones of
+        this thread are also timed here in case they were opened
+        before the polls app was loaded.
+        """
+        for connection in connections.all(initialized_only=True):
+            install_query_timing(connection)
+        token = current_timer.set(timer)
+        try:
+            yield
+        finally:
+            current_timer.reset(token)
+
+    def record(self, request, response, timer, start):
+        """Record the measurements of a handled request."""
+        wall_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        route = match.view_name if match is not None else 'unresolved'
+        sample = {
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall_ms, 2),
+            'queries': timer.queries,
+            'sql_ms': round(timer.seconds * 1000, 2),
+            'template_ms': round(
+                getattr(request, 'template_seconds', 0.0) * 1000, 2),
+        }
+        registry.record(route, sample)
+        if wall_ms >= settings.POLLS_SLOW_REQUEST_MS:
+            logger.warning(
+                "slow request %s %s (%s) took %.1f ms with %d queries",
+                request.method, request.path, route, wall_ms, timer.queries,
+                extra={'request_metrics': sample})
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of a template response."""
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.template_seconds = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """Send the reads of GET and HEAD requests to the read replicas.
+
+    Requests of a visitor holding the cookie set after their last write
+    read from the default database, as do all other requests; a
+    successful request with any other method sets that cookie.
+    """
+
+    def handle(self, request):
+        """Handle the request with reads routed by polls.routers."""
+        with self.routing(request):
+            response = self.get_response(request)
+        return self.stick(request, response)
+
+    async def ahandle(self, request):
+        """Handle the request with reads routed by polls.routers."""
+        with self.routing(request):
+            response = await self.get_response(request)
+        return self.stick(request, response)
+
+    def routing(self, request):
+        """Return a context in which the request's reads are routed."""
+        if not settings.POLLS_READ_REPLICAS:
+            return nullcontext()
+        return read_from_replicas(request.method in ('GET', 'HEAD') and
+                                  STICKY_COOKIE not in request.COOKIES)
+
+    def stick(self, request, response):
+        """Send the visitor's reads to the primary after a write."""
+        if (settings.POLLS_READ_REPLICAS
+                and request.method not in ('GET', 'HEAD')
+                and response.status_code < 400):
+            stick_to_primary(response)
+        return response
+
+
+class PollSchedulerMiddleware(HybridMiddleware):
+    """Start the scheduler thread of the process on its first request.
+
+    The thread is not started when the app is loaded, since an app
+    server may load the app once and fork its workers from it, see
+    polls.scheduler. Nothing is started unless POLLS_SCHEDULER is set.
+    """
+
+    def handle(self, request):
+        """Make sure the scheduler runs, then handle the request."""
+        get_scheduler()
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        """Make sure the scheduler runs, then handle the request."""
+        get_scheduler()
+        return await self.get_response(request)
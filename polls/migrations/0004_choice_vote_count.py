@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:21
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_vote_count(apps, schema_editor):
+    """Fill the vote counter of every choice from the existing votes."""
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    votes = (Vote.objects.filter(choice=models.OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(total=models.Count('pk')).values('total'))
+    Choice.objects.update(vote_count=Coalesce(models.Subquery(votes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_remove_choice_votes_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='number of votes'),
+        ),
+        migrations.RunPython(populate_vote_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:23
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_vote_question(apps, schema_editor):
+    """Copy each vote's question from its choice and drop duplicates.
+
+    Only the most recent vote of a user on a question is kept, and the
+    vote counters of the choices are recounted afterwards.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    Vote.objects.update(question_id=models.Subquery(
+        Choice.objects.filter(pk=models.OuterRef('choice_id'))
+        .values('question_id')[:1]))
+    latest = (Vote.objects.values('user_id', 'question_id')
+              .annotate(keep=models.Max('pk'), total=models.Count('pk'))
+              .filter(total__gt=1))
+    for row in latest.iterator():
+        Vote.objects.filter(user_id=row['user_id'],
+                            question_id=row['question_id'],
+                            pk__lt=row['keep']).delete()
+    votes = (Vote.objects.filter(choice=models.OuterRef('pk'))
+             .order_by().values('choice')
+             .annotate(total=models.Count('pk')).values('total'))
+    Choice.objects.update(vote_count=Coalesce(models.Subquery(votes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_vote_question'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vote_question,
+                             migrations.RunPython.noop),
+    ]
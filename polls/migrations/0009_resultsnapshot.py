@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='polls.question')),
+                ('total_votes', models.PositiveIntegerField(verbose_name='number of votes')),
+                ('choices', models.JSONField(verbose_name='tallies of the choices')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='date taken')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-17 06:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_resultsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='last_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='last modified'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='version'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-17 09:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_question_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='date voted'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='date changed'),
+        ),
+        migrations.CreateModel(
+            name='VoteBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(verbose_name='start of the minute')),
+                ('added', models.PositiveIntegerField(default=0, verbose_name='votes added')),
+                ('removed', models.PositiveIntegerField(default=0, verbose_name='votes removed')),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'bucket'], name='polls_votebucket_history_idx')],
+                'constraints': [models.UniqueConstraint(fields=('choice', 'bucket'), name='unique_vote_bucket')],
+            },
+        ),
+    ]
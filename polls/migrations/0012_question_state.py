@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_question_state(apps, schema_editor):
+    """Store the current state of every question by its dates."""
+    Question = apps.get_model('polls', 'Question')
+    now = timezone.now()
+    published = models.Q(pub_date__lte=now)
+    ended = models.Q(end_date__lte=now)
+    Question.objects.filter(published & ~ended).update(state='open')
+    Question.objects.filter(published & ended).update(state='closed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_vote_timestamps_votebucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='state',
+            field=models.CharField(choices=[('scheduled', 'scheduled'), ('open', 'open'), ('closed', 'closed')], default='scheduled', editable=False, max_length=9, verbose_name='state'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['state', 'pub_date'], name='polls_question_state_pub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['state', 'end_date'], name='polls_question_state_end_idx'),
+        ),
+        migrations.RunPython(backfill_question_state,
+                             migrations.RunPython.noop),
+    ]
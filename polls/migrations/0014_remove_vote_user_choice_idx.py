@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-17 07:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_vote_dates_db_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vote',
+            name='polls_vote_user_choice_idx',
+        ),
+    ]
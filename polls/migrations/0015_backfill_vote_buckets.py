@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models.functions import TruncMinute
+
+
+def backfill_vote_buckets(apps, schema_editor):
+    """Count the votes cast before buckets were kept as added.
+
+    Votes older than the first bucket get a bucket of the minute they
+    were created in. Votes cast before their dates were stored carry
+    the date of migration 0011, so their history starts there.
+    """
+    Vote = apps.get_model('polls', 'Vote')
+    VoteBucket = apps.get_model('polls', 'VoteBucket')
+    votes = Vote.objects.all()
+    first = VoteBucket.objects.aggregate(first=models.Min('bucket'))['first']
+    if first is not None:
+        votes = votes.filter(created_at__lt=first)
+    rows = (votes.order_by()
+            .values('question_id', 'choice_id',
+                    minute=TruncMinute('created_at'))
+            .annotate(added=models.Count('pk')))
+    VoteBucket.objects.bulk_create(
+        (VoteBucket(question_id=row['question_id'],
+                    choice_id=row['choice_id'], bucket=row['minute'],
+                    added=row['added'])
+         for row in rows.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0014_remove_vote_user_choice_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_vote_buckets,
+                             migrations.RunPython.noop),
+    ]
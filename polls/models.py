@@ -1,22 +1,115 @@
 """A module that contains models for the polls application."""
 import datetime
-from django.db import models
+from django.db import connection, models
+from django.db.models.functions import Now
 from django.utils import timezone
 from django.contrib.auth.models import User
 
 
 class Question(models.Model):
-    """Contains the text and publication date of questions as fields."""
+    """Contains the text and publication date of questions as fields.
+
+    The state of a question follows its dates: it is scheduled until
+    its pub_date, open until its end_date and closed afterwards. The
+    state is stored on save() and flipped by polls.scheduler when one
+    of the dates passes, which invalidates the cached pages at that
+    moment. The stored state lags behind the dates when no scheduler
+    runs, so the checks below and the page queries compare the dates.
+    """
+
+    class State(models.TextChoices):
+        """The stages of a question's lifecycle."""
+
+        SCHEDULED = 'scheduled', 'scheduled'
+        OPEN = 'open', 'open'
+        CLOSED = 'closed', 'closed'
 
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published', default=timezone.now)
     end_date = models.DateTimeField('ending date for voting',
                                     default=None, null=True, blank=True)
+    # bumped whenever the question, its choices or its votes change
+    version = models.PositiveIntegerField('version', default=0,
+                                          editable=False)
+    last_modified = models.DateTimeField('last modified',
+                                         default=timezone.now,
+                                         editable=False)
+    state = models.CharField('state', max_length=9, choices=State.choices,
+                             default=State.SCHEDULED, editable=False)
+
+    class Meta:
+        indexes = [
+            # index page: published questions, newest first
+            models.Index(fields=['-pub_date', '-id'],
+                         name='polls_question_pub_date_idx'),
+            # voting availability: only questions that have an end date
+            models.Index(fields=['end_date'],
+                         condition=models.Q(end_date__isnull=False),
+                         name='polls_question_end_date_idx'),
+            # scheduler: the next question to open and to close
+            models.Index(fields=['state', 'pub_date'],
+                         name='polls_question_state_pub_idx'),
+            models.Index(fields=['state', 'end_date'],
+                         name='polls_question_state_end_idx'),
+        ]
 
     def __str__(self):
         """Return the question's text."""
         return self.question_text
 
+    def save(self, *args, **kwargs):
+        """Store the state and bump the version of a changed question."""
+        self.state = self.current_state()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'state'}
+        if not self._state.adding:
+            self.version += 1
+            self.last_modified = timezone.now()
+            if update_fields is not None:
+                update_fields |= {'version', 'last_modified'}
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def current_state(self, now=None):
+        """Return the state of the question by its dates.
+
+        :param now: the time to check the dates against, now by default
+        :return: a Question.State
+        """
+        now = now or timezone.now()
+        if self.pub_date > now:
+            return self.State.SCHEDULED
+        if self.end_date is not None and self.end_date <= now:
+            return self.State.CLOSED
+        return self.State.OPEN
+
+    @classmethod
+    def state_conditions(cls, now):
+        """Return the condition on the dates of questions in each state.
+
+        :param now: the time to check the dates against
+        :return: a dict of Question.State to a Q object, matching what
+                 current_state() returns
+        """
+        published = models.Q(pub_date__lte=now)
+        ended = models.Q(end_date__lte=now)
+        return {
+            cls.State.SCHEDULED: ~published,
+            cls.State.OPEN: published & ~ended,
+            cls.State.CLOSED: published & ended,
+        }
+
+    @classmethod
+    def bump_versions(cls, question_ids):
+        """Bump the versions of questions whose choices or votes changed.
+
+        :param question_ids: ids of the changed questions
+        """
+        cls.objects.filter(pk__in=question_ids).update(
+            version=models.F('version') + 1, last_modified=timezone.now())
+
     def was_published_recently(self):
         """Check whether the question was published within the last 24 hours.
 
@@ -33,8 +126,7 @@ class Question(models.Model):
                          publication date,
                  False otherwise
         """
-        now = timezone.now()
-        return now >= self.pub_date
+        return self.current_state() != self.State.SCHEDULED
 
     def can_vote(self):
         """Check whether voting is available for the question.
@@ -42,26 +134,36 @@ class Question(models.Model):
         :return: True if voting is allowed for this question,
                  False otherwise
         """
-        now = timezone.now()
-        if self.end_date is not None:
-            return self.end_date > now >= self.pub_date
-        else:
-            return now >= self.pub_date
+        return self.current_state() == self.State.OPEN
+
+    def is_closed(self):
+        """Check whether voting in the question has ended for good.
+
+        :return: True if the question has an end_date that has passed,
+                 False otherwise
+        """
+        return self.current_state() == self.State.CLOSED
 
 
 class Choice(models.Model):
     """Contains the text and votes count of choices as fields.
 
+    vote_count is a denormalized counter of the choice's votes. It is
+    maintained by polls.voting, and deleted votes are taken off it by
+    a post_delete receiver. It can be rebuilt from :model:'Vote' with
+    the rebuildvotecounts management command.
+
     Related to :model:'Question'.
     """
 
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.PositiveIntegerField('number of votes', default=0)
 
     @property
     def votes(self):
         """Return the votes for this choice."""
-        return self.vote_set.count()
+        return self.vote_count
 
     def __str__(self):
         """Return the choice's text."""
@@ -71,8 +173,145 @@ class Choice(models.Model):
 class Vote(models.Model):
     """A vote by a user for a choice in a poll.
 
+    question duplicates choice.question so that a user can hold only
+    one vote per question, enforced by a unique constraint.
+
     Related to :model:'Choice'
     """
 
     choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    # the database fills in the dates of votes loaded without them
+    created_at = models.DateTimeField('date voted', auto_now_add=True,
+                                      db_default=Now())
+    # when the vote was last changed to another choice
+    updated_at = models.DateTimeField('date changed', auto_now=True,
+                                      db_default=Now())
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_vote_per_question'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Fill in the question from the choice before saving."""
+        if self.question_id is None and self.choice_id is not None:
+            self.question_id = self.choice.question_id
+        super().save(*args, **kwargs)
+
+
+class ResultSnapshot(models.Model):
+    """The frozen results of a question that is closed for voting.
+
+    Once a question's end_date has passed its tallies can no longer
+    change, so they are stored once and its results page is served from
+    the snapshot. choices holds a [id, text, votes] list per choice.
+    A snapshot is removed when its question or choices are changed.
+
+    Related to :model:'Question'.
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE,
+                                    primary_key=True,
+                                    related_name='snapshot')
+    total_votes = models.PositiveIntegerField('number of votes')
+    choices = models.JSONField('tallies of the choices')
+    created_at = models.DateTimeField('date taken', auto_now_add=True)
+
+    def __str__(self):
+        """Return the question's id and the date of the snapshot."""
+        return f"Results of question {self.question_id} at {self.created_at}"
+
+    @classmethod
+    def from_question(cls, question):
+        """Return an unsaved snapshot of a question's tallies.
+
+        :param question: a question carrying total_votes and its
+                         choices in question.choices, as prepared by
+                         the results view
+        """
+        return cls(question=question, total_votes=question.total_votes,
+                   choices=[[choice.pk, choice.choice_text,
+                             choice.vote_count]
+                            for choice in question.choices])
+
+    def apply(self, question):
+        """Set the frozen tallies on question like the results view does.
+
+        :param question: the question of the snapshot
+        """
+        question.total_votes = self.total_votes
+        question.choices = []
+        for pk, text, votes in self.choices:
+            choice = Choice(pk=pk, question=question, choice_text=text,
+                            vote_count=votes)
+            choice.percentage = (votes * 100.0 / self.total_votes
+                                 if self.total_votes else 0.0)
+            question.choices.append(choice)
+
+
+class VoteBucket(models.Model):
+    """The votes a choice gained and lost during one minute.
+
+    Buckets are kept up to date by the voting functions in the same
+    transaction as the votes, so the history of a question is read from
+    its buckets without scanning its votes. A changed vote counts as
+    removed from the old choice and added to the new one. Votes cast
+    before buckets were kept were backfilled as added in the minute of
+    their created_at, and their earlier changes are not known.
+
+    Related to :model:'Question' and :model:'Choice'.
+    """
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    bucket = models.DateTimeField('start of the minute')
+    added = models.PositiveIntegerField('votes added', default=0)
+    removed = models.PositiveIntegerField('votes removed', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['choice', 'bucket'],
+                                    name='unique_vote_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'bucket'],
+                         name='polls_votebucket_history_idx'),
+        ]
+
+    def __str__(self):
+        """Return the choice's id and the start of the bucket."""
+        return f"Votes of choice {self.choice_id} at {self.bucket}"
+
+    @classmethod
+    def record(cls, changes, when=None):
+        """Add vote changes to the buckets of the current minute.
+
+        The buckets are upserted with one INSERT ... ON CONFLICT DO
+        UPDATE that adds to the counts, so concurrent votes never lose
+        each other's counts.
+
+        :param changes: a mapping of choice id to a (question_id, added,
+                        removed) tuple
+        :param when: the time of the changes, now by default
+        """
+        if not changes:
+            return
+        bucket = (when or timezone.now()).replace(second=0, microsecond=0)
+        bucket = cls._meta.get_field('bucket').get_db_prep_save(bucket,
+                                                                connection)
+        table = connection.ops.quote_name(cls._meta.db_table)
+        rows = [(question_id, choice_id, bucket, added, removed)
+                for choice_id, (question_id, added, removed)
+                in changes.items()]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} "
+                f"(question_id, choice_id, bucket, added, removed) "
+                f"VALUES (%s, %s, %s, %s, %s) "
+                f"ON CONFLICT (choice_id, bucket) DO UPDATE SET "
+                f"added = {table}.added + EXCLUDED.added, "
+                f"removed = {table}.removed + EXCLUDED.removed",
+                rows)
@@ -0,0 +1,92 @@
+"""Keyset (cursor) pagination for KU Polls."""
+import base64
+import binascii
+import datetime
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(question):
+    """Return an opaque cursor pointing just after the given question.
+
+    :param question: the last question of a page, or a dict of its
+                     values including pub_date and id
+    :return: a URL-safe string encoding the question's pub_date and id
+    """
+    if isinstance(question, dict):
+        pub_date, pk = question['pub_date'], question['id']
+    else:
+        pub_date, pk = question.pub_date, question.pk
+    raw = f"{pub_date.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor made by encode_cursor.
+
+    :param cursor: the cursor string from the request
+    :return: a (pub_date, id) tuple, or None if the cursor is invalid
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        pub_date, pk = raw.split('|')
+        return datetime.datetime.fromisoformat(pub_date), int(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+class KeysetPage:
+    """A page of questions ordered by -pub_date, -id.
+
+    The page is evaluated lazily on first use, so nothing is queried
+    when the page is rendered from a cached template fragment.
+    """
+
+    ordering = ('-pub_date', '-pk')
+
+    def __init__(self, queryset, cursor=None, per_page=20):
+        """Create a page of queryset starting after cursor.
+
+        :param queryset: the questions to paginate, as models or as
+                         values() dicts including pub_date and id
+        :param cursor: a cursor from encode_cursor, or None for the first page
+        :param per_page: the maximum number of questions on the page
+        """
+        self.cursor = cursor
+        self.per_page = per_page
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        self.queryset = queryset.order_by(*self.ordering)
+
+    @cached_property
+    def _rows(self):
+        """Fetch one row more than the page size to detect a next page."""
+        return list(self.queryset[:self.per_page + 1])
+
+    @property
+    def object_list(self):
+        """Return the questions on this page."""
+        return self._rows[:self.per_page]
+
+    @property
+    def has_next(self):
+        """Return True if there are questions after this page."""
+        return len(self._rows) > self.per_page
+
+    @property
+    def next_cursor(self):
+        """Return the cursor of the next page, or None on the last page."""
+        if self.has_next:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    def __iter__(self):
+        """Iterate over the questions on this page."""
+        return iter(self.object_list)
+
+    def __len__(self):
+        """Return the number of questions on this page."""
+        return len(self.object_list)
@@ -0,0 +1,86 @@
+"""Database routing of KU Polls to read replicas.
+
+Reads of the polls models go to one of POLLS_READ_REPLICAS, picked at
+random, only inside read_from_replicas(), which ReplicaRoutingMiddleware
+enters for GET and HEAD requests. Everything else reads from the
+default database: writes and the reads of requests that write,
+management commands, background threads, and values stored in the
+shared cache, which use_primary() computes from the default database
+so that a lagging replica never leaves stale values in the cache.
+
+After a request that writes, the visitor is sent a short-lived cookie,
+and their requests read from the default database while it lasts, so
+they see their own votes even before the replicas do.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = 'default'
+# Cookie that keeps a visitor on the default database after a write
+STICKY_COOKIE = 'polls_primary'
+
+_replica_reads = ContextVar('polls_replica_reads', default=False)
+
+
+@contextmanager
+def read_from_replicas(enabled=True):
+    """Let reads in the block go to the read replicas.
+
+    :param enabled: False to read from the default database instead
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def use_primary():
+    """Read from the default database in the block."""
+    return read_from_replicas(False)
+
+
+def stick_to_primary(response):
+    """Keep the visitor on the default database for a while.
+
+    :param response: the response to the request that wrote
+    """
+    response.set_cookie(STICKY_COOKIE, '1',
+                        max_age=settings.POLLS_REPLICA_STICKY_SECONDS,
+                        httponly=True, samesite='Lax')
+    return response
+
+
+class ReplicaRouter:
+    """Route reads of the polls models to the read replicas."""
+
+    app_label = 'polls'
+
+    def db_for_read(self, model, **hints):
+        """Return a replica when replica reads are enabled.
+
+        Other reads fall back to the default database.
+        """
+        if (model._meta.app_label == self.app_label
+                and settings.POLLS_READ_REPLICAS and _replica_reads.get()):
+            return random.choice(settings.POLLS_READ_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        """Write to the default database."""
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Relate objects of the default database and its replicas."""
+        databases = {PRIMARY, *settings.POLLS_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Migrate the default database only; replicas copy its schema."""
+        if db in settings.POLLS_READ_REPLICAS:
+            return False
+        return None
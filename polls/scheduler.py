@@ -0,0 +1,175 @@
+"""Scheduler of the poll lifecycle.
+
+Question.save() stores the state of a question for its dates, and the
+scheduler flips the stored state when a pub_date or end_date passes:
+it sleeps until the next of those dates, updates the questions whose
+state is out of date and sends polls.signals.states_changed, which
+invalidates the cached pages of those questions. Pages still check
+the dates themselves, so they are right when no scheduler runs; the
+scheduler only makes cached pages change the moment a question opens
+or closes.
+
+The scheduler runs in the manage.py pollscheduler worker, or in a
+background thread of each server process when POLLS_SCHEDULER is
+enabled. Several schedulers may run at once; a question is flipped by
+one of them and the others find nothing to do. The scheduler also
+checks every POLLS_SCHEDULER_INTERVAL seconds, so dates changed by
+another process are picked up.
+"""
+import logging
+import os
+import threading
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Min
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Question
+from .signals import states_changed
+
+logger = logging.getLogger("polls")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def update_states(now=None):
+    """Store the current state of every question whose state is stale.
+
+    Each change of state is a single UPDATE that also bumps the version
+    of the questions, and states_changed is sent with the questions
+    that changed.
+
+    :param now: the time to check the dates against, now by default
+    :return: a dict of Question.State to the ids of the questions that
+             changed to it
+    """
+    now = now or timezone.now()
+    changed = {}
+    with transaction.atomic():
+        for state, condition in Question.state_conditions(now).items():
+            question_ids = list(
+                Question.objects.select_for_update(skip_locked=True)
+                .filter(condition).exclude(state=state)
+                .values_list('pk', flat=True))
+            if not question_ids:
+                continue
+            Question.objects.filter(pk__in=question_ids).update(
+                state=state, version=F('version') + 1, last_modified=now)
+            changed[state] = question_ids
+        if changed:
+            states_changed.send(sender=Question, question_ids=sorted(
+                pk for question_ids in changed.values()
+                for pk in question_ids))
+    for state, question_ids in changed.items():
+        logger.info("%d questions are now %s", len(question_ids), state)
+    return changed
+
+
+def next_change():
+    """Return when the state of a question changes next.
+
+    :return: the earliest pub_date of the scheduled questions or
+             end_date of the open questions, or None if no state
+             changes by itself
+    """
+    dates = [
+        Question.objects.filter(state=Question.State.SCHEDULED)
+        .aggregate(date=Min('pub_date'))['date'],
+        Question.objects.filter(state=Question.State.OPEN)
+        .aggregate(date=Min('end_date'))['date'],
+    ]
+    dates = [date for date in dates if date is not None]
+    return min(dates) if dates else None
+
+
+class PollScheduler:
+    """Flip the states of questions when their dates pass."""
+
+    def __init__(self, interval=60.0):
+        """Create a scheduler.
+
+        :param interval: the longest time in seconds between two
+                         updates of the states
+        """
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Update the states and return the seconds until the next run."""
+        update_states()
+        change = next_change()
+        if change is None:
+            return self.interval
+        seconds = (change - timezone.now()).total_seconds()
+        return min(max(seconds, 0.0), self.interval)
+
+    def run(self):
+        """Update the states until the scheduler is stopped."""
+        while not self._stopped.is_set():
+            try:
+                wait = self.run_once()
+            except Exception:
+                logger.exception("failed to update the question states")
+                wait = self.interval
+            finally:
+                close_old_connections()
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def wake(self):
+        """Run again now, for instance after a question was saved."""
+        self._wakeup.set()
+
+    def start(self):
+        """Run the scheduler in a background thread."""
+        self._thread = threading.Thread(target=self.run,
+                                        name='polls-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler and wait for its thread to end."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def get_scheduler():
+    """Return the scheduler thread of this process, starting it if needed.
+
+    :return: the PollScheduler, or None if POLLS_SCHEDULER is disabled
+    """
+    global _scheduler
+    if not settings.POLLS_SCHEDULER:
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PollScheduler(settings.POLLS_SCHEDULER_INTERVAL)
+                _scheduler.start()
+    return _scheduler
+
+
+def _forget_scheduler():
+    """Drop the scheduler inherited from the parent in a forked process."""
+    global _scheduler
+    _scheduler = None
+
+
+os.register_at_fork(after_in_child=_forget_scheduler)
+
+
+@receiver(post_save, sender=Question)
+def reschedule(sender, instance, **kwargs):
+    """Wake the scheduler of this process once a saved question commits.
+
+    The question's dates may now be the next to pass.
+    """
+    if _scheduler is not None:
+        transaction.on_commit(_scheduler.wake)
@@ -0,0 +1,122 @@
+"""Signals of KU Polls and the receivers that keep caches up to date."""
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .cache import invalidate_index, invalidate_question, invalidate_tallies
+from .live import hub
+from .metrics import install_query_timing, registry
+from .models import Choice, Question, ResultSnapshot, Vote
+
+# Sent with question_ids after votes of those questions were written,
+# including writes that bypass post_save such as bulk upserts.
+votes_changed = Signal()
+
+# Sent with question_ids by polls.scheduler after the stored state of
+# those questions was flipped because their pub_date or end_date passed.
+states_changed = Signal()
+
+
+def _invalidate(invalidate, *args):
+    """Invalidate cached values now and again after the commit.
+
+    The second time discards values that another process may have
+    computed from the old rows before the change was committed.
+    """
+    invalidate(*args)
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    """Invalidate the cached index when a question is saved or deleted.
+
+    The cached metadata of the question is invalidated too. A saved
+    question may have been reopened for voting, so its results
+    snapshot is removed as well.
+    """
+    invalidate_index()
+    _invalidate(invalidate_question, instance.pk)
+    if (kwargs['signal'] is post_save and not kwargs['created']
+            and not kwargs['raw']):
+        ResultSnapshot.objects.filter(question=instance).delete()
+
+
+@receiver(states_changed)
+def publish_states(sender, question_ids, **kwargs):
+    """Invalidate the index and the questions whose state changed.
+
+    A question appears on the index when it opens, and its pages and
+    API responses change when it opens or closes.
+    """
+    invalidate_index()
+    for question_id in question_ids:
+        _invalidate(invalidate_question, question_id)
+    transaction.on_commit(invalidate_index)
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    """Remove the results snapshot of a question whose choices changed.
+
+    The question's version is bumped and its cached metadata is
+    invalidated too, since its pages changed.
+    """
+    _invalidate(invalidate_question, instance.question_id)
+    if kwargs.get('raw'):
+        return
+    ResultSnapshot.objects.filter(question_id=instance.question_id).delete()
+    Question.bump_versions([instance.question_id])
+
+
+@receiver(post_delete, sender=Vote)
+def discount_vote(sender, instance, **kwargs):
+    """Take a deleted vote off the vote counter of its choice.
+
+    Votes are deleted by withdraw_vote and apply_vote_batch, but also
+    by the cascade when a user is deleted, by queryset deletes and in
+    the admin, which all go through this signal. A counter that is
+    already zero, for a vote loaded without counting it, stays zero.
+    """
+    Choice.objects.filter(pk=instance.choice_id, vote_count__gt=0).update(
+        vote_count=F('vote_count') - 1)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def vote_changed(sender, instance, **kwargs):
+    """Report a vote saved or deleted one at a time."""
+    votes_changed.send(sender=Vote, question_ids=[instance.question_id])
+
+
+@receiver(votes_changed)
+def bump_question_versions(sender, question_ids, **kwargs):
+    """Bump the versions of the questions whose votes changed."""
+    Question.bump_versions(question_ids)
+
+
+@receiver(votes_changed)
+def publish_results(sender, question_ids, **kwargs):
+    """Push new tallies to live results streams after the commit.
+
+    The cached tallies are invalidated first, so that the streams read
+    the new tallies.
+    """
+    invalidate_tallies(*question_ids)
+
+    def committed():
+        invalidate_tallies(*question_ids)
+        hub.publish(*question_ids)
+
+    transaction.on_commit(committed)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    """Count and time the database connections opened by this process."""
+    registry.count_connection(connection.alias)
+    install_query_timing(connection)
@@ -0,0 +1,93 @@
+"""Query plan assertions for tests."""
+import re
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryPlanMixin:
+    """Assertions that the queries of some code are answered from indexes.
+
+    Supported on PostgreSQL and SQLite; other databases skip the test.
+    On PostgreSQL sequential scans are disabled for the rest of the
+    test's transaction, so that the planner chooses an index whenever
+    one can serve the query even though the test tables are tiny.
+    """
+
+    def capture_plans(self, function, *args, **kwargs):
+        """Run function and return the plans of its queries of polls tables.
+
+        :return: a list of (sql, plan) tuples of the SELECT queries
+        """
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            self.skipTest(f"query plans not checked on {connection.vendor}")
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        with CaptureQueriesContext(connection) as queries:
+            function(*args, **kwargs)
+        return [(query['sql'], self.explain(query['sql']))
+                for query in queries
+                if query['sql'].startswith('SELECT')
+                and 'polls_' in query['sql']]
+
+    def explain(self, sql):
+        """Return the plan of a query as text."""
+        prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                  else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            rows = cursor.fetchall()
+        return '\n'.join(' '.join(map(str, row)) for row in rows)
+
+    def index_names(self, model, columns):
+        """Return the names a plan gives the index of model on columns.
+
+        :param model: the model of the indexed table
+        :param columns: the indexed columns, in order
+        :return: a set of names, empty if there is no such index
+        """
+        table = model._meta.db_table
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                if columns == [model._meta.pk.column]:
+                    return {f'{table} USING INTEGER PRIMARY KEY'}
+                # unique constraints are indexes named sqlite_autoindex_*
+                names = set()
+                cursor.execute(f'PRAGMA index_list({quote(table)})')
+                for index in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute(f'PRAGMA index_info({quote(index)})')
+                    if [row[2] for row in cursor.fetchall()] == columns:
+                        names.add(index)
+                return names
+            constraints = connection.introspection.get_constraints(cursor,
+                                                                   table)
+        return {name for name, constraint in constraints.items()
+                if constraint['columns'] == columns
+                and (constraint['index'] or constraint['unique'])}
+
+    def assertNoFullScans(self, plans):
+        """Fail if a plan reads a whole table instead of an index."""
+        for sql, plan in plans:
+            if connection.vendor == 'postgresql':
+                self.assertNotIn('Seq Scan', plan, msg=f"\n{sql}\n{plan}")
+            else:
+                full_scans = [
+                    line for line in plan.splitlines()
+                    if re.search(r'\bSCAN\b', line) and 'USING' not in line]
+                self.assertEqual(full_scans, [], msg=f"\n{sql}\n{plan}")
+
+    def assertUsesIndex(self, plans, model, columns):
+        """Fail unless one of the plans reads the index on columns.
+
+        :param plans: plans as returned by capture_plans()
+        :param model: the model of the indexed table
+        :param columns: the indexed columns, in order
+        """
+        names = self.index_names(model, columns)
+        self.assertTrue(names, msg=f"no index on {model.__name__}{columns}")
+        self.assertTrue(
+            any(re.search(rf'\b{re.escape(name)}\b', plan)
+                for _, plan in plans for name in names),
+            msg=f"\nnone of {sorted(names)} in\n" + '\n\n'.join(
+                f"{sql}\n{plan}" for sql, plan in plans))
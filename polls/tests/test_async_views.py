@@ -0,0 +1,132 @@
+"""Tests for the async views of KU Polls."""
+import datetime
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from mysite import views as site_views
+from polls import async_views
+from polls.models import Choice, Question, ResultSnapshot, Vote
+from polls.tests.question_creation import create_question
+from polls.urls import view_patterns
+
+urlpatterns = [
+    path('polls/', include((view_patterns(async_views), 'polls'))),
+    path('accounts/', include('django.contrib.auth.urls')),
+    path('signup/', site_views.signup, name='signup'),
+]
+
+
+@override_settings(ROOT_URLCONF='polls.tests.test_async_views')
+class AsyncViewsTest(TestCase):
+    """The async views behave like the sync ones."""
+
+    def setUp(self):
+        """Create a user and a question with choices."""
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username="voter",
+                                             password="FatChance!")
+        self.question = create_question("Past question.", days=-1)
+        self.choice1, self.choice2 = [
+            Choice.objects.create(question=self.question,
+                                  choice_text=f"Choice {n}")
+            for n in (1, 2)]
+
+    async def test_index(self):
+        """The index lists published questions."""
+        response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+        self.assertEqual(list(response.context['latest_question_list']),
+                         [self.question])
+
+    def test_index_fragment_cached(self):
+        """A cached index page is rendered without querying the questions."""
+        get = async_to_sync(self.async_client.get)
+        get(reverse('polls:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+        self.assertFalse([query for query in queries
+                          if 'polls_question' in query['sql']])
+
+    async def test_index_database_cache(self):
+        """The index reads a database cache outside the event loop."""
+        await sync_to_async(call_command)('createcachetable', 'polls_cache')
+        with self.settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'polls_cache'}}):
+            response = await self.async_client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+
+    async def test_detail_shows_vote(self):
+        """The detail page marks the user's vote."""
+        await Vote.objects.acreate(user=self.user, choice=self.choice2,
+                                   question=self.question)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(self.question.id,)))
+        self.assertEqual(response.context['vote'].choice_id, self.choice2.id)
+
+    async def test_detail_future_question(self):
+        """Questions that aren't published redirect to the index."""
+        future = await Question.objects.acreate(
+            question_text="Future question.",
+            pub_date=self.question.pub_date + datetime.timedelta(days=30))
+        response = await self.async_client.get(
+            reverse('polls:detail', args=(future.id,)))
+        self.assertRedirects(response, reverse('polls:index'),
+                             fetch_redirect_response=False)
+
+    async def test_vote_and_results(self):
+        """A vote is counted and shown on the results page."""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {"choice": self.choice1.id})
+        results = reverse('polls:results', args=(self.question.id,))
+        self.assertRedirects(response, results, fetch_redirect_response=False)
+        response = await self.async_client.get(results)
+        self.assertEqual(response.context['question'].total_votes, 1)
+        await self.async_client.post(
+            reverse('polls:remove_vote', args=(self.question.id,)))
+        self.assertFalse(await Vote.objects.filter(user=self.user).aexists())
+        await self.choice1.arefresh_from_db()
+        self.assertEqual(self.choice1.votes, 0)
+
+    async def test_closed_results_snapshot(self):
+        """Results of a closed question are served from a snapshot."""
+        self.question.end_date = self.question.pub_date
+        await self.question.asave()
+        results = reverse('polls:results', args=(self.question.id,))
+        response = await self.async_client.get(results)
+        self.assertEqual(response.context['snapshot'].total_votes, 0)
+        self.assertTrue(await ResultSnapshot.objects.aexists())
+        response = await self.async_client.get(
+            results, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_vote_requires_login(self):
+        """Anonymous visitors are sent to the login page."""
+        response = await self.async_client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {"choice": self.choice1.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith(reverse('login')))
+
+
+class AsyncMiddlewareTest(SimpleTestCase):
+    """The polls middleware runs in an async handler without threads."""
+
+    @override_settings(DEBUG=True)
+    def test_not_adapted(self):
+        """No middleware is adapted to a worker thread under ASGI."""
+        handler = BaseHandler()
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler.load_middleware(is_async=True)
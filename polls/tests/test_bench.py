@@ -0,0 +1,51 @@
+"""Tests of the benchmark helpers of KU Polls."""
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from polls import bench
+from polls.models import Choice, Question, Vote
+
+
+class BenchTest(TestCase):
+    """Tests of dataset generation and result summaries."""
+
+    def test_percentile(self):
+        """Percentiles use the nearest rank."""
+        samples = list(range(1, 101))
+        self.assertEqual(bench.percentile(samples, 50), 50)
+        self.assertEqual(bench.percentile(samples, 99), 99)
+        self.assertEqual(bench.percentile([3], 95), 3)
+        self.assertEqual(bench.percentile([], 95), 0.0)
+
+    def test_generate_dataset(self):
+        """The dataset has the requested size and consistent counters."""
+        users = bench.generate_dataset(questions=20, choices=3, users=5,
+                                       votes_per_user=4, seed=1)
+        self.assertEqual(len(users), 5)
+        self.assertEqual(Question.objects.count(), 20)
+        self.assertEqual(Choice.objects.count(), 60)
+        self.assertEqual(Vote.objects.count(), 20)
+        self.assertFalse(Vote.objects.filter(
+            question__pub_date__gt=timezone.now()).exists())
+        self.assertEqual(sum(Choice.objects.values_list('vote_count',
+                                                        flat=True)), 20)
+
+    def test_summarize(self):
+        """Summaries count errors and requests per second."""
+        summary = bench.summarize([(0.01, 200), (0.02, 302), (0.03, 500)],
+                                  elapsed=0.5)
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['rps'], 6.0)
+        self.assertEqual(summary['p50_ms'], 20.0)
+
+
+class ConnectionBenchTest(TransactionTestCase):
+    """Tests of the connection benchmark."""
+
+    def test_time_connections(self):
+        """Both kinds of connection are timed."""
+        result = bench.time_connections(iterations=3)
+        self.assertGreater(result['new_connection']['p50_ms'], 0)
+        self.assertGreater(result['reused_connection']['p95_ms'], 0)
+        self.assertIn('connect_overhead_ms', result)
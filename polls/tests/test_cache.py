@@ -0,0 +1,89 @@
+"""Tests of the cache layer of KU Polls."""
+import threading
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from polls.cache import (LRUCache, get_or_set, get_question_meta,
+                         get_tallies, local_cache)
+from polls.models import Choice
+from polls.tests.question_creation import create_question
+from polls.voting import cast_vote
+
+
+class LRUCacheTest(SimpleTestCase):
+    """The in-process cache evicts the least recently used values."""
+
+    def test_eviction(self):
+        """A value read recently is kept over older ones."""
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+        self.assertEqual(len(lru), 2)
+
+
+class GetOrSetTest(SimpleTestCase):
+    """Missing values are computed by a single caller."""
+
+    def setUp(self):
+        """Start with empty caches."""
+        super().setUp()
+        cache.clear()
+        local_cache.clear()
+
+    def test_value_is_computed_once(self):
+        """A cached value is not computed again."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'value'
+
+        self.assertEqual(get_or_set('key', compute), 'value')
+        local_cache.clear()
+        self.assertEqual(get_or_set('key', compute), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_computing_caller(self):
+        """A caller waits for the value another caller is computing."""
+        cache.add('key:lock', True)
+        timer = threading.Timer(0.1, cache.set, ('key', 'theirs'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(get_or_set('key', lambda: 'ours'), 'theirs')
+
+
+class InvalidationTest(TestCase):
+    """Cached question data is invalidated by changes to the question."""
+
+    def setUp(self):
+        """Create a question with a choice."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Past question.", days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Choice")
+
+    def test_question_and_choice_changes(self):
+        """Saving the question or its choices refreshes the metadata."""
+        get_question_meta(self.question.pk)
+        self.question.question_text = "Edited question."
+        self.question.save()
+        Choice.objects.create(question=self.question, choice_text="Other")
+        with self.assertNumQueries(2):
+            meta = get_question_meta(self.question.pk)
+        self.assertEqual(meta['question_text'], "Edited question.")
+        self.assertEqual([text for _, text in meta['choices']],
+                         ["Choice", "Other"])
+        with self.assertNumQueries(0):
+            get_question_meta(self.question.pk)
+
+    def test_vote_changes_tallies(self):
+        """A vote refreshes the tallies of its question."""
+        self.assertEqual(get_tallies(self.question.pk), {self.choice.pk: 0})
+        cast_vote(User.objects.create_user(username="voter"), self.choice)
+        self.assertEqual(get_tallies(self.question.pk), {self.choice.pk: 1})
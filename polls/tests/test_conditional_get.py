@@ -0,0 +1,90 @@
+"""Tests of conditional GET requests to the pages of KU Polls."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, Question
+from polls.tests.question_creation import create_question
+from polls.voting import cast_vote
+
+
+class ConditionalGetTests(TestCase):
+    """Unchanged pages are answered with 304 Not Modified."""
+
+    def setUp(self):
+        """Create a question with choices and a user."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Past question.", days=-1)
+        self.choices = [Choice.objects.create(question=self.question,
+                                              choice_text=f"Choice {n}")
+                        for n in range(2)]
+        self.user = User.objects.create_user(username="voter",
+                                             password="FatChance!")
+        self.detail = reverse('polls:detail', args=(self.question.id,))
+        self.results = reverse('polls:results', args=(self.question.id,))
+
+    def revalidate(self, url, response):
+        """Request url again with the validators of response."""
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_detail(self):
+        """The detail page is not modified after a single query."""
+        response = self.client.get(self.detail)
+        with self.assertNumQueries(1):
+            response = self.revalidate(self.detail, response)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Vary'], 'Cookie')
+
+    def test_vote_changes_pages(self):
+        """A vote in the question changes its detail and results pages."""
+        detail = self.client.get(self.detail)
+        results = self.client.get(self.results)
+        cast_vote(User.objects.create_user(username="other"),
+                  self.choices[0])
+        self.assertEqual(self.revalidate(self.detail, detail).status_code,
+                         200)
+        self.assertEqual(self.revalidate(self.results, results).status_code,
+                         200)
+
+    def test_changed_choice(self):
+        """Editing a choice bumps the version of its question."""
+        version = self.question.version
+        self.choices[0].choice_text = "Edited"
+        self.choices[0].save()
+        self.question.refresh_from_db()
+        self.assertGreater(self.question.version, version)
+
+    def test_pages_differ_per_user(self):
+        """A page rendered for another visitor is not reused."""
+        response = self.client.get(self.detail)
+        self.client.login(username="voter", password="FatChance!")
+        self.assertEqual(self.revalidate(self.detail, response).status_code,
+                         200)
+
+    def test_if_modified_since(self):
+        """The results page is validated by its Last-Modified date."""
+        response = self.client.get(self.results)
+        response = self.client.get(
+            self.results, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_pending_messages(self):
+        """A page with messages to show is rendered without validators."""
+        self.client.login(username="voter", password="FatChance!")
+        response = self.client.get(self.detail)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)))
+        response = self.revalidate(self.detail, response)
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+        self.assertNotIn('ETag', response)
+
+    def test_unchanged_index(self):
+        """The index is not modified until a question changes."""
+        index = reverse('polls:index')
+        response = self.client.get(index)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(index, response).status_code,
+                             304)
+        Question.objects.get(pk=self.question.pk).save()
+        self.assertEqual(self.revalidate(index, response).status_code, 200)
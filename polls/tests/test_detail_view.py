@@ -1,7 +1,10 @@
 """Tests for the Detail view of KU Polls."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
+from polls.models import Choice, Vote
 from polls.tests.question_creation import create_question
 
 
@@ -32,3 +35,49 @@ class QuestionDetailViewTests(TestCase):
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+
+class QuestionDetailQueryTests(TestCase):
+    """Regression tests for the number of queries of the detail page."""
+
+    def setUp(self):
+        """Create a question with choices and a user."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question(question_text='Past question.',
+                                        days=-5)
+        self.choices = [Choice.objects.create(question=self.question,
+                                              choice_text=f"Choice {n}")
+                        for n in range(5)]
+        self.user = User.objects.create_user(username="voter",
+                                             password="FatChance!")
+        self.url = reverse('polls:detail', args=(self.question.id,))
+
+    def test_anonymous_queries(self):
+        """Anonymous visitors cost one query once the choices are cached."""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertIsNone(response.context['vote'])
+        self.assertContains(response, 'type="radio"', count=5)
+
+    def test_authenticated_queries(self):
+        """The user's vote is found with a single query."""
+        Vote.objects.create(user=self.user, choice=self.choices[2])
+        self.client.login(username="voter", password="FatChance!")
+        self.client.get(self.url)
+        # session, user, question and vote
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['vote'].choice_id,
+                         self.choices[2].id)
+        self.assertContains(response, 'checked="true"', count=1)
+
+    def test_closed_question_skips_choices(self):
+        """A question closed for voting is redirected after one query."""
+        self.question.end_date = self.question.pub_date
+        self.question.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('polls:index'),
+                             fetch_redirect_response=False)
@@ -0,0 +1,78 @@
+"""Tests of the export of KU Polls."""
+import csv
+import io
+import json
+import os
+import tempfile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, Vote
+from polls.tests.question_creation import create_question
+
+
+class ExportTest(TestCase):
+    """Polls are exported as CSV or NDJSON."""
+
+    def setUp(self):
+        """Create a question with a voted choice and a staff user."""
+        super().setUp()
+        self.question = create_question("Past question.", days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Choice",
+                                            vote_count=1)
+        self.voter = User.objects.create_user(username="voter")
+        self.vote = Vote.objects.create(user=self.voter, choice=self.choice)
+        self.staff = User.objects.create_user(username="staff",
+                                              is_staff=True)
+        self.url = reverse('polls:export')
+
+    def test_staff_only(self):
+        """Visitors who are not staff cannot export."""
+        self.client.force_login(self.voter)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv(self):
+        """The CSV export has a row per question and choice."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['record'] for row in rows],
+                         ['question', 'choice'])
+        self.assertEqual(rows[0]['question_text'], "Past question.")
+        self.assertEqual(rows[1]['votes'], '1')
+
+    def test_ndjson_with_votes(self):
+        """The NDJSON export includes votes when asked to."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'format': 'ndjson',
+                                              'votes': '1'})
+        content = b''.join(response.streaming_content).decode()
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(records[-1], {
+            'record': 'vote', 'question_id': self.question.id,
+            'choice_id': self.choice.id, 'vote_id': self.vote.id,
+            'user_id': self.voter.id})
+
+    def test_unknown_format(self):
+        """An unknown format is rejected."""
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        """The exportpolls command writes the export to a file."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'polls.ndjson')
+        call_command('exportpolls', format='ndjson', votes=True,
+                     output=path, stderr=io.StringIO())
+        with open(path) as export:
+            kinds = [json.loads(line)['record'] for line in export]
+        self.assertEqual(kinds, ['question', 'choice', 'vote'])
@@ -0,0 +1,120 @@
+"""Tests of the bulk import of poll fixtures."""
+import io
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from polls.cache import get_question_meta, get_tallies
+from polls.importer import iter_objects
+from polls.models import Choice, Question, Vote
+
+FIXTURES = [os.path.join(settings.BASE_DIR, 'data', name) for name in
+            ('polls-v4.json', 'votes-v4.json', 'users.json')]
+
+
+class IterObjectsTest(TestCase):
+    """Fixture files are parsed one object at a time."""
+
+    def test_json_array_and_ndjson(self):
+        """A JSON array and NDJSON give the same objects."""
+        objects = [{'pk': pk, 'text': "a, [b]\n"} for pk in range(3)]
+        array = io.StringIO(json.dumps(objects, indent=2))
+        lines = io.StringIO(''.join(json.dumps(obj) + '\n'
+                                    for obj in objects))
+        self.assertEqual(list(iter_objects(array)), objects)
+        self.assertEqual(list(iter_objects(lines)), objects)
+
+    def test_invalid_json(self):
+        """Truncated JSON raises ValueError."""
+        with self.assertRaises(ValueError):
+            list(iter_objects(io.StringIO('[{"pk": 1')))
+
+
+class ImportPollsTest(TestCase):
+    """The importpolls command loads the fixtures of KU Polls."""
+
+    def setUp(self):
+        """Start from an empty cache."""
+        super().setUp()
+        cache.clear()
+
+    def import_polls(self, *paths, **options):
+        """Run importpolls and return its output."""
+        out = io.StringIO()
+        call_command('importpolls', *paths, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_fixtures(self):
+        """Every object of the fixtures is imported, in any file order."""
+        self.import_polls(*reversed(FIXTURES), batch_size=10)
+        self.assertEqual(Question.objects.count(), 7)
+        self.assertEqual(Choice.objects.count(), 44)
+        self.assertEqual(Vote.objects.count(), 6)
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(
+            sum(Choice.objects.values_list('vote_count', flat=True)), 6)
+
+    def test_import_twice(self):
+        """Importing the same fixtures again changes nothing."""
+        self.import_polls(*FIXTURES)
+        votes = list(Vote.objects.order_by('pk').values_list())
+        self.import_polls(*FIXTURES)
+        self.assertEqual(Question.objects.count(), 7)
+        self.assertEqual(
+            list(Vote.objects.order_by('pk').values_list()), votes)
+
+    def test_ndjson_vote_without_question(self):
+        """Votes without a question get the question of their choice."""
+        self.import_polls(FIXTURES[0], FIXTURES[2])
+        choice = Choice.objects.order_by('pk').first()
+        vote = {'model': 'polls.vote', 'pk': 100,
+                'fields': {'choice': choice.pk, 'user': 1}}
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson',
+                                         delete=False) as ndjson:
+            ndjson.write(json.dumps(vote) + '\n')
+        self.addCleanup(os.remove, ndjson.name)
+        self.import_polls(ndjson.name)
+        self.assertEqual(Vote.objects.get(pk=100).question_id,
+                         choice.question_id)
+
+    def test_cache_invalidated(self):
+        """Questions cached as missing are found after the import."""
+        self.assertIsNone(get_question_meta(2))
+        self.import_polls(FIXTURES[0])
+        self.assertEqual(get_question_meta(2)['id'], 2)
+
+    def test_rebuild_only_imported_questions(self):
+        """Only the counters of the imported questions are rebuilt."""
+        self.import_polls(*FIXTURES)
+        other = Question.objects.create(question_text="Other question.")
+        choice = Choice.objects.create(question=other, choice_text="A",
+                                       vote_count=3)
+        self.import_polls(*FIXTURES)
+        choice.refresh_from_db()
+        self.assertEqual(choice.vote_count, 3)
+
+    def test_tallies_invalidated(self):
+        """Cached tallies show the votes counted by the import."""
+        self.import_polls(FIXTURES[0], FIXTURES[2])
+        self.assertEqual(get_tallies(2)[6], 0)
+        self.import_polls(FIXTURES[1])
+        self.assertEqual(get_tallies(2)[6], 2)
+
+    def test_question_without_pk(self):
+        """Questions without a pk are imported with the others."""
+        question = {'model': 'polls.question',
+                    'fields': {'question_text': "Question without a pk."}}
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson',
+                                         delete=False) as ndjson:
+            ndjson.write(json.dumps(question) + '\n')
+        self.addCleanup(os.remove, ndjson.name)
+        self.import_polls(*FIXTURES, ndjson.name)
+        self.assertTrue(Question.objects.filter(
+            question_text="Question without a pk.").exists())
+        self.assertEqual(
+            sum(Choice.objects.values_list('vote_count', flat=True)), 6)
@@ -1,13 +1,20 @@
 """Tests for the Index view of KU Polls."""
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from polls.tests.question_creation import create_question
+from polls.tests.question_creation import (create_question,
+                                           create_question_with_end_date)
 
 
 class QuestionIndexViewTests(TestCase):
     """Tests for QuestionIndexView."""
 
+    def setUp(self):
+        """Start every test with an empty cache."""
+        super().setUp()
+        cache.clear()
+
     def test_no_question(self):
         """If no questions exist, an appropriate message is displayed."""
         response = self.client.get(reverse('polls:index'))
@@ -44,3 +51,55 @@ class QuestionIndexViewTests(TestCase):
         response = self.client.get(reverse('polls:index'))
         self.assertQuerySetEqual(response.context['latest_question_list'],
                                  [question2, question1],)
+
+    def test_open_and_closed_status(self):
+        """Each question shows whether voting is open or closed."""
+        closed = create_question_with_end_date("Closed question.",
+                                               pub_days=-10, end_days=-1)
+        opened = create_question("Open question.", days=-5)
+        response = self.client.get(reverse('polls:index'))
+        page = list(response.context['latest_question_list'])
+        self.assertEqual(page, [opened, closed])
+        self.assertTrue(page[0].is_open)
+        self.assertFalse(page[1].is_open)
+        self.assertContains(response, "Closed")
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_cursor_pagination(self):
+        """The next cursor continues exactly after the last shown question."""
+        questions = [create_question(f"Question {n}.", days=-n)
+                     for n in range(1, 6)]
+        response = self.client.get(reverse('polls:index'))
+        page = response.context['page']
+        self.assertEqual(list(page), questions[:2])
+        response = self.client.get(reverse('polls:index'),
+                                   {'cursor': page.next_cursor})
+        page = response.context['page']
+        self.assertEqual(list(page), questions[2:4])
+        response = self.client.get(reverse('polls:index'),
+                                   {'cursor': page.next_cursor})
+        page = response.context['page']
+        self.assertEqual(list(page), questions[4:])
+        self.assertFalse(page.has_next)
+
+    def test_invalid_cursor(self):
+        """An invalid cursor shows the first page."""
+        question = create_question("Past question.", days=-1)
+        response = self.client.get(reverse('polls:index'),
+                                   {'cursor': 'not-a-cursor'})
+        self.assertEqual(list(response.context['page']), [question])
+
+    def test_cached_fragment_invalidated_on_save(self):
+        """The cached index is served until a question changes."""
+        question = create_question("Past question.", days=-1)
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+        question.question_text = "Edited question."
+        question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Edited question.")
+        question.delete()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "No polls are available.")
@@ -0,0 +1,96 @@
+"""Tests of the live results stream of KU Polls."""
+import asyncio
+import json
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.cache import invalidate_tallies
+from polls.live import event_stream, hub
+from polls.models import Choice
+from polls.tests.question_creation import create_question
+from polls.voting import cast_vote
+
+
+def parse_event(chunk):
+    """Return the JSON data of a Server-Sent Events message."""
+    text = chunk.decode() if isinstance(chunk, bytes) else chunk
+    data = [line[len('data: '):] for line in text.splitlines()
+            if line.startswith('data: ')]
+    return json.loads(data[0])
+
+
+class LiveResultsTest(TestCase):
+    """The results stream sends tallies when votes change."""
+
+    def setUp(self):
+        """Create a question with choices and a user."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Past question.", days=-1)
+        self.choice1, self.choice2 = [
+            Choice.objects.create(question=self.question,
+                                  choice_text=f"Choice {n}")
+            for n in (1, 2)]
+        self.user = User.objects.create_user(username="voter")
+        self.url = reverse('polls:results_stream', args=(self.question.id,))
+
+    async def test_stream_sends_tallies_after_change(self):
+        """The stream starts with the tallies and follows every change."""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        first = parse_event(await anext(stream))
+        self.assertEqual(first['total'], 0)
+        await Choice.objects.filter(pk=self.choice2.pk).aupdate(vote_count=3)
+        # the update bypasses the signals that invalidate the tallies
+        invalidate_tallies(self.question.id)
+        hub.publish(self.question.id)
+        update = parse_event(await asyncio.wait_for(anext(stream), 5))
+        self.assertEqual(update['total'], 3)
+        self.assertEqual(update['choices'][1],
+                         {'id': self.choice2.id, 'votes': 3,
+                          'percentage': 100.0})
+
+    async def test_closed_stream_unsubscribes(self):
+        """A stream stops receiving changes once it is closed."""
+        stream = event_stream(self.question.id)
+        await anext(stream)
+        self.assertEqual(hub.subscriber_count(self.question.id), 1)
+        await stream.aclose()
+        self.assertEqual(hub.subscriber_count(self.question.id), 0)
+
+    def test_vote_publishes_change(self):
+        """A committed vote notifies the subscribers of its question."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            cast_vote(self.user, self.choice1)
+        with mock.patch.object(hub, 'publish') as publish:
+            for callback in callbacks:
+                callback()
+        publish.assert_called_with(self.question.id)
+
+    def test_future_question(self):
+        """Results of unpublished questions are not streamed."""
+        future = create_question("Future question.", days=5)
+        response = self.client.get(
+            reverse('polls:results_stream', args=(future.id,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_wsgi_sends_tallies_once(self):
+        """Under WSGI the stream sends the tallies once and ends."""
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertEqual(parse_event(response.content)['total'], 0)
+
+    def test_results_page_without_stream_under_wsgi(self):
+        """The results page served under WSGI does not open the stream."""
+        results = reverse('polls:results', args=(self.question.id,))
+        self.assertNotContains(self.client.get(results), "EventSource")
+
+    async def test_results_page_with_stream_under_asgi(self):
+        """The results page served under ASGI follows the stream."""
+        response = await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, "EventSource")
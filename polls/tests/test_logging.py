@@ -0,0 +1,94 @@
+"""Tests of the queued logging of KU Polls."""
+import json
+import logging
+import queue
+from django.test import SimpleTestCase
+
+from polls.log import BoundedQueueHandler, JsonFormatter, install_queue
+
+
+class ListHandler(logging.Handler):
+    """Keep the handled records in a list."""
+
+    def __init__(self):
+        """Start with no records."""
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        """Keep the record."""
+        self.records.append(record)
+
+
+class QueueLoggingTest(SimpleTestCase):
+    """The polls logger writes its records from a background thread."""
+
+    def setUp(self):
+        """Create a logger with a list handler."""
+        super().setUp()
+        self.logger = logging.getLogger(f"polls.tests.{self.id()}")
+        self.logger.propagate = False
+        self.target = ListHandler()
+        self.logger.addHandler(self.target)
+        self.addCleanup(self.logger.handlers.clear)
+
+    def test_records_are_written_by_the_listener(self):
+        """Records reach the original handlers through the queue."""
+        handler = install_queue(self.logger.name)
+        self.assertEqual(self.logger.handlers, [handler])
+        self.assertIsNone(install_queue(self.logger.name))
+        self.logger.warning("vote for %s", "choice")
+        handler.close()
+        self.assertEqual(len(self.target.records), 1)
+        self.assertEqual(self.target.records[0].getMessage(),
+                         "vote for choice")
+
+    def test_restart_in_forked_process(self):
+        """A restarted handler writes through a new queue and listener."""
+        handler = install_queue(self.logger.name, queue_size=5)
+        inherited = handler.queue
+        # in a forked process the parent's listener thread does not run
+        self.addCleanup(handler.listener.stop)
+        handler.restart()
+        self.assertIsNot(handler.queue, inherited)
+        self.assertEqual(handler.queue.maxsize, 5)
+        self.logger.warning("after fork")
+        handler.close()
+        self.assertEqual([record.getMessage() for record
+                          in self.target.records], ["after fork"])
+
+    def test_full_queue_drops_records(self):
+        """Records are dropped and later reported when the queue is full."""
+        handler = BoundedQueueHandler(queue.Queue(2))
+        self.logger.handlers = [handler]
+        for message in ("first", "second", "third"):
+            self.logger.warning(message)
+        self.assertEqual(handler.dropped, 1)
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        self.logger.warning("fourth")
+        messages = [handler.queue.get_nowait().getMessage()
+                    for _ in range(2)]
+        self.assertIn("1 log records were dropped", messages[0])
+        self.assertEqual(messages[1], "fourth")
+
+    def test_unknown_overflow_policy(self):
+        """Only the drop and block overflow policies exist."""
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(queue.Queue(), overflow='wait')
+
+
+class JsonFormatterTest(SimpleTestCase):
+    """Records are formatted as JSON objects."""
+
+    def test_format_includes_extra(self):
+        """The message, level and extra values are in the JSON object."""
+        record = logging.makeLogRecord({
+            'name': 'polls', 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': "%s voted", 'args': ("alice",),
+            'request_metrics': {'queries': 3}})
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['message'], "alice voted")
+        self.assertEqual(data['level'], 'INFO')
+        self.assertEqual(data['logger'], 'polls')
+        self.assertEqual(data['request_metrics'], {'queries': 3})
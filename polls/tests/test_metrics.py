@@ -0,0 +1,75 @@
+"""Tests of the request metrics of KU Polls."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.metrics import pool_stats, registry
+from polls.tests.question_creation import create_question
+
+
+class RequestMetricsTest(TestCase):
+    """Requests are measured per route."""
+
+    def setUp(self):
+        """Start with empty metrics and cache."""
+        super().setUp()
+        registry.reset()
+        cache.clear()
+        self.question = create_question("Past question.", days=-1)
+
+    def test_request_is_recorded(self):
+        """A request adds its queries and timings to its route."""
+        self.client.get(reverse('polls:results', args=(self.question.id,)))
+        stats = registry.snapshot()['polls:results']
+        self.assertEqual(stats['count'], 1)
+        # question, and cached metadata and tallies
+        self.assertEqual(stats['mean_queries'], 4)
+        self.assertGreater(stats['mean_template_ms'], 0)
+        self.assertEqual(sum(stats['histogram_ms'].values()), 1)
+
+    @override_settings(ROOT_URLCONF='polls.tests.test_async_views')
+    async def test_async_request_is_recorded(self):
+        """Queries of async views, run in worker threads, are counted."""
+        await self.async_client.get(
+            reverse('polls:results', args=(self.question.id,)))
+        stats = registry.snapshot()['polls:results']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreater(stats['mean_queries'], 0)
+
+    @override_settings(POLLS_SLOW_REQUEST_MS=0)
+    def test_slow_request_is_logged(self):
+        """Requests over the threshold are logged with their metrics."""
+        with self.assertLogs('polls.performance', 'WARNING') as logs:
+            self.client.get(reverse('polls:index'))
+        metrics = logs.records[0].request_metrics
+        self.assertEqual(metrics['route'], 'polls:index')
+        self.assertEqual(metrics['status'], 200)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        """Only staff users can read the metrics."""
+        url = reverse('polls:metrics')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse('polls:index'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('polls:index', response.json()['routes'])
+        database = response.json()['databases']['default']
+        self.assertIsNone(database['pool'])
+        self.assertIn('conn_max_age', database)
+
+    def test_pool_stats(self):
+        """Pool statistics give the saturation and mean wait time."""
+        class Pool:
+            def get_stats(self):
+                return {'pool_min': 2, 'pool_max': 10, 'pool_size': 6,
+                        'pool_available': 1, 'requests_num': 50,
+                        'requests_queued': 4, 'requests_wait_ms': 30}
+
+        stats = pool_stats(Pool())
+        self.assertEqual(stats['in_use'], 5)
+        self.assertEqual(stats['saturation'], 0.5)
+        self.assertEqual(stats['mean_wait_ms'], 7.5)
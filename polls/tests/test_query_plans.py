@@ -0,0 +1,80 @@
+"""Tests that the hot queries of KU Polls are served by indexes.
+
+The queries are captured from the views and the scheduler, so the
+tests follow the queries the code actually runs.
+"""
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Question, Vote
+from polls.pagination import encode_cursor
+from polls.scheduler import next_change, update_states
+from polls.tests.query_plan import QueryPlanMixin
+from polls.tests.question_creation import create_question
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    """The pages, votes and scheduler read from their indexes."""
+
+    def setUp(self):
+        """Create a question with a choice and a logged in voter."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Past question.", days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Choice")
+        self.user = User.objects.create_user(username="voter")
+        self.client.force_login(self.user)
+
+    def test_index_page(self):
+        """Pages of the index are read from the pub_date index."""
+        plans = self.capture_plans(self.client.get, reverse('polls:index'))
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Question, ['pub_date', 'id'])
+        cache.clear()
+        plans = self.capture_plans(self.client.get, reverse('polls:index'),
+                                   {'cursor': encode_cursor(self.question)})
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Question, ['pub_date', 'id'])
+
+    def test_detail_page(self):
+        """The question, its choices and the user's vote are found by key."""
+        Vote.objects.create(user=self.user, choice=self.choice)
+        plans = self.capture_plans(
+            self.client.get, reverse('polls:detail', args=(self.question.id,)))
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Question, ['id'])
+        self.assertUsesIndex(plans, Choice, ['question_id'])
+        self.assertUsesIndex(plans, Vote, ['user_id', 'question_id'])
+
+    def test_results_page(self):
+        """The tallies of the results page are read by question."""
+        plans = self.capture_plans(
+            self.client.get,
+            reverse('polls:results', args=(self.question.id,)))
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Choice, ['question_id'])
+
+    def test_vote(self):
+        """The previous vote is read with the unique (user, question) key."""
+        plans = self.capture_plans(
+            self.client.post, reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.choice.id})
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Vote, ['user_id', 'question_id'])
+
+    def test_scheduler(self):
+        """The next dates and the stale states are found from indexes."""
+        create_question("Future question.", days=5)
+        Question.objects.filter(pk=self.question.pk).update(
+            end_date=timezone.now() - datetime.timedelta(hours=1))
+        plans = self.capture_plans(update_states)
+        self.assertNoFullScans(plans)
+        plans = self.capture_plans(next_change)
+        self.assertNoFullScans(plans)
+        self.assertUsesIndex(plans, Question, ['state', 'pub_date'])
+        self.assertUsesIndex(plans, Question, ['state', 'end_date'])
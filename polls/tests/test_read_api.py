@@ -0,0 +1,124 @@
+"""Tests of the read endpoints of the KU Polls API."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.models import Choice, Vote
+from polls.tests.question_creation import (create_question,
+                                           create_question_with_end_date)
+
+
+class QuestionListApiTest(TestCase):
+    """The published questions are listed a page at a time."""
+
+    def setUp(self):
+        """Create three published questions and a future one."""
+        super().setUp()
+        cache.clear()
+        self.questions = [create_question(f"Question {n}.", days=-n)
+                          for n in range(1, 4)]
+        create_question("Future question.", days=5)
+        self.url = reverse('polls:api_questions')
+
+    @override_settings(POLLS_INDEX_PAGE_SIZE=2)
+    def test_pages(self):
+        """Pages follow the cursor of the previous page."""
+        first = self.client.get(self.url).json()
+        self.assertEqual([q['id'] for q in first['results']],
+                         [self.questions[0].id, self.questions[1].id])
+        second = self.client.get(self.url,
+                                 {'cursor': first['next_cursor']}).json()
+        self.assertEqual([q['id'] for q in second['results']],
+                         [self.questions[2].id])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_sparse_fields(self):
+        """Only the requested fields are returned, with one query."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url,
+                                       {'fields': 'question_text,is_open'})
+        self.assertEqual(response.json()['results'][0],
+                         {'question_text': "Question 1.", 'is_open': True})
+
+    def test_unknown_field(self):
+        """Unknown fields are refused."""
+        response = self.client.get(self.url, {'fields': 'id,votes'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified(self):
+        """A client with the current page gets 304 without queries."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        create_question("New question.", days=-1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class QuestionApiTest(TestCase):
+    """A question and its results are served from the cache."""
+
+    def setUp(self):
+        """Create a question with two choices and a vote."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Question.", days=-1)
+        self.a, self.b = [Choice.objects.create(question=self.question,
+                                                choice_text=text)
+                          for text in "AB"]
+        user = User.objects.create_user(username="voter")
+        Vote.objects.create(user=user, choice=self.a)
+        self.a.vote_count = 1
+        self.a.save()
+
+    def test_question(self):
+        """The question is returned with its choices."""
+        url = reverse('polls:api_question', args=(self.question.id,))
+        data = self.client.get(url).json()
+        self.assertEqual(data['question_text'], "Question.")
+        self.assertTrue(data['is_open'])
+        self.assertEqual(data['choices'], [
+            {'id': self.a.id, 'choice_text': "A"},
+            {'id': self.b.id, 'choice_text': "B"}])
+
+    def test_future_question(self):
+        """Questions that are not published are not found."""
+        future = create_question("Future question.", days=5)
+        url = reverse('polls:api_question', args=(future.id,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_results(self):
+        """Results give the votes and shares of the choices."""
+        url = reverse('polls:api_results', args=(self.question.id,))
+        data = self.client.get(url, {'fields': 'total_votes,choices'}).json()
+        self.assertEqual(data, {'total_votes': 1, 'choices': [
+            {'id': self.a.id, 'choice_text': "A", 'votes': 1,
+             'percentage': 100.0},
+            {'id': self.b.id, 'choice_text': "B", 'votes': 0,
+             'percentage': 0.0}]})
+
+    def test_results_change_etag(self):
+        """A vote changes the ETag of the results."""
+        url = reverse('polls:api_results', args=(self.question.id,))
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 304)
+        self.b.vote_count = 1
+        self.b.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_votes'], 2)
+
+    def test_closed_results_from_snapshot(self):
+        """A closed question's results come from its snapshot."""
+        closed = create_question_with_end_date("Closed.", pub_days=-5,
+                                               end_days=-1)
+        choice = Choice.objects.create(question=closed, choice_text="C",
+                                       vote_count=3)
+        self.client.get(reverse('polls:results', args=(closed.id,)))
+        Choice.objects.filter(pk=choice.pk).update(vote_count=5)
+        cache.clear()
+        url = reverse('polls:api_results', args=(closed.id,))
+        self.assertEqual(self.client.get(url).json()['total_votes'], 3)
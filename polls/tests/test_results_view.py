@@ -0,0 +1,140 @@
+"""Tests for the Results view of KU Polls."""
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Choice, ResultSnapshot, Vote
+from polls.tests.question_creation import (create_question,
+                                           create_question_with_end_date)
+
+
+class QuestionResultsViewTests(TestCase):
+    """Tests for ResultsView."""
+
+    def setUp(self):
+        """Create a published question with tallied choices."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question(question_text='Past question.',
+                                        days=-5)
+        users = [User.objects.create_user(username=f"voter{n}")
+                 for n in range(4)]
+        voters = iter(users)
+        for n, votes in enumerate((3, 1, 0)):
+            choice = Choice.objects.create(question=self.question,
+                                           choice_text=f"Choice {n}",
+                                           vote_count=votes)
+            for _ in range(votes):
+                Vote.objects.create(user=next(voters), choice=choice)
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_future_question(self):
+        """Results of a question that is not published redirect to index."""
+        future_question = create_question(question_text='Future question.',
+                                          days=5)
+        url = reverse('polls:results', args=(future_question.id,))
+        response = self.client.get(url)
+        self.assertRedirects(response, reverse('polls:index'))
+
+    def test_tallies_and_percentages(self):
+        """Each choice shows its votes and its share of the total."""
+        response = self.client.get(self.url)
+        question = response.context['question']
+        self.assertEqual(question.total_votes, 4)
+        self.assertEqual([c.percentage for c in question.choices],
+                         [75.0, 25.0, 0.0])
+        self.assertContains(response, "75.0%")
+
+    def test_no_votes(self):
+        """A question without votes shows zero percent for every choice."""
+        Choice.objects.update(vote_count=0)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['question'].total_votes, 0)
+        self.assertContains(response, "0.0%", count=3)
+
+    def test_query_count_independent_of_choices(self):
+        """With cached tallies the page renders from one query."""
+        # question, and cached metadata and tallies
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        for n in range(10):
+            Choice.objects.create(question=self.question,
+                                  choice_text=f"Extra {n}")
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['question'].choices), 13)
+
+
+class ClosedResultsViewTests(TestCase):
+    """Results of closed questions are served from a snapshot."""
+
+    def setUp(self):
+        """Create a closed question with a tallied choice."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question_with_end_date(
+            "Closed question.", pub_days=-5, end_days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Choice",
+                                            vote_count=3)
+        Choice.objects.create(question=self.question, choice_text="Other",
+                              vote_count=1)
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_first_view_takes_snapshot(self):
+        """The tallies are frozen on the first view."""
+        response = self.client.get(self.url)
+        snapshot = ResultSnapshot.objects.get(question=self.question)
+        self.assertEqual(snapshot.total_votes, 4)
+        self.assertEqual(response.context['question'].total_votes, 4)
+        self.assertContains(response, "75.0%")
+        self.assertNotContains(response, "EventSource")
+        Choice.objects.filter(pk=self.choice.pk).update(vote_count=10)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['question'].total_votes, 4)
+
+    def test_snapshot_served_from_one_query(self):
+        """A stored snapshot renders without tallying the votes."""
+        call_command('snapshotresults', stdout=StringIO())
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertContains(response, "75.0%")
+
+    def test_conditional_request(self):
+        """A request with the snapshot's ETag is not modified."""
+        response = self.client.get(self.url)
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.client.get(self.url,
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_choice_removes_snapshot(self):
+        """Editing a choice of a closed question retakes the snapshot."""
+        self.client.get(self.url)
+        self.choice.choice_text = "Renamed"
+        self.choice.save()
+        self.assertFalse(ResultSnapshot.objects.exists())
+        self.assertContains(self.client.get(self.url), "Renamed")
+
+    def test_reopened_question_removes_snapshot(self):
+        """A question whose end date is moved is tallied again."""
+        self.client.get(self.url)
+        self.question.end_date = None
+        self.question.save()
+        self.assertFalse(ResultSnapshot.objects.exists())
+
+    def test_vote_in_closed_question(self):
+        """Votes in a closed question are refused."""
+        user = User.objects.create_user(username="voter")
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:index'))
+        self.assertFalse(Vote.objects.exists())
@@ -0,0 +1,97 @@
+"""Tests of the read replica routing of KU Polls."""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from polls.middleware import ReplicaRoutingMiddleware
+from polls.models import Choice, Question
+from polls.routers import (STICKY_COOKIE, ReplicaRouter, read_from_replicas,
+                           use_primary)
+from polls.tests.question_creation import create_question
+
+
+@override_settings(POLLS_READ_REPLICAS=['replica1'])
+class ReplicaRouterTest(SimpleTestCase):
+    """Reads of the polls models go to replicas only when enabled."""
+
+    def setUp(self):
+        """Create a router."""
+        super().setUp()
+        self.router = ReplicaRouter()
+
+    def test_reads_default_to_primary(self):
+        """Outside read_from_replicas() reads use the default database."""
+        self.assertIsNone(self.router.db_for_read(Question))
+
+    def test_replica_reads(self):
+        """Polls reads go to a replica, except within use_primary()."""
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_read(Question), 'replica1')
+            self.assertIsNone(self.router.db_for_read(User))
+            with use_primary():
+                self.assertIsNone(self.router.db_for_read(Question))
+            self.assertEqual(self.router.db_for_write(Question), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        """Only the default database is migrated."""
+        self.assertIs(self.router.allow_migrate('replica1', 'polls'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'polls'))
+
+
+@override_settings(POLLS_READ_REPLICAS=['replica1'])
+class ReplicaRoutingMiddlewareTest(SimpleTestCase):
+    """Only GET and HEAD requests without the cookie use the replicas."""
+
+    def handle(self, request):
+        """Pass a request through the middleware.
+
+        :return: the database Question is read from, and the response
+        """
+        databases = []
+
+        def view(request):
+            databases.append(ReplicaRouter().db_for_read(Question))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return databases[0], response
+
+    def test_get(self):
+        """A GET request reads from a replica."""
+        database, response = self.handle(RequestFactory().get('/polls/'))
+        self.assertEqual(database, 'replica1')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_post_sticks_to_primary(self):
+        """A POST reads from the default database and sets the cookie."""
+        database, response = self.handle(RequestFactory().post('/polls/'))
+        self.assertIsNone(database)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_get_after_write(self):
+        """A GET request with the cookie reads from the default database."""
+        request = RequestFactory().get('/polls/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        database, _ = self.handle(request)
+        self.assertIsNone(database)
+
+
+class VoteStickinessTest(TestCase):
+    """A voter reads their vote from the default database."""
+
+    @override_settings(POLLS_READ_REPLICAS=['default'])
+    def test_vote_sets_cookie(self):
+        """Voting sets the cookie that keeps reads on the primary."""
+        cache.clear()
+        question = create_question("Question.", days=-1)
+        choice = Choice.objects.create(question=question, choice_text="A")
+        user = User.objects.create_user(username="voter")
+        self.client.force_login(user)
+        response = self.client.post(reverse('polls:vote',
+                                            args=(question.id,)),
+                                    {'choice': choice.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(STICKY_COOKIE, response.cookies)
@@ -0,0 +1,126 @@
+"""Tests of the question states and the scheduler that flips them."""
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.cache import get_index_version, get_version
+from polls.models import Question, Vote
+from polls.scheduler import PollScheduler, next_change, update_states
+from polls.tests.question_creation import (create_question,
+                                           create_question_with_end_date)
+
+DAY = datetime.timedelta(days=1)
+
+
+class QuestionStateTest(TestCase):
+    """The state of a question is stored when it is saved."""
+
+    def test_states_by_dates(self):
+        """Questions are scheduled, open or closed by their dates."""
+        self.assertEqual(create_question("Future?", days=5).state,
+                         Question.State.SCHEDULED)
+        self.assertEqual(create_question("Open?", days=-5).state,
+                         Question.State.OPEN)
+        self.assertEqual(
+            create_question_with_end_date("Closed?", -5, -1).state,
+            Question.State.CLOSED)
+
+    def test_saved_dates(self):
+        """Saving new dates with update_fields stores the new state."""
+        question = create_question("Future?", days=5)
+        question.pub_date = timezone.now() - DAY
+        question.save(update_fields=['pub_date'])
+        question.refresh_from_db()
+        self.assertEqual(question.state, Question.State.OPEN)
+
+
+class StaleStateTest(TestCase):
+    """Pages follow the dates when no scheduler updated the states."""
+
+    def setUp(self):
+        """Create questions whose stored states are out of date."""
+        super().setUp()
+        cache.clear()
+        self.ended = create_question_with_end_date("Ended?", -5, 2)
+        self.choice = self.ended.choice_set.create(choice_text="Yes")
+        self.started = create_question("Started?", days=2)
+        Question.objects.filter(pk=self.ended.pk).update(
+            end_date=timezone.now() - 2 * DAY)
+        Question.objects.filter(pk=self.started.pk).update(
+            pub_date=timezone.now() - DAY)
+
+    def test_vote_after_end_date(self):
+        """Votes are refused once the end date passed."""
+        user = User.objects.create_user('voter', password='pass')
+        self.client.force_login(user)
+        self.client.post(reverse('polls:vote', args=(self.ended.pk,)),
+                         {'choice': self.choice.pk})
+        self.assertFalse(Vote.objects.exists())
+
+    def test_index_after_pub_date(self):
+        """Questions are listed once their pub_date passed."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Started?")
+
+
+class UpdateStatesTest(TestCase):
+    """The scheduler flips states when dates pass."""
+
+    def setUp(self):
+        """Create a scheduled question and a question that closes."""
+        super().setUp()
+        cache.clear()
+        self.future = create_question("Future?", days=1)
+        self.ending = create_question_with_end_date("Ending?", -1, 2)
+
+    def test_nothing_to_do(self):
+        """No state changes before a date passes."""
+        self.assertEqual(update_states(), {})
+
+    def test_open_and_close(self):
+        """Questions open and close when their dates pass."""
+        index_version = get_index_version()
+        meta_version = get_version(f'question:{self.future.pk}')
+        changed = update_states(timezone.now() + 3 * DAY)
+        self.assertEqual(changed, {Question.State.OPEN: [self.future.pk],
+                                   Question.State.CLOSED: [self.ending.pk]})
+        self.future.refresh_from_db()
+        self.assertEqual(self.future.state, Question.State.OPEN)
+        self.assertEqual(self.future.version, 1)
+        self.assertNotEqual(get_index_version(), index_version)
+        self.assertNotEqual(get_version(f'question:{self.future.pk}'),
+                            meta_version)
+
+    def test_next_change(self):
+        """The next change is the earliest pub_date or end_date to come."""
+        self.assertEqual(next_change(), self.future.pub_date)
+        seconds = PollScheduler(interval=60).run_once()
+        self.assertEqual(seconds, 60)
+        self.future.delete()
+        self.ending.end_date = timezone.now() + datetime.timedelta(seconds=5)
+        self.ending.save()
+        self.assertLessEqual(PollScheduler(interval=60).run_once(), 5)
+
+    def test_command(self):
+        """pollscheduler --once updates the states and exits."""
+        Question.objects.filter(pk=self.future.pk).update(
+            pub_date=timezone.now() - DAY)
+        out = StringIO()
+        call_command('pollscheduler', '--once', stdout=out)
+        self.assertIn("Updated the state of 1 questions.", out.getvalue())
+
+    def test_index_after_opening(self):
+        """A question appears on the index once it was opened."""
+        url = reverse('polls:index')
+        response = self.client.get(url)
+        self.assertNotContains(response, "Future?")
+        Question.objects.filter(pk=self.future.pk).update(
+            pub_date=timezone.now() - DAY)
+        update_states()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, "Future?")
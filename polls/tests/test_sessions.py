@@ -0,0 +1,84 @@
+"""Tests of the session storage of KU Polls."""
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import bench
+from polls.models import Choice
+from polls.tests.question_creation import create_question
+
+
+class PurgeSessionsTest(TestCase):
+    """Expired sessions are deleted in batches."""
+
+    def create_session(self, expire_days):
+        """Store a session that expires in expire_days days."""
+        session = SessionStore()
+        session['key'] = 'value'
+        session.set_expiry(timezone.now()
+                           + datetime.timedelta(days=expire_days))
+        session.save()
+        return session.session_key
+
+    def test_purge_expired(self):
+        """Only the expired sessions are deleted."""
+        for _ in range(5):
+            self.create_session(-1)
+        active = self.create_session(1)
+        out = StringIO()
+        call_command('purgesessions', batch_size=2, stdout=out)
+        self.assertIn("Deleted 5 expired sessions", out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('pk', flat=True)),
+                         [active])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookies(self):
+        """Nothing is purged when sessions live in cookies."""
+        self.create_session(-1)
+        out = StringIO()
+        call_command('purgesessions', stdout=out)
+        self.assertIn("not stored in the database", out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class SessionEngineTest(TestCase):
+    """Votes work with every session backend and keep their messages."""
+
+    def setUp(self):
+        """Create a question open for voting and a voter."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("Question.", days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Choice")
+        self.user = User.objects.create_user(username="voter")
+        self.vote = ('post', reverse('polls:vote', args=(self.question.id,)),
+                     {'choice': self.choice.id})
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_vote_with_signed_cookies(self):
+        """The vote's message is shown without a session table."""
+        self.client.force_login(self.user)
+        response = self.client.post(self.vote[1], self.vote[2], follow=True)
+        self.assertContains(response, "You voted for")
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_fewer_queries_without_session_table(self):
+        """Cookie and cached sessions save the session query."""
+        queries = bench.compare_session_engines([self.vote] * 3, [self.user], {
+            'db': 'django.contrib.sessions.backends.db',
+            'cached_db': 'django.contrib.sessions.backends.cached_db',
+            'signed_cookies':
+                'django.contrib.sessions.backends.signed_cookies',
+        })
+        self.assertLess(queries['signed_cookies'], queries['db'])
+        self.assertLess(queries['cached_db'], queries['db'])
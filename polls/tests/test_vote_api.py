@@ -0,0 +1,105 @@
+"""Tests of the batch vote API of KU Polls."""
+import json
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from polls.models import Choice, Vote
+from polls.tests.question_creation import (create_question,
+                                           create_question_with_end_date)
+
+
+class VoteBatchTest(TestCase):
+    """Many ballots are cast in one request."""
+
+    def setUp(self):
+        """Create two open questions, a closed one and a voter."""
+        super().setUp()
+        cache.clear()
+        self.first = create_question("First.", days=-1)
+        self.second = create_question("Second.", days=-1)
+        self.closed = create_question_with_end_date("Closed.", pub_days=-5,
+                                                    end_days=-1)
+        self.a, self.b = [Choice.objects.create(question=self.first,
+                                                choice_text=text)
+                          for text in "AB"]
+        self.c = Choice.objects.create(question=self.second, choice_text="C")
+        self.d = Choice.objects.create(question=self.closed, choice_text="D")
+        self.user = User.objects.create_user(username="voter")
+        self.client.force_login(self.user)
+        self.url = reverse('polls:vote_batch')
+
+    def post(self, ballots, client=None):
+        """Send ballots as (question, choice) pairs to the API."""
+        body = {'ballots': [{'question_id': question.id,
+                             'choice_id': choice.id}
+                            for question, choice in ballots]}
+        return (client or self.client).post(
+            self.url, json.dumps(body), content_type='application/json')
+
+    def statuses(self, response):
+        """Return the status of every ballot of a response."""
+        return [result['status'] for result in response.json()['results']]
+
+    def test_cast_ballots(self):
+        """Valid ballots are recorded and invalid ones rejected."""
+        response = self.post([(self.first, self.a), (self.second, self.c),
+                              (self.closed, self.d), (self.second, self.a)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response),
+                         ['voted', 'voted', 'rejected', 'rejected'])
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 2)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.vote_count, 1)
+
+    def test_change_votes(self):
+        """Ballots replace earlier votes and count them only once."""
+        self.post([(self.first, self.a), (self.second, self.c)])
+        response = self.post([(self.first, self.b), (self.second, self.c)])
+        self.assertEqual(self.statuses(response), ['changed', 'unchanged'])
+        self.assertEqual(
+            dict(Choice.objects.values_list('choice_text', 'vote_count')),
+            {'A': 0, 'B': 1, 'C': 1, 'D': 0})
+
+    def test_duplicate_ballots(self):
+        """A second ballot for the same question is rejected."""
+        response = self.post([(self.first, self.a), (self.first, self.b)])
+        self.assertEqual(self.statuses(response), ['voted', 'rejected'])
+
+    def test_validation_queries(self):
+        """All ballots are validated with one query."""
+        # session, user and validation; nothing is written
+        with self.assertNumQueries(3):
+            self.post([(self.closed, self.d), (self.first, self.d),
+                       (self.second, self.d)])
+
+    def anonymous(self):
+        """Return a client that is not logged in."""
+        return Client()
+
+    def test_login_required(self):
+        """Anonymous visitors get 401."""
+        response = self.post([(self.first, self.a)], client=self.anonymous())
+        self.assertEqual(response.status_code, 401)
+
+    def test_bad_body(self):
+        """A malformed body gets 400."""
+        for body in ('not json', '[]', '{"ballots": [{"question_id": "1"}]}'):
+            response = self.client.post(self.url, body,
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(POLLS_API_MAX_BALLOTS=1)
+    def test_too_many_ballots(self):
+        """Requests over POLLS_API_MAX_BALLOTS are refused."""
+        response = self.post([(self.first, self.a), (self.second, self.c)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_csrf(self):
+        """The API is protected against cross-site requests."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = self.post([(self.first, self.a)], client=client)
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,143 @@
+"""Tests of buffered voting for KU Polls."""
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls import buffer as vote_buffer
+from polls.buffer import VoteBuffer, get_vote_buffer
+from polls.models import Choice, Question, ResultSnapshot, Vote
+
+
+class VoteBufferTest(TestCase):
+    """Votes are buffered, merged and flushed in batches."""
+
+    def setUp(self):
+        """Enable the vote buffer and create a user and a question."""
+        super().setUp()
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(POLLS_VOTE_BUFFER=True,
+                                     POLLS_VOTE_BUFFER_DIR=self.directory,
+                                     POLLS_VOTE_BUFFER_INTERVAL=3600)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.buffer = get_vote_buffer()
+        self.addCleanup(self.buffer.close)
+        self.user = User.objects.create_user(username="voter",
+                                             password="FatChance!")
+        self.question = Question.objects.create(question_text="Question")
+        self.choice1, self.choice2 = [
+            Choice.objects.create(question=self.question,
+                                  choice_text=f"Choice {n}")
+            for n in (1, 2)]
+        self.url = reverse('polls:vote', args=[self.question.id])
+        self.client.login(username="voter", password="FatChance!")
+
+    def test_vote_is_buffered(self):
+        """A vote is logged but not written until the buffer is flushed."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        self.assertFalse(Vote.objects.exists())
+        with open(self.buffer.log_path) as log:
+            self.assertEqual(len(log.readlines()), 1)
+        self.buffer.flush()
+        self.assertEqual(Vote.objects.get(user=self.user).choice,
+                         self.choice1)
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 1)
+        self.assertFalse(os.listdir(self.directory))
+
+    def test_repeated_votes_are_merged(self):
+        """Only the last of several buffered votes is written."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        self.client.post(self.url, {"choice": self.choice2.id})
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Vote.objects.get(user=self.user).choice,
+                         self.choice2)
+        self.choice1.refresh_from_db()
+        self.choice2.refresh_from_db()
+        self.assertEqual((self.choice1.votes, self.choice2.votes), (0, 1))
+
+    def test_buffered_vote_is_visible(self):
+        """The voter sees a buffered vote on the detail and results pages."""
+        self.client.post(self.url, {"choice": self.choice2.id})
+        response = self.client.get(reverse('polls:detail',
+                                           args=[self.question.id]))
+        self.assertEqual(response.context['vote'].choice_id, self.choice2.id)
+        response = self.client.get(reverse('polls:results',
+                                           args=[self.question.id]))
+        self.assertEqual(response.context['question'].total_votes, 1)
+        self.assertEqual(
+            [c.vote_count for c in response.context['question'].choices],
+            [0, 1])
+
+    def test_buffered_remove_vote(self):
+        """A buffered removal deletes the stored vote on flush."""
+        self.client.post(self.url, {"choice": self.choice1.id})
+        self.buffer.flush()
+        self.client.post(reverse('polls:remove_vote',
+                                 args=[self.question.id]))
+        response = self.client.get(reverse('polls:results',
+                                           args=[self.question.id]))
+        self.assertEqual(response.context['question'].total_votes, 0)
+        self.buffer.flush()
+        self.assertFalse(Vote.objects.exists())
+        self.choice1.refresh_from_db()
+        self.assertEqual(self.choice1.votes, 0)
+
+    def test_recover_from_log(self):
+        """Votes logged by a process that stopped are replayed."""
+        with open(os.path.join(self.directory, '999999999.log'), 'w') as log:
+            log.write(f'[{self.user.id}, {self.question.id}, '
+                      f'{self.choice1.id}]\n[1, 2')
+        buffer = VoteBuffer(self.directory)
+        self.assertEqual(buffer.lookup(self.user.id, self.question.id),
+                         (True, self.choice1.id))
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(Vote.objects.filter(user=self.user).exists())
+
+    def test_recover_log_claimed_by_another_process(self):
+        """A log that another process claimed first is skipped."""
+        path = os.path.join(self.directory, '999999999.log')
+        self.buffer._replay(Path(path))
+        self.assertEqual(self.buffer.lookup(self.user.id, self.question.id),
+                         (False, None))
+
+    def test_flush_removes_snapshot(self):
+        """Results frozen before buffered votes were written are retaken."""
+        self.buffer.record(self.user.id, self.question.id, self.choice1.id)
+        ResultSnapshot.objects.create(question=self.question, total_votes=0,
+                                      choices=[])
+        self.buffer.flush()
+        self.assertFalse(
+            ResultSnapshot.objects.filter(question=self.question).exists())
+
+    def test_flushed_vote_visible_until_committed(self):
+        """Votes being flushed are still found until they are committed."""
+        self.buffer.record(self.user.id, self.question.id, self.choice1.id)
+        seen = []
+        apply = vote_buffer.apply_vote_batch
+
+        def apply_vote_batch(batch):
+            seen.append((
+                self.buffer.lookup(self.user.id, self.question.id),
+                self.buffer.tally_deltas(self.question.id)))
+            return apply(batch)
+
+        with mock.patch.object(vote_buffer, 'apply_vote_batch',
+                               apply_vote_batch):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.buffer.flush()
+                self.assertEqual(
+                    self.buffer.lookup(self.user.id, self.question.id),
+                    (True, self.choice1.id))
+        self.assertEqual(seen, [((True, self.choice1.id),
+                                 {self.choice1.id: 1})])
+        self.assertEqual(self.buffer.lookup(self.user.id, self.question.id),
+                         (False, None))
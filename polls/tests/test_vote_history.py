@@ -0,0 +1,118 @@
+"""Tests of the vote timestamps and the per-minute vote history."""
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Choice, Vote, VoteBucket
+from polls.tests.question_creation import create_question
+from polls.voting import apply_vote_batch, cast_vote, withdraw_vote
+
+
+class VoteHistoryTest(TestCase):
+    """Votes keep their dates and are counted in minute buckets."""
+
+    def setUp(self):
+        """Create a question with two choices and a user."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("History?", days=-1)
+        self.first = Choice.objects.create(question=self.question,
+                                           choice_text="First")
+        self.second = Choice.objects.create(question=self.question,
+                                            choice_text="Second")
+        self.user = User.objects.create_user('voter', password='pass')
+
+    def counts(self):
+        """Return the added and removed counts by choice id."""
+        return {bucket.choice_id: (bucket.added, bucket.removed)
+                for bucket in VoteBucket.objects.all()}
+
+    def test_changed_vote(self):
+        """A changed vote is removed from the old choice's history."""
+        cast_vote(self.user, self.first)
+        created_at = Vote.objects.get(user=self.user).created_at
+        cast_vote(self.user, self.second)
+        self.assertEqual(self.counts(),
+                         {self.first.pk: (1, 1), self.second.pk: (1, 0)})
+        vote = Vote.objects.get(user=self.user)
+        self.assertEqual(vote.created_at, created_at)
+        self.assertGreaterEqual(vote.updated_at, created_at)
+
+    def test_withdrawn_vote(self):
+        """A withdrawn vote is recorded as a removal."""
+        cast_vote(self.user, self.first)
+        withdraw_vote(self.user, self.question)
+        self.assertEqual(self.counts(), {self.first.pk: (1, 1)})
+
+    def test_batch_accumulates(self):
+        """Batches add to the buckets of the same minute."""
+        other = User.objects.create_user('other', password='pass')
+        apply_vote_batch({(self.user.pk, self.question.pk): self.first.pk,
+                          (other.pk, self.question.pk): self.first.pk})
+        apply_vote_batch({(other.pk, self.question.pk): self.second.pk})
+        self.assertEqual(self.counts(),
+                         {self.first.pk: (2, 1), self.second.pk: (1, 0)})
+        self.assertEqual(VoteBucket.objects.count(), 2)
+
+
+class HistoryApiTest(TestCase):
+    """The history endpoint aggregates the buckets."""
+
+    def setUp(self):
+        """Create buckets in two minutes of one hour and the next hour."""
+        super().setUp()
+        cache.clear()
+        self.question = create_question("History?", days=-1)
+        self.choice = Choice.objects.create(question=self.question,
+                                            choice_text="Only")
+        self.hour = (timezone.now() - datetime.timedelta(hours=3)).replace(
+            minute=0, second=0, microsecond=0)
+        change = {self.choice.pk: (self.question.pk, 2, 1)}
+        for minutes in (1, 2, 61):
+            VoteBucket.record(
+                change, when=self.hour + datetime.timedelta(minutes=minutes))
+        self.url = reverse('polls:api_history', args=(self.question.pk,))
+
+    def test_minutes(self):
+        """Every minute is a bucket, read with one query after the meta."""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            buckets = self.client.get(self.url).json()['buckets']
+        self.assertEqual([(b['added'], b['removed']) for b in buckets],
+                         [(2, 1)] * 3)
+
+    def test_hours(self):
+        """Minutes of the same hour are summed."""
+        response = self.client.get(self.url, {'interval': 'hour'})
+        buckets = response.json()['buckets']
+        self.assertEqual([(b['added'], b['removed']) for b in buckets],
+                         [(4, 2), (2, 1)])
+
+    def test_since(self):
+        """Buckets before since are left out."""
+        since = (self.hour + datetime.timedelta(hours=1)).isoformat()
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual(len(response.json()['buckets']), 1)
+
+    def test_invalid_parameters(self):
+        """An unknown interval or an invalid since is refused."""
+        self.assertEqual(
+            self.client.get(self.url, {'interval': 'day'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(self.url, {'since': 'yesterday'}).status_code,
+            400)
+
+
+class FixtureDatesTest(TestCase):
+    """Votes loaded from fixtures without dates are dated on load."""
+
+    def test_loaddata(self):
+        """The fixtures of the repository load with dated votes."""
+        call_command('loaddata', 'data/users.json', 'data/polls-v4.json',
+                     'data/votes-v4.json', verbosity=0)
+        self.assertTrue(Vote.objects.exists())
+        self.assertFalse(Vote.objects.filter(created_at=None).exists())
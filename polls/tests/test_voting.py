@@ -1,8 +1,12 @@
 """Tests of voting for KU Polls."""
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
 from django.urls import reverse
 
-from polls.models import Choice, Question
+from polls.models import Choice, Question, Vote
 from django.contrib.auth.models import User
 from polls.tests.question_creation import (create_question,
                                            create_question_with_end_date)
@@ -75,6 +79,7 @@ class VotingTest(TestCase):
         results = reverse('polls:results', args=(self.question.id,))
         self.assertRedirects(response, results, status_code=302,
                              target_status_code=200)
+        self.choice.refresh_from_db()
         self.assertEqual(self.choice.votes, 1)
 
     def test_user_change_vote(self):
@@ -84,6 +89,8 @@ class VotingTest(TestCase):
         form_data_2 = {"choice": f"{changed_choice.id}"}
         self.client.post(self.url, form_data_1)
         self.client.post(self.url, form_data_2)
+        self.choice.refresh_from_db()
+        changed_choice.refresh_from_db()
         self.assertEqual(self.choice.votes, 0)
         self.assertEqual(changed_choice.votes, 1)
 
@@ -92,6 +99,7 @@ class VotingTest(TestCase):
         form_data = {"choice": f"{self.choice.id}"}
         for _ in range(3):
             self.client.post(self.url, form_data)
+        self.choice.refresh_from_db()
         self.assertEqual(self.choice.votes, 1)
 
     def test_remove_vote(self):
@@ -102,3 +110,61 @@ class VotingTest(TestCase):
         self.assertEqual(1, self.user1.vote_set.all().count())
         self.client.post(remove_vote_url, {})
         self.assertEqual(0, self.user1.vote_set.all().count())
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    def test_rebuild_vote_counts(self):
+        """The rebuildvotecounts command recounts votes from Vote rows."""
+        self.client.post(self.url, {"choice": f"{self.choice.id}"})
+        Choice.objects.update(vote_count=42)
+        call_command('rebuildvotecounts', stdout=StringIO())
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+        self.assertEqual(self.question.choice_set.last().votes, 0)
+
+    def test_rebuild_vote_counts_invalidates_tallies(self):
+        """Results read through the cache show the rebuilt counts."""
+        cache.clear()
+        results_url = reverse('polls:results', args=[self.question.id])
+        self.client.get(results_url)
+        # a vote loaded without counting it, so the counters drift
+        Vote.objects.bulk_create([Vote(user=self.user1, choice=self.choice,
+                                       question=self.question)])
+        call_command('rebuildvotecounts', stdout=StringIO())
+        response = self.client.get(results_url)
+        self.assertEqual(response.context['question'].total_votes, 1)
+
+    def test_rebuild_vote_counts_of_questions(self):
+        """rebuildvotecounts leaves out the questions not given to it."""
+        Choice.objects.update(vote_count=42)
+        other = create_question("Other question.", days=-1)
+        call_command('rebuildvotecounts', other.id, stdout=StringIO())
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 42)
+
+    def test_vote_records_question(self):
+        """A vote stores the question of its choice."""
+        self.client.post(self.url, {"choice": f"{self.choice.id}"})
+        vote = self.user1.vote_set.get()
+        self.assertEqual(vote.question, self.question)
+
+    def test_unique_vote_per_question(self):
+        """The database rejects a second vote by a user on a question."""
+        Vote.objects.create(user=self.user1, choice=self.choice)
+        with self.assertRaises(IntegrityError):
+            Vote.objects.create(user=self.user1,
+                                choice=self.question.choice_set.last())
+
+    def test_deleted_user_votes_discounted(self):
+        """Deleting a user takes their votes off the vote counters."""
+        self.client.post(self.url, {"choice": f"{self.choice.id}"})
+        self.user1.delete()
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    def test_queryset_delete_discounted(self):
+        """Votes deleted with the ORM are taken off the vote counters."""
+        self.client.post(self.url, {"choice": f"{self.choice.id}"})
+        Vote.objects.all().delete()
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
@@ -1,13 +1,38 @@
 """URL dispatcher for KU Polls."""
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, export, live, metrics, views
+
+
+def view_patterns(views):
+    """Return the URL patterns of the polls app served by a views module.
+
+    :param views: polls.views, or polls.async_views for ASGI
+    """
+    return [
+        path('', views.IndexView.as_view(), name='index'),
+        path('<int:pk>/', views.DetailView.as_view(), name='detail'),
+        path('<int:pk>/results/', views.ResultsView.as_view(),
+             name='results'),
+        path('<int:pk>/results/stream/', live.results_stream,
+             name='results_stream'),
+        path('<int:question_id>/vote/', views.vote, name='vote'),
+        path('<int:question_id>/remove_vote/',
+             views.remove_vote, name='remove_vote'),
+        path('metrics/', metrics.metrics, name='metrics'),
+        path('export/', export.export, name='export'),
+        path('api/votes/', api.vote_batch, name='vote_batch'),
+        path('api/questions/', api.QuestionListApi.as_view(),
+             name='api_questions'),
+        path('api/questions/<int:pk>/', api.QuestionApi.as_view(),
+             name='api_question'),
+        path('api/questions/<int:pk>/results/', api.ResultsApi.as_view(),
+             name='api_results'),
+        path('api/questions/<int:pk>/history/', api.HistoryApi.as_view(),
+             name='api_history'),
+    ]
+
 
 app_name = 'polls'
-urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
-    path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote'),
-    path('<int:question_id>/remove_vote/',
-         views.remove_vote, name='remove_vote'),
-]
+urlpatterns = view_patterns(
+    async_views if settings.POLLS_ASYNC_VIEWS else views)
@@ -1,4 +1,6 @@
 """A module that contains views for the polls application."""
+from django.conf import settings
+from django.db.models import BooleanField, Case, Q, When
 from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -11,16 +13,45 @@ from django.contrib.auth.signals import (
     user_login_failed)
 from django.contrib.auth.decorators import login_required
 from django.dispatch import receiver
-from .models import Question, Choice, Vote
+from .buffer import get_vote_buffer
+from .cache import (apply_tallies, get_index_version, get_question_meta,
+                    get_tallies)
+from .conditional import ConditionalPageMixin
+from .live import streams_live
+from .models import Question, Choice, ResultSnapshot, Vote
+from .pagination import KeysetPage
+from .voting import cast_vote, withdraw_vote
 import logging
+import time
 
 logger = logging.getLogger("polls")
 
 
-class IndexView(generic.ListView):
+def published_questions():
+    """Return the published questions, newest first.
+
+    Each question is annotated with is_open, whether voting is
+    currently allowed, computed by the database from the dates, which
+    are right even if no scheduler has updated the stored states.
+    """
+    now = timezone.now()
+    return Question.objects.filter(pub_date__lte=now).annotate(
+        is_open=Case(
+            When(Q(end_date__isnull=True) | Q(end_date__gt=now), then=True),
+            default=False,
+            output_field=BooleanField())).order_by('-pub_date', '-pk')
+
+
+class IndexView(ConditionalPageMixin, generic.ListView):
     """Display poll questions sorted by date from newest to oldest.
 
-    :return: a rendered template with all questions
+    Questions are paginated by a cursor on (-pub_date, id) given in the
+    ``cursor`` query parameter. The ETag of a page follows its cached
+    fragment: it changes with the index version, which is bumped when
+    questions are saved and when they open or close, and whenever the
+    fragment expires.
+
+    :return: a rendered template with a page of questions
     """
 
     template_name = 'polls/index.html'
@@ -29,15 +60,44 @@ class IndexView(generic.ListView):
     def get_queryset(self):
         """Return published questions ordered by publication date.
 
-        (not including those set to be published in the future).
+        (not including those set to be published in the future),
+        annotated with is_open, see published_questions().
         """
-        return Question.objects.filter(
-            pub_date__lte=timezone.now()).order_by('-pub_date')
+        return published_questions()
+
+    def get(self, request, *args, **kwargs):
+        """Render the index unless the visitor's copy is up to date."""
+        response = self.not_modified()
+        if response is not None:
+            return response
+        return self.add_validators(super().get(request, *args, **kwargs))
+
+    def get_etag_parts(self):
+        """Return the index version and the current cache period."""
+        timeout = max(settings.POLLS_INDEX_CACHE_TIMEOUT, 1)
+        return [get_index_version(), int(time.time()) // timeout,
+                self.request.GET.get('cursor')]
+
+    def get_context_data(self, **kwargs):
+        """Replace the question list with a lazily evaluated page."""
+        context = super().get_context_data(**kwargs)
+        cursor = self.request.GET.get('cursor')
+        page = KeysetPage(self.object_list, cursor,
+                          per_page=settings.POLLS_INDEX_PAGE_SIZE)
+        context['latest_question_list'] = page
+        context['page'] = page
+        context['index_version'] = get_index_version()
+        context['index_cache_timeout'] = settings.POLLS_INDEX_CACHE_TIMEOUT
+        return context
 
 
-class DetailView(generic.DetailView):
+class DetailView(ConditionalPageMixin, generic.DetailView):
     """Display the detail of a question.
 
+    The page changes with the question's version, which is bumped by
+    every vote in the question including the visitor's own, and with
+    the visitor's vote that is still in the write-behind buffer.
+
     :param pk: primary key of the question
     :return: a rendered template with the question's details
     """
@@ -46,55 +106,112 @@ class DetailView(generic.DetailView):
     template_name = 'polls/detail.html'
 
     def get_queryset(self):
-        """Excludes any questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        """Return all questions.
+
+        Questions that aren't published yet are rejected by the
+        can_vote check in get(), which explains why to the visitor.
+        """
+        return Question.objects.all()
 
     def get(self, request, *args, **kwargs):
         """Get the question object.
 
         Redirect the visitor to the index page with an error message
         if the Question with entered ID does not exist or
-        unavailable for voting
+        unavailable for voting. The question is fetched once, and its
+        choices are read from the cache only when the page is rendered.
 
         :param request: request from the vistior
         :param *args: arguments
         :param *kwargs: keyword arguments
         """
         try:
-            question = get_object_or_404(Question, pk=kwargs["pk"])
+            self.object = self.get_object()
         except Http404 as ex:
-            logger.exception(f"Non-existent question {kwargs['pk']} %s", ex)
+            logger.exception("Non-existent question %s %s", kwargs['pk'], ex)
             messages.error(request, f"Poll ID {kwargs['pk']} does not exist.")
             return HttpResponseRedirect(reverse("polls:index"))
-        if not question.can_vote():
+        if not self.object.can_vote():
             messages.error(request, "Voting is unavailable for Poll ID" +
                                     f"{kwargs['pk']}.")
             return HttpResponseRedirect(reverse("polls:index"))
-        return super().get(request, *args, **kwargs)
+        response = self.not_modified()
+        if response is not None:
+            return response
+        self.object.choices = self.get_choices()
+        context = self.get_context_data(object=self.object)
+        return self.add_validators(self.render_to_response(context))
+
+    def get_etag_parts(self):
+        """Return the question's version and the visitor's buffered vote."""
+        parts = [self.object.version, self.object.last_modified]
+        user = self.request.user
+        buffer = get_vote_buffer()
+        if buffer is not None and user.is_authenticated:
+            parts.append(buffer.lookup(user.pk, self.object.pk))
+        return parts
+
+    def get_last_modified(self):
+        """Return when the question last changed.
+
+        Buffered votes do not change it, so it is not sent while the
+        write-behind buffer is enabled.
+        """
+        if get_vote_buffer() is not None:
+            return None
+        return self.object.last_modified
+
+    def get_choices(self):
+        """Return the choices of the question from the cache."""
+        return [Choice(pk=pk, question=self.object, choice_text=text)
+                for pk, text in get_question_meta(self.object.pk)['choices']]
 
     def get_context_data(self, **kwargs):
         """Create context dictionary used to render the template."""
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-        try:
-            selected_choice = kwargs["object"].choice_set.filter(
-                vote__user=user).first()
-            vote = Vote.objects.get(user=user, choice=selected_choice)
-        except (TypeError, KeyError, Vote.DoesNotExist):
-            vote = None
-        context['vote'] = vote
+        if 'vote' not in kwargs:
+            context['vote'] = self.get_selected_vote()
         return context
 
+    def get_selected_vote(self):
+        """Return the visitor's vote in the question.
 
-class ResultsView(generic.DetailView):
+        :return: the Vote, or None for anonymous visitors and users who
+                 have not voted in the question
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            found, choice_id = buffer.lookup(user.pk, self.object.pk)
+            if found and choice_id is None:
+                return None
+            if found:
+                return Vote(user=user, question=self.object,
+                            choice_id=choice_id)
+        return Vote.objects.filter(user=user, question=self.object).first()
+
+
+class ResultsView(ConditionalPageMixin, generic.DetailView):
     """Display the result of a question.
 
+    The results of a closed question are served from its
+    ResultSnapshot, which is taken on the first view after the
+    question's end_date, and may be cached by the browser for
+    POLLS_SNAPSHOT_MAX_AGE seconds. Other results must be revalidated,
+    and change with the question's version and its buffered votes.
+
     :return: a rendered template with the question's result
     """
 
     model = Question
     template_name = 'polls/results.html'
 
+    def get_queryset(self):
+        """Return questions with their results snapshots, if any."""
+        return Question.objects.select_related('snapshot')
+
     def get(self, request, *args, **kwargs):
         """Get the question object.
 
@@ -107,17 +224,91 @@ class ResultsView(generic.DetailView):
         :param *kwargs: keyword arguments
         """
         try:
-            question = get_object_or_404(Question, pk=kwargs["pk"])
+            self.object = self.get_object()
         except Http404 as ex:
-            logger.exception(f"Non-existent question {kwargs['pk']} %s", ex)
+            logger.exception("Non-existent question %s %s", kwargs['pk'], ex)
             messages.error(request, f"Poll ID {kwargs['pk']} does not exist.")
             return HttpResponseRedirect(reverse("polls:index"))
-        if not question.is_published():
+        if not self.object.is_published():
             messages.error(request,
                            f"Results for Poll ID {kwargs['pk']}" +
                            "are unavailable")
             return HttpResponseRedirect(reverse("polls:index"))
-        return super().get(request, *args, **kwargs)
+        if self.object.is_closed():
+            self.cache_max_age = settings.POLLS_SNAPSHOT_MAX_AGE
+        response = self.not_modified()
+        if response is not None:
+            return response
+        if self.object.is_closed():
+            snapshot = self.get_snapshot()
+            snapshot.apply(self.object)
+            context = self.get_context_data(object=self.object,
+                                            snapshot=snapshot)
+        else:
+            self.load_tallies()
+            context = self.get_context_data(object=self.object)
+        return self.add_validators(self.render_to_response(context))
+
+    def get_etag_parts(self):
+        """Return the question's version and its buffered votes."""
+        parts = [self.object.version, self.object.last_modified,
+                 self.object.is_closed()]
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            parts.append(sorted(
+                buffer.pending_for_question(self.object.pk).items(),
+                key=str))
+        return parts
+
+    def get_last_modified(self):
+        """Return when the question last changed.
+
+        Buffered votes and the end of voting do not change it, so it is
+        not sent while the write-behind buffer is enabled, and the end
+        date counts as a change once it has passed.
+        """
+        if get_vote_buffer() is not None:
+            return None
+        if self.object.is_closed():
+            return max(self.object.last_modified, self.object.end_date)
+        return self.object.last_modified
+
+    def get_context_data(self, **kwargs):
+        """Tell the template whether to follow the live results stream."""
+        context = super().get_context_data(**kwargs)
+        context['live_results'] = streams_live(self.request)
+        return context
+
+    def load_tallies(self):
+        """Set the cached tallies on the question, with buffered votes."""
+        apply_tallies(self.object, get_question_meta(self.object.pk),
+                      get_tallies(self.object.pk))
+        self.merge_buffered_votes()
+
+    def merge_buffered_votes(self):
+        """Add the votes that are still buffered to the tallies."""
+        buffer = get_vote_buffer()
+        if buffer is not None:
+            buffer.merge_tallies(self.object)
+
+    def get_snapshot(self):
+        """Return the snapshot of the closed question, taking it if needed."""
+        try:
+            return self.object.snapshot
+        except ResultSnapshot.DoesNotExist:
+            pass
+        self.load_tallies()
+        return self.save_snapshot()
+
+    def save_snapshot(self):
+        """Store a snapshot of the tallied question and return it.
+
+        A snapshot stored meanwhile by a concurrent request is kept.
+        """
+        snapshot = ResultSnapshot.from_question(self.object)
+        ResultSnapshot.objects.bulk_create([snapshot], ignore_conflicts=True)
+        self.object.snapshot = snapshot
+        return snapshot
 
 
 @login_required
@@ -131,26 +322,32 @@ def vote(request, question_id):
     """
     question = get_object_or_404(Question, pk=question_id)
     user = request.user
+    if not question.can_vote():
+        messages.error(request,
+                       f"Voting is unavailable for Poll ID {question_id}.")
+        return HttpResponseRedirect(reverse("polls:index"))
     try:
-        logger.info(f"{user.username} voted for choice "
-                    f"{request.POST['choice']} in question {question_id}")
+        logger.info("%s voted for choice %s in question %s",
+                    user.username, request.POST['choice'], question_id)
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
     except (KeyError, Choice.DoesNotExist):
-        logger.exception(f"{user.username} did not select a choice")
+        logger.exception("%s did not select a choice", user.username)
         messages.error(request, "You didn't select a choice.")
         return HttpResponseRedirect(reverse('polls:detail',
                                             args=(question_id,)))
 
-    try:
-        vote = user.vote_set.get(choice__question=question)
-        vote.choice = selected_choice
-        vote.save()
-        messages.success(request, "Your vote was changed to " +
-                                  f"'{selected_choice.choice_text}'.")
-    except (KeyError, Vote.DoesNotExist):
-        vote = Vote.objects.create(user=user, choice=selected_choice)
+    buffer = get_vote_buffer()
+    if buffer is not None:
+        previous_choice_id = buffer.current_choice_id(user.pk, question.pk)
+        buffer.record(user.pk, question.pk, selected_choice.pk)
+    else:
+        previous_choice_id = cast_vote(user, selected_choice)
+    if previous_choice_id is None:
         messages.success(request,
                          f"You voted for '{selected_choice.choice_text}'.")
+    else:
+        messages.success(request, "Your vote was changed to " +
+                                  f"'{selected_choice.choice_text}'.")
 
     return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
 
@@ -165,14 +362,24 @@ def remove_vote(request, question_id):
     """
     question = get_object_or_404(Question, pk=question_id)
     user = request.user
-    try:
-        vote = user.vote_set.get(choice__question=question)
-        vote.delete()
-        logger.info(f"{user.username} remove vote for question {question_id}")
+    if not question.can_vote():
+        messages.error(request,
+                       f"Voting is unavailable for Poll ID {question_id}.")
+        return HttpResponseRedirect(reverse("polls:index"))
+    buffer = get_vote_buffer()
+    if buffer is not None:
+        removed_choice_id = buffer.current_choice_id(user.pk, question.pk)
+        if removed_choice_id is not None:
+            buffer.record(user.pk, question.pk, None)
+    else:
+        removed_choice_id = withdraw_vote(user, question)
+    if removed_choice_id is not None:
+        logger.info("%s remove vote for question %s",
+                    user.username, question_id)
         messages.success(request, "Your vote has been removed.")
-    except (KeyError, Vote.DoesNotExist):
-        logger.warning(f"{user.username} failed to remove vote for question" +
-                       f"{question_id}")
+    else:
+        logger.warning("%s failed to remove vote for question %s",
+                       user.username, question_id)
         messages.error(request, "You have not voted for this question.")
 
     return HttpResponseRedirect(reverse('polls:results', args=(question_id,)))
@@ -194,18 +401,19 @@ def get_client_ip(request):
 def user_login(sender, request, user, **kwargs):
     """Log successful login."""
     ip = get_client_ip(request)
-    logger.info(f"user {user.username} logged in via ip: {ip}")
+    logger.info("user %s logged in via ip: %s", user.username, ip)
 
 
 @receiver(user_logged_out)
 def user_logout(sender, request, user, **kwargs):
     """Log successful logout."""
     ip = get_client_ip(request)
-    logger.info(f"user {user.username} logged out via ip: {ip}")
+    logger.info("user %s logged out via ip: %s", user.username, ip)
 
 
 @receiver(user_login_failed)
 def user_failed_login(sender, request, credentials, **kwargs):
     """Log unsuccessful login."""
     ip = get_client_ip(request)
-    logger.warning(f"login failed for {credentials['username']} from ip: {ip}")
+    logger.warning("login failed for %s from ip: %s",
+                   credentials['username'], ip)
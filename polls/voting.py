@@ -0,0 +1,249 @@
+"""Recording and removing votes for KU Polls."""
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.utils import timezone
+
+from .models import Choice, Question, Vote, VoteBucket
+from .signals import votes_changed
+
+
+def _lock_user(user):
+    """Lock the user's row so that votes by one user are serialized.
+
+    Concurrent submits by the same user then read the previous vote
+    only after the other submit committed, which keeps the vote
+    counters exact.
+    """
+    User.objects.select_for_update().filter(pk=user.pk).values('pk').first()
+
+
+def _lock_user_vote(user, question_id):
+    """Lock the user's row and read their vote in a question.
+
+    Both happen in one query; see _lock_user.
+
+    :return: the id of the choice the user voted for, or None
+    """
+    previous = Vote.objects.filter(user_id=OuterRef('pk'),
+                                   question_id=question_id)
+    return (User.objects.select_for_update(of=('self',))
+            .filter(pk=user.pk)
+            .values_list(Subquery(previous.values('choice_id')[:1]),
+                         flat=True)
+            .first())
+
+
+def _adjust_counters(deltas):
+    """Add deltas to the vote counters of choices with one UPDATE.
+
+    :param deltas: a mapping of choice id to the change of its counter
+    :return: the deltas that are not zero
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if deltas:
+        Choice.objects.filter(pk__in=deltas).update(
+            vote_count=F('vote_count') + Case(
+                *[When(pk=pk, then=Value(delta))
+                  for pk, delta in deltas.items()],
+                default=Value(0)))
+    return deltas
+
+
+def cast_vote(user, choice):
+    """Record the user's vote for choice, replacing any earlier vote.
+
+    The counters must move the vote off the previous choice, which an
+    INSERT ... ON CONFLICT DO UPDATE cannot return, and two first votes
+    of a user racing each other would both miss it. So the user's row
+    is locked and the previous vote read in one query, then the vote is
+    inserted or updated and both counters are adjusted with one UPDATE.
+
+    :param user: the user who votes
+    :param choice: the selected choice
+    :return: the id of the previously selected choice in the same
+             question, or None if this is the user's first vote
+    """
+    with transaction.atomic():
+        previous_choice_id = _lock_user_vote(user, choice.question_id)
+        if previous_choice_id == choice.pk:
+            return previous_choice_id
+        deltas = {choice.pk: 1}
+        history = {choice.pk: (choice.question_id, 1, 0)}
+        if previous_choice_id is None:
+            Vote.objects.bulk_create([Vote(
+                user=user, question_id=choice.question_id, choice=choice)])
+        else:
+            Vote.objects.filter(
+                user=user, question_id=choice.question_id).update(
+                choice=choice, updated_at=timezone.now())
+            deltas[previous_choice_id] = -1
+            history[previous_choice_id] = (choice.question_id, 0, 1)
+        _adjust_counters(deltas)
+        VoteBucket.record(history)
+        votes_changed.send(sender=Vote, question_ids=[choice.question_id])
+    return previous_choice_id
+
+
+def withdraw_vote(user, question):
+    """Remove the user's vote in question.
+
+    :param user: the user whose vote is removed
+    :param question: the question the vote belongs to
+    :return: the id of the choice the removed vote was for, or None if
+             the user has not voted in the question
+    """
+    with transaction.atomic():
+        vote = (Vote.objects.select_for_update()
+                .filter(user=user, question=question).first())
+        if vote is None:
+            return None
+        # the post_delete receiver takes the vote off the counter
+        vote.delete()
+        VoteBucket.record({vote.choice_id: (vote.question_id, 0, 1)})
+    return vote.choice_id
+
+
+def apply_vote_batch(changes):
+    """Apply many vote changes in one transaction.
+
+    Votes are upserted with one bulk INSERT ... ON CONFLICT DO UPDATE,
+    removed votes are deleted with one DELETE, the counters of changed
+    votes are adjusted with one UPDATE, those of removed votes by the
+    post_delete receiver, and the changes are added to the vote history
+    with one upsert per choice. Changes for choices that no longer
+    exist, or that belong to another question, are skipped.
+
+    :param changes: a mapping of (user_id, question_id) to the id of the
+                    selected choice, or to None when the vote is removed
+    :return: the number of votes that were written or removed
+    """
+    if not changes:
+        return 0
+    choice_ids = {choice_id for choice_id in changes.values() if choice_id}
+    valid_choices = dict(Choice.objects.filter(pk__in=choice_ids)
+                         .values_list('pk', 'question_id'))
+    changes = {
+        (user_id, question_id): choice_id
+        for (user_id, question_id), choice_id in changes.items()
+        if choice_id is None or valid_choices.get(choice_id) == question_id}
+    user_ids = {user_id for user_id, _ in changes}
+    question_ids = {question_id for _, question_id in changes}
+    with transaction.atomic():
+        existing = {
+            (user_id, question_id): (pk, choice_id)
+            for pk, user_id, question_id, choice_id in (
+                Vote.objects.select_for_update()
+                .filter(user_id__in=user_ids, question_id__in=question_ids)
+                .values_list('pk', 'user_id', 'question_id', 'choice_id'))}
+        deltas = Counter()
+        history = {}
+        upserts = []
+        removed = []
+        for (user_id, question_id), choice_id in changes.items():
+            pk, previous_choice_id = existing.get((user_id, question_id),
+                                                  (None, None))
+            if choice_id == previous_choice_id:
+                continue
+            if previous_choice_id is not None:
+                if choice_id is not None:
+                    # removed votes are discounted by post_delete
+                    deltas[previous_choice_id] -= 1
+                _, added, lost = history.get(previous_choice_id,
+                                             (question_id, 0, 0))
+                history[previous_choice_id] = (question_id, added, lost + 1)
+            if choice_id is None:
+                removed.append(pk)
+            else:
+                deltas[choice_id] += 1
+                _, added, lost = history.get(choice_id, (question_id, 0, 0))
+                history[choice_id] = (question_id, added + 1, lost)
+                upserts.append(Vote(user_id=user_id, question_id=question_id,
+                                    choice_id=choice_id))
+        if upserts:
+            Vote.objects.bulk_create(upserts, update_conflicts=True,
+                                     unique_fields=['user', 'question'],
+                                     update_fields=['choice', 'updated_at'])
+        if removed:
+            Vote.objects.filter(pk__in=removed).delete()
+        deltas = _adjust_counters(deltas)
+        VoteBucket.record(history)
+        if deltas or removed:
+            votes_changed.send(sender=Vote, question_ids=sorted(
+                {question_id for _, question_id in changes}))
+    return len(upserts) + len(removed)
+
+
+def cast_ballots(user, ballots, buffer=None):
+    """Record many votes of a user at once.
+
+    Every ballot is checked with a single query for all of them: its
+    choice must exist, belong to its question, and the question must be
+    open for voting, see Question.can_vote. The valid ballots are then
+    written together by apply_vote_batch in one transaction, or
+    recorded in the vote buffer if one is given.
+
+    :param user: the user who votes
+    :param ballots: a list of (question_id, choice_id) tuples
+    :param buffer: the VoteBuffer of the process, or None to write the
+                   votes to the database
+    :return: a dict per ballot, in order, with its question_id,
+             choice_id and status: "voted", "changed", "unchanged", or
+             "rejected" along with the error
+    """
+    choices = {
+        pk: (question_id, Question(pub_date=pub_date, end_date=end_date))
+        for pk, question_id, pub_date, end_date in (
+            Choice.objects.filter(pk__in={c for _, c in ballots})
+            .values_list('pk', 'question_id', 'question__pub_date',
+                         'question__end_date'))}
+    results = []
+    changes = {}
+    for question_id, choice_id in ballots:
+        result = {'question_id': question_id, 'choice_id': choice_id}
+        results.append(result)
+        question_of_choice, question = choices.get(choice_id, (None, None))
+        if question_of_choice != question_id:
+            result['error'] = "The choice is not in the question."
+        elif not question.can_vote():
+            result['error'] = "Voting is unavailable for the question."
+        elif (user.pk, question_id) in changes:
+            result['error'] = "The question has another ballot."
+        else:
+            changes[(user.pk, question_id)] = choice_id
+            continue
+        result['status'] = 'rejected'
+    previous = _record_changes(user, changes, buffer)
+    for result in results:
+        if 'status' not in result:
+            previous_choice_id = previous.get(result['question_id'])
+            result['status'] = (
+                'voted' if previous_choice_id is None
+                else 'unchanged' if previous_choice_id == result['choice_id']
+                else 'changed')
+    return results
+
+
+def _record_changes(user, changes, buffer):
+    """Record vote changes of a user in the buffer or the database.
+
+    :return: a dict of the previous choice id by question id
+    """
+    previous = {}
+    if buffer is not None:
+        for (user_id, question_id), choice_id in changes.items():
+            previous[question_id] = buffer.current_choice_id(user_id,
+                                                             question_id)
+            buffer.record(user_id, question_id, choice_id)
+        return previous
+    if not changes:
+        return previous
+    with transaction.atomic():
+        _lock_user(user)
+        previous.update(
+            Vote.objects.filter(user=user, question_id__in=[
+                question_id for _, question_id in changes])
+            .values_list('question_id', 'choice_id'))
+        apply_vote_batch(changes)
+    return previous